@@ -1,6 +1,20 @@
 from gsmo import control
-from .modules import Modules
-from .papermill import execute
+
+# `execute` and `Modules` pull in papermill/Jupyter (and `utz`, which imports pandas); import them on first access
+LAZY_ATTRS = {
+    'execute': 'gsmo.papermill',
+    'Modules': 'gsmo.modules',
+}
+
+
+def __getattr__(name):
+    if name in LAZY_ATTRS:
+        from importlib import import_module
+        value = getattr(import_module(LAZY_ATTRS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module 'gsmo' has no attribute '{name}'")
+
 
 def OK(msg, throw=True):
     exc = control.OK(msg)
@@ -1,6 +1,5 @@
 from os import listdir
 from os.path import isdir
-import yaml
 
 class Arg:
     def __init__(self, *args, **kwargs):
@@ -14,22 +13,34 @@ run_args = [
     Arg('-o','--out',help='Path or directory to write output notebook to (relative to `--dir` directory; default: "nbs")'),
     Arg('-x','--run','--execute',help='Notebook to run (default: run.ipynb)'),
     Arg('-y','--yaml',action='append',help='YAML string(s) with configuration settings for the module being run'),
+    Arg('--fast-commit',action='store_true',default=None,help='Commit with git plumbing (staging committed paths into a copy of the index, then a single `update-ref`), instead of `git add`/`git commit`; faster in large repos, but skips git hooks'),
+    Arg('--externalize',nargs='?',const=True,type=int,help='Move large output values (images, HTML, etc.; optionally: those over this many bytes, default 100KB) out of the output notebook, into a content-addressed store (`outputs_dir` config; default: `outputs/`, next to the output notebook, and committed with it); `gsmo rehydrate` restores them'),
+    Arg('--history',action='store_true',default=None,help='Append per-cell durations, CPU times, and peak RSS to <output notebook>.history.jsonl (committed with the output notebook); `gsmo perf` compares the latest run to previous ones'),
+    Arg('--max-slowdown',type=float,help='Fail the run if a cell took more than this many times its median duration over recent runs (implies --history)'),
+    Arg('--memo',action='store_true',default=None,help='Cache cell outputs (and kernel state after slow cells), and replay unchanged leading cells on re-runs (see `inputs` config)'),
+    Arg('-Z','--zygote',action='store_true',default=None,help='Fork notebook kernels from a resident "zygote" process that has already imported heavy libraries (see $GSMO_ZYGOTE_PRELOAD)'),
+    Arg('--stream',action='store_true',default=None,help='Checkpoint the output notebook periodically during the run (see `checkpoint_cells`, `checkpoint_secs` configs), and stream cell output to stdout and .gsmo/logs/<notebook name>.log'),
+    Arg('--sweep',help='YAML file with a parameter sweep: a list of points (dicts of parameters), or a dict whose list values are swept over as a grid; the notebook is run for each point concurrently, and the output notebooks (`<out>/<notebook name>/<point>.ipynb`) are committed together'),
     Arg('-Y','--yaml-path',action='append',help='YAML file(s) with configuration settings for the module being run'),  # TODO: update example nb
 ]
 
 def load_run_config(args):
     # Load configs to pass into run container
     run_config = {}
+    if not (args.yaml_path or args.yaml):
+        return run_config
+
+    from .config import yaml_load
     if (run_config_yaml_paths := args.yaml_path):
         for run_config_yaml_path in run_config_yaml_paths:
             if isdir(run_config_yaml_path):
                 raise RuntimeError(f'run_config_yaml_path {run_config_yaml_path} is a directory: {listdir(run_config_yaml_path)}')
             with open(run_config_yaml_path,'r') as f:
-                run_config.update(yaml.safe_load(f))
+                run_config.update(yaml_load(f))
 
     if (run_config_yaml_strs := args.yaml):
         for run_config_yaml_str in run_config_yaml_strs:
-            run_config_yaml = yaml.safe_load(run_config_yaml_str)
+            run_config_yaml = yaml_load(run_config_yaml_str)
             run_config.update(run_config_yaml)
 
     return run_config
@@ -1,8 +1,8 @@
 
-from os.path import basename, exists, isfile, join, sep
+import json
+from os import environ, makedirs, replace, stat
+from os.path import abspath, basename, dirname, exists, expanduser, isfile, join, sep
 from pathlib import Path
-from utz import o
-from utz.process import line
 from sys import stderr
 
 from .err import OK, RAISE, WARN
@@ -26,16 +26,71 @@ GSMO_DIR_NAME = 'gsmo'
 GSMO_DIR = f'/{GSMO_DIR_NAME}'
 GH_REPO = 'runsascoded/gsmo'
 
+# Module-local directory for (uncommitted) gsmo state: build records, caches, etc.
+STATE_DIR = '.gsmo'
+
+# Parsed `gsmo.yml`, cached as JSON (keyed on the file's path, size, and mtime), so unchanged configs don't need `yaml`
+CONFIG_CACHE_FILE = 'config.json'
+
+# Host-wide cache directory (for state that isn't specific to one module)
+CACHE_DIR = environ.get('GSMO_CACHE_DIR') or join(expanduser('~'), '.cache', 'gsmo')
+
+# Container path of the (per-module) Docker volume that `pip_entrypoint.sh` caches `container_pip` installs in
+PIP_CACHE_ENV = 'GSMO_PIP_CACHE'
+PIP_CACHE_DST = '/gsmo-pip-cache'
+
+
+def state_path(*pcs, root=None):
+    '''Path under a module's STATE_DIR; creates the directory (git-ignoring its contents) if necessary'''
+    dir = join(root, STATE_DIR) if root else STATE_DIR
+    if not exists(dir):
+        makedirs(dir, exist_ok=True)
+        with open(join(dir, '.gitignore'),'w') as f:
+            f.write('*\n')
+    path = join(dir, *pcs)
+    if pcs[:-1]:
+        makedirs(dirname(path), exist_ok=True)
+    return path
+
+
+def yaml_load(stream):
+    '''Parse YAML with the (much faster) libyaml-backed loader, if available'''
+    import yaml
+    return yaml.load(stream, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+def load_config(path=DEFAULT_CONFIG_FILE):
+    '''Parse a `gsmo.yml`, via a JSON cache in the adjacent STATE_DIR when the file hasn't changed since it was cached'''
+    path = abspath(path)
+    st = stat(path)
+    key = [ path, st.st_size, st.st_mtime_ns, ]
+    root = dirname(path)
+    try:
+        with open(join(root, STATE_DIR, CONFIG_CACHE_FILE),'r') as f:
+            cached = json.load(f)
+        if cached['key'] == key:
+            return cached['config']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    with open(path,'r') as f:
+        config = yaml_load(f) or {}
+    try:
+        # Only cache configs that survive a JSON round-trip (e.g. no dates or non-string keys)
+        if json.loads(json.dumps(config)) == config:
+            cache = state_path(CONFIG_CACHE_FILE, root=root)
+            with open(f'{cache}.tmp','w') as f:
+                json.dump(dict(key=key, config=config), f)
+            replace(f'{cache}.tmp', cache)
+    except (TypeError, ValueError, OSError):
+        pass
+    return config
+
 
 class Config:
     def __init__(self, args=None):
         self.args = args
-        if exists(DEFAULT_CONFIG_FILE):
-            import yaml
-            with open(DEFAULT_CONFIG_FILE,'r') as f:
-                self.config = o(yaml.safe_load(f))
-        else:
-            self.config = o()
+        self.config = load_config() if exists(DEFAULT_CONFIG_FILE) else {}
 
     def get(self, keys, default=None):
         if isinstance(keys, str):
@@ -98,8 +153,7 @@ def clean_group(group, err=RAISE):
         group = group[1:]
         gid = grp.getgrgid(group).gr_gid
     elif exists(group):
-        g = line('stat','-c','%g',group)
-        return g
+        return str(stat(group).st_gid)
     else:
         try:
             gid = grp.getgrgid(group).gr_gid
@@ -0,0 +1,83 @@
+from os import link, makedirs, readlink, symlink, walk
+from os.path import abspath, dirname, exists, getsize, isdir, islink, join, relpath
+from re import search
+from shutil import copy2, rmtree
+
+from .config import state_path
+from .image import copy_srcs, instructions
+
+# Build contexts are staged here (under the module's STATE_DIR, so that hardlinks stay on one filesystem)
+CONTEXT_DIR = 'context'
+
+
+def fmt_bytes(n):
+    for unit in [ 'B', 'KB', 'MB', 'GB', ]:
+        if n < 1024 or unit == 'GB':
+            return f'{n:.0f}{unit}' if unit == 'B' else f'{n:.1f}{unit}'
+        n /= 1024
+
+
+def files(path):
+    '''Files (and symlinks) at or under `path`'''
+    if isdir(path) and not islink(path):
+        for dir, _, names in walk(path):
+            for name in sorted(names):
+                yield join(dir, name)
+    else:
+        yield path
+
+
+def stage(srcs, root, dst):
+    '''Hardlink `srcs` (files/directories under `root`) into a fresh directory `dst`, at the same paths relative to
+    `root`; returns the number of files and their total size'''
+    if exists(dst):
+        rmtree(dst)
+    makedirs(dst)
+    n = size = 0
+    for src in srcs:
+        for path in files(src):
+            target = join(dst, relpath(path, root))
+            if exists(target) or islink(target):
+                continue
+            makedirs(dirname(target), exist_ok=True)
+            if islink(path):
+                symlink(readlink(path), target)
+            else:
+                try:
+                    link(path, target)
+                except OSError:
+                    # E.g. a different filesystem
+                    copy2(path, target)
+                size += getsize(path)
+            n += 1
+    return n, size
+
+
+def bind_mounts_context(dockerfile):
+    '''Whether any RUN instruction bind-mounts (part of) the build context (which COPY/ADD sources don't account for)'''
+    return any(
+        cmd == 'RUN' and search(r'--mount=\S*type=bind', args) and not search(r'--mount=\S*from=', args)
+        for cmd, args in instructions(dockerfile)
+    )
+
+
+def build_context(dockerfile, root):
+    '''Directory to use as the build context for `dockerfile`: a staging directory containing just the files it COPYs
+    or ADDs from `root` (plus `root`'s .dockerignore), or `root` itself if those can't be determined statically (or are
+    all of `root`)'''
+    root = abspath(root)
+    srcs = copy_srcs(dockerfile, root)
+    if srcs is None or bind_mounts_context(dockerfile):
+        print(f"Couldn't determine the build-context files {dockerfile} uses; sending all of {root}")
+        return root
+    srcs = [ abspath(src) for src in srcs ]
+    if any(src == root or relpath(src, root).startswith('..') for src in srcs):
+        print(f'{dockerfile} copies all of {root}; sending it as the build context')
+        return root
+    dockerignore = join(root, '.dockerignore')
+    if exists(dockerignore):
+        srcs.append(dockerignore)
+    dst = abspath(state_path(CONTEXT_DIR, root=root))
+    n, size = stage(srcs, root, dst)
+    print(f'Build context: {n} files, {fmt_bytes(size)} (staged in {dst})')
+    return dst
@@ -0,0 +1,45 @@
+from hashlib import sha256
+import json
+from os import walk
+from os.path import exists, isdir, join, relpath
+
+
+def hash_file(path, h=None, chunk_size=2**20):
+    '''SHA-256 of a file's contents (or update an existing hash object with them)'''
+    m = h or sha256()
+    with open(path,'rb') as f:
+        while (chunk := f.read(chunk_size)):
+            m.update(chunk)
+    return m if h else m.hexdigest()
+
+
+def hash_paths(paths, root=None):
+    '''Hash the names and contents of a list of files and directories
+
+    Directories are walked in sorted order; missing paths contribute a marker (so that a path appearing or disappearing
+    changes the hash); `None` entries are skipped.
+    '''
+    m = sha256()
+    for path in paths:
+        if path is None:
+            continue
+        path = str(path)
+        name = relpath(path, root) if root else path
+        if not exists(path):
+            m.update(f'missing:{name}\0'.encode())
+        elif isdir(path):
+            for dir, dirs, files in walk(path):
+                dirs.sort()
+                for file in sorted(files):
+                    file_path = join(dir, file)
+                    m.update(f'file:{relpath(file_path, root) if root else file_path}\0'.encode())
+                    hash_file(file_path, m)
+        else:
+            m.update(f'file:{name}\0'.encode())
+            hash_file(path, m)
+    return m.hexdigest()
+
+
+def hash_obj(obj):
+    '''Hash a JSON-serializable object (keys sorted, non-JSON values stringified)'''
+    return sha256(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()
@@ -0,0 +1,176 @@
+from http.client import HTTPConnection, HTTPException
+import json
+from os import access, environ, R_OK, W_OK
+from os.path import exists
+import socket
+import struct
+from urllib.parse import quote, urlencode
+
+DOCKER_SOCK = '/var/run/docker.sock'
+
+# Set to "0" to always use the `docker` CLI
+API_ENV = 'GSMO_DOCKER_API'
+
+# Requests that are safe to retry after they may have reached the daemon
+IDEMPOTENT_METHODS = [ 'GET', 'HEAD', 'PUT', 'DELETE', ]
+
+
+class APIError(Exception):
+    def __init__(self, status, msg):
+        self.status = status
+        super().__init__(f'Docker Engine API error {status}: {msg}')
+
+
+class UnixHTTPConnection(HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.sock_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            sock.settimeout(self.timeout)
+        sock.connect(self.sock_path)
+        self.sock = sock
+
+
+def demux(data):
+    '''Split a (non-TTY) attach/exec stream into its stdout and stderr bytes'''
+    out, err = [], []
+    i = 0
+    while i + 8 <= len(data):
+        stream, size = struct.unpack('>BxxxL', data[i:i+8])
+        chunk = data[i+8:i+8+size]
+        (err if stream == 2 else out).append(chunk)
+        i += 8 + size
+    return b''.join(out), b''.join(err)
+
+
+class Client:
+    '''Minimal Docker Engine API client, over a unix socket (one keep-alive connection, reconnecting as necessary)'''
+    def __init__(self, path=DOCKER_SOCK, timeout=None):
+        self.path = path
+        self.conn = UnixHTTPConnection(path, timeout=timeout)
+
+    def request(self, method, path, body=None, params=None):
+        '''Make a request; return the response's (status, body bytes)'''
+        url = quote(path) + (f'?{urlencode(params)}' if params else '')
+        headers = {}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            sent = False
+            try:
+                self.conn.request(method, url, body=body, headers=headers)
+                sent = True
+                res = self.conn.getresponse()
+                data = res.read()
+                break
+            except (ConnectionError, HTTPException):
+                # The daemon may have closed the (idle) keep-alive connection; retry once on a fresh one, unless the
+                # request may have been received, and isn't idempotent (e.g. creating or starting an exec)
+                self.conn.close()
+                if attempt or (sent and method not in IDEMPOTENT_METHODS):
+                    raise
+        if res.will_close:
+            self.conn.close()
+        if res.status >= 400:
+            try:
+                msg = json.loads(data)['message']
+            except (ValueError, KeyError):
+                msg = data.decode(errors='replace')
+            raise APIError(res.status, msg)
+        return res.status, data
+
+    def json(self, method, path, body=None, params=None, missing_ok=False):
+        try:
+            _, data = self.request(method, path, body=body, params=params)
+        except APIError as e:
+            if missing_ok and e.status == 404:
+                return None
+            raise
+        return json.loads(data) if data else None
+
+    def inspect_container(self, name):
+        return self.json('GET', f'/containers/{name}/json', missing_ok=True)
+
+    def inspect_image(self, name):
+        return self.json('GET', f'/images/{name}/json', missing_ok=True)
+
+    def remove_container(self, name, force=False):
+        self.request('DELETE', f'/containers/{name}', params=dict(force=1) if force else None)
+
+    def tag(self, image, target):
+        repo, _, tag = target.rpartition(':') if ':' in target.rsplit('/', 1)[-1] else (target, None, 'latest')
+        self.request('POST', f'/images/{image}/tag', params=dict(repo=repo, tag=tag))
+
+    def exec(self, container, cmd):
+        '''Run `cmd` in `container`; return its exit code, stdout, and stderr'''
+        exec_id = self.json('POST', f'/containers/{container}/exec', body=dict(Cmd=cmd, AttachStdout=True, AttachStderr=True))['Id']
+        _, data = self.request('POST', f'/exec/{exec_id}/start', body=dict(Detach=False, Tty=False))
+        out, err = demux(data)
+        code = self.json('GET', f'/exec/{exec_id}/json')['ExitCode']
+        return code, out.decode(), err.decode()
+
+
+_client = None
+
+
+def client():
+    '''Shared Engine API client, if the local Docker socket is usable (otherwise None, and callers use the CLI)'''
+    global _client
+    if _client is None:
+        host = environ.get('DOCKER_HOST')
+        path = host[len('unix://'):] if host and host.startswith('unix://') else DOCKER_SOCK
+        if environ.get(API_ENV) == '0' or (host and not host.startswith('unix://')):
+            _client = False
+        elif exists(path) and access(path, R_OK | W_OK):
+            _client = Client(path)
+        else:
+            _client = False
+    return _client or None
+
+
+# CLI-fallback wrappers
+
+def inspect_container(name):
+    if (c := client()):
+        return c.inspect_container(name)
+    from utz import process
+    info = process.json('docker','container','inspect',name, err_ok=True)
+    return info[0] if info else None
+
+
+def inspect_image(name):
+    if (c := client()):
+        return c.inspect_image(name)
+    from utz import process
+    info = process.json('docker','image','inspect',name, err_ok=True)
+    return info[0] if info else None
+
+
+def remove_container(name, force=False):
+    if (c := client()):
+        print(f'Removing container {name}')
+        return c.remove_container(name, force=force)
+    from utz.process import run
+    run('docker','container','rm',*(['-f'] if force else []),name)
+
+
+def tag(image, target):
+    if (c := client()):
+        print(f'Tagging {image} as {target}')
+        return c.tag(image, target)
+    from utz.process import run
+    run('docker','tag',image,target)
+
+
+def exec(container, cmd):
+    '''Run `cmd` (non-interactively) in `container`; return its exit code and stdout'''
+    if (c := client()):
+        code, out, _ = c.exec(container, cmd)
+        return code, out
+    from subprocess import run
+    proc = run(['docker','exec',container] + cmd, capture_output=True, text=True)
+    return proc.returncode, proc.stdout
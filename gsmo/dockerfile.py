@@ -0,0 +1,55 @@
+from re import search
+import shlex
+
+# "Layered" Dockerfile generation: order layers from least- to most-frequently changing, and use BuildKit cache mounts so
+# that rebuilding a layer only re-downloads/installs the delta.
+SYNTAX = '# syntax=docker/dockerfile:1'
+
+APT_CACHE_MOUNTS = [
+    '--mount=type=cache,target=/var/cache/apt,sharing=locked',
+    '--mount=type=cache,target=/var/lib/apt,sharing=locked',
+]
+
+PIP_CACHE_DIR = '/var/cache/pip'
+PIP_CACHE_MOUNTS = [ f'--mount=type=cache,target={PIP_CACHE_DIR}', ]
+
+
+def is_pinned(dep):
+    '''Whether a pip requirement pins an exact version (and so is unlikely to change between builds)'''
+    return bool(search(r'===?[^*]+$', dep.split(';')[0].strip()))
+
+
+def split_pinned(deps):
+    '''Partition pip requirements into (pinned, unpinned) lists, preserving order'''
+    # requirements.txt lines arrive wrapped in double-quotes
+    deps = [ dep[1:-1] if len(dep) >= 2 and dep[0] == dep[-1] == '"' else dep for dep in deps ]
+    deps = [ dep for dep in deps if dep and not dep.startswith('#') ]
+    pinned = [ dep for dep in deps if is_pinned(dep) ]
+    unpinned = [ dep for dep in deps if not is_pinned(dep) ]
+    return pinned, unpinned
+
+
+def cached_run(file, mounts, *cmds):
+    '''Write a RUN instruction with BuildKit `--mount` flags (which `docker.File.RUN` doesn't support)'''
+    if cmds:
+        file.write('RUN %s %s' % (' '.join(mounts), ' \\\n && '.join(cmds)))
+
+
+def apt_install(file, apts):
+    cached_run(
+        file,
+        APT_CACHE_MOUNTS,
+        # Debian images delete downloaded .debs after each install by default, which defeats the cache mount
+        'rm -f /etc/apt/apt.conf.d/docker-clean',
+        'apt-get update',
+        f'apt-get install -y {" ".join(apts)}',
+    )
+
+
+def pip_install(file, deps):
+    if deps:
+        cached_run(
+            file,
+            PIP_CACHE_MOUNTS,
+            f'pip install --cache-dir {PIP_CACHE_DIR} {" ".join(shlex.quote(dep) for dep in deps)}',
+        )
@@ -0,0 +1,245 @@
+from ast import literal_eval
+from os import environ
+from os.path import join
+from time import time
+
+from jupyter_client import AsyncKernelManager
+from nbclient.exceptions import CellExecutionError
+import nbformat
+from papermill.clientwrap import PapermillNotebookClient
+from papermill.engines import NBClientEngine, papermill_engines
+from papermill.log import logger
+from papermill.utils import merge_kwargs, remove_args
+
+from . import zygote
+from .config import CACHE_DIR
+from .history import USAGE_CODE
+from .memo import Memo, RESTORE_CODE, SNAPSHOT_CODE, STATE_FILE
+from .stream import StreamingExecutionManager
+
+ENGINE_NAME = 'gsmo'
+LAUNCHER_MODULES = [ 'ipykernel_launcher', 'ipykernel', ]
+
+
+def preload_modules(preload=None):
+    '''Modules for the zygote to import: an explicit list, $GSMO_ZYGOTE_PRELOAD (comma-separated), or the defaults'''
+    if preload is None or preload is True:
+        preload = environ.get(zygote.PRELOAD_ENV)
+        if preload is None:
+            return zygote.DEFAULT_PRELOAD
+    if isinstance(preload, str):
+        preload = [ m for m in preload.split(',') if m ]
+    return list(preload)
+
+
+class ZygoteKernelManager(AsyncKernelManager):
+    '''Launch IPython kernels by forking them from a zygote process (which has already imported `preload`)
+
+    Kernel specs that don't launch `ipykernel` are started normally.
+    '''
+    preload = None
+
+    def format_kernel_cmd(self, extra_arguments=None):
+        cmd = super().format_kernel_cmd(extra_arguments)
+        if len(cmd) < 3 or cmd[1] != '-m' or cmd[2] not in LAUNCHER_MODULES:
+            print(f"Kernel cmd {cmd} doesn't launch ipykernel; not using zygote")
+            return cmd
+        [ python, _, _, *args ] = cmd
+        preload = preload_modules(self.preload)
+        path = zygote.socket_path(python, preload)
+        zygote.start(path, python=python, preload=preload, log=join(CACHE_DIR, 'zygote.log'))
+        return [ python, zygote.__file__, 'connect', path, '--', *args, ]
+
+
+def zygote_kernel_manager(preload=None):
+    return type('ZygoteKernelManager', (ZygoteKernelManager,), dict(preload=preload_modules(preload)))
+
+
+class GsmoNotebookClient(PapermillNotebookClient):
+    '''Execute a notebook, optionally:
+    - replaying its leading run of unchanged cells from a `Memo` cache (`memo`)
+    - recording each code cell's CPU time and peak RSS in `cell.metadata.gsmo.usage` (`usage`)
+    '''
+    def __init__(self, nb_man, memo=None, usage=False, **kwargs):
+        super().__init__(nb_man, **kwargs)
+        self.memo = memo
+        self.usage = usage
+
+    def run_silent(self, code):
+        '''Run code in the kernel (without recording it in the notebook); returns the value it assigns to
+        `__gsmo_result`, or an error string'''
+        msg_id = self.kc.execute(code, silent=True, store_history=False, user_expressions=dict(result='__gsmo_result'))
+        content = self.wait_for_reply(msg_id)['content']
+        if content['status'] != 'ok':
+            return f'{content.get("ename")}: {content.get("evalue")}'
+        result = content['user_expressions']['result']
+        if result['status'] != 'ok':
+            return f'{result.get("ename")}: {result.get("evalue")}'
+        return literal_eval(result['data']['text/plain'])
+
+    def measure_usage(self):
+        '''Kernel's cumulative CPU seconds, and peak RSS since the previous call (None if unavailable)'''
+        usage = self.run_silent(USAGE_CODE)
+        if isinstance(usage, str):
+            print(f'Failed to measure kernel resource usage: {usage}')
+            return None
+        return usage
+
+    def papermill_execute_cells(self):
+        memo = self.memo
+        cells = self.nb.cells
+        keys = memo.keys(cells) if memo else [None] * len(cells)
+        resume = memo.resume_point(cells, keys) if memo else -1
+        if resume >= 0:
+            err = self.run_silent(RESTORE_CODE % memo.path(keys[resume], STATE_FILE))
+            if err:
+                print(f'Failed to restore kernel state cached after cell {resume} ({err}); executing all cells')
+                resume = -1
+            else:
+                print(f'Replaying cells 0-{resume} from cache')
+
+        usage = self.measure_usage() if self.usage else None
+        for index, (cell, key) in enumerate(zip(cells, keys)):
+            if index <= resume:
+                self.nb_man.cell_start(cell, index)
+                if cell.cell_type == 'code':
+                    cached = memo.outputs(key)
+                    cell.outputs = [ nbformat.from_dict(output) for output in cached['outputs'] ]
+                    cell.execution_count = cached['execution_count']
+                    cell.metadata.setdefault('gsmo', {})['memoized'] = True
+                    memo.touch(key)
+                self.nb_man.cell_complete(cell, index)
+                continue
+
+            start = time()
+            failed = False
+            try:
+                self.nb_man.cell_start(cell, index)
+                self.execute_cell(cell, index)
+            except CellExecutionError as ex:
+                self.nb_man.cell_exception(self.nb.cells[index], cell_index=index, exception=ex)
+                failed = True
+            finally:
+                if usage and cell.cell_type == 'code':
+                    prev, usage = usage, self.measure_usage()
+                    if usage:
+                        cpu, rss = usage
+                        cell.metadata.setdefault('gsmo', {})['usage'] = dict(cpu=round(cpu - prev[0], 3), rss=rss)
+                self.nb_man.cell_complete(self.nb.cells[index], cell_index=index)
+            if failed:
+                break
+
+            if memo and cell.cell_type == 'code':
+                memo.store(cell, key)
+                if time() - start >= memo.snapshot_secs:
+                    err = self.run_silent(SNAPSHOT_CODE % memo.path(key, STATE_FILE))
+                    if err:
+                        print(f'Not caching kernel state after cell {index}: {err}')
+
+        if memo:
+            memo.prune()
+
+
+class Engine(NBClientEngine):
+    '''Papermill engine that runs notebooks in kernels forked from a zygote (pass `zygote=False` to opt out)
+
+    With `memo=True`, cell outputs are cached in `memo_dir`, and re-runs replay unchanged leading cells (see `Memo`).
+    With `stream` (a dict of `StreamingExecutionManager` kwargs), the notebook is checkpointed periodically.
+    With `usage=True`, each code cell's CPU time and peak RSS are recorded in its metadata.
+    '''
+    @classmethod
+    def execute_notebook(
+        cls,
+        nb,
+        kernel_name,
+        output_path=None,
+        progress_bar=True,
+        log_output=False,
+        autosave_cell_every=30,
+        stream=None,
+        **kwargs,
+    ):
+        if not stream:
+            return super().execute_notebook(
+                nb,
+                kernel_name,
+                output_path=output_path,
+                progress_bar=progress_bar,
+                log_output=log_output,
+                autosave_cell_every=autosave_cell_every,
+                **kwargs,
+            )
+
+        # Mirrors papermill.engines.Engine.execute_notebook, with a StreamingExecutionManager
+        nb_man = StreamingExecutionManager(
+            nb,
+            output_path=output_path,
+            progress_bar=progress_bar,
+            log_output=log_output,
+            autosave_cell_every=autosave_cell_every,
+            **stream,
+        )
+        nb_man.notebook_start()
+        try:
+            cls.execute_managed_notebook(nb_man, kernel_name, log_output=log_output, **kwargs)
+        finally:
+            nb_man.cleanup_pbar()
+            nb_man.notebook_complete()
+
+        return nb_man.nb
+
+    @classmethod
+    def execute_managed_notebook(
+        cls,
+        nb_man,
+        kernel_name,
+        zygote=True,
+        memo=False,
+        memo_dir=None,
+        inputs=None,
+        usage=False,
+        log_output=False,
+        stdout_file=None,
+        stderr_file=None,
+        start_timeout=60,
+        execution_timeout=None,
+        **kwargs,
+    ):
+        if zygote:
+            kwargs['kernel_manager_class'] = zygote_kernel_manager(zygote)
+        if not memo and not usage:
+            return super().execute_managed_notebook(
+                nb_man,
+                kernel_name,
+                log_output=log_output,
+                stdout_file=stdout_file,
+                stderr_file=stderr_file,
+                start_timeout=start_timeout,
+                execution_timeout=execution_timeout,
+                **kwargs,
+            )
+
+        # Mirrors NBClientEngine.execute_managed_notebook, with a GsmoNotebookClient
+        kwargs = remove_args(['input_path'], **kwargs)
+        safe_kwargs = remove_args(['timeout', 'startup_timeout'], **kwargs)
+        final_kwargs = merge_kwargs(
+            safe_kwargs,
+            timeout=execution_timeout if execution_timeout else kwargs.get('timeout'),
+            startup_timeout=start_timeout,
+            kernel_name=kernel_name,
+            log=logger,
+            log_output=log_output,
+            stdout_file=stdout_file,
+            stderr_file=stderr_file,
+        )
+        if memo:
+            memo = Memo(
+                memo_dir,
+                parameters=nb_man.nb.metadata.get('papermill', {}).get('parameters'),
+                kernel_name=kernel_name,
+                inputs=inputs,
+            )
+        return GsmoNotebookClient(nb_man, memo=memo or None, usage=usage, **final_kwargs).execute()
+
+
+papermill_engines.register(ENGINE_NAME, Engine)
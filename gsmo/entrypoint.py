@@ -4,9 +4,9 @@ from argparse import ArgumentParser
 from functools import partial
 from os import chdir, getcwd
 
+from . import timeline
 from .cli import run_args, load_run_config
-from .config import Config, DEFAULT_RUN_NB, DEFAULT_NB_DIR
-from .papermill import execute
+from .config import lists, Config, DEFAULT_RUN_NB, DEFAULT_NB_DIR
 
 def main(args=None):
     parser = ArgumentParser()
@@ -16,13 +16,15 @@ def main(args=None):
 
     args = parser.parse_args(args=args)
 
-    config = Config(args)
+    with timeline.span('Config'):
+        config = Config(args)
     get = partial(Config.get, config)
 
     nb = get('run', DEFAULT_RUN_NB)
     out = get('out', DEFAULT_NB_DIR)
 
-    run_config = load_run_config(args)
+    with timeline.span('load_run_config'):
+        run_config = load_run_config(args)
     commit = config.get('commit', True)
 
     progress_bar = args.progress
@@ -37,6 +39,15 @@ def main(args=None):
         progress_bar=progress_bar,
         commit=commit,
     )
+    # gsmo options are kept separate from notebook parameters (which run config entries are)
+    gsmo = dict(run_config=run_config)
+    for k in ['zygote','memo','stream','checkpoint_cells','checkpoint_secs','externalize','outputs_dir','fast_commit','history','max_slowdown']:
+        v = get(k)
+        if v is not None:
+            gsmo[k] = v
+    inputs = lists(get('inputs'))
+    if inputs:
+        gsmo['inputs'] = inputs
 
     for k,v in run_config.items():
         if k == 'commit':
@@ -49,9 +60,22 @@ def main(args=None):
                 print(f'Overwriting {k}={v} with run_config value {v}')
             kwargs[k] = v
 
+    kwargs['gsmo'] = gsmo
     print(f'kwargs: {kwargs}, run_config: {run_config}')
 
-    execute(**kwargs)
+    sweep_path = get('sweep')
+    if sweep_path:
+        from .config import yaml_load
+        from .sweep import sweep
+        with open(sweep_path,'r') as f:
+            spec = yaml_load(f)
+        kwargs['out'] = kwargs.pop('output')
+        with timeline.span('sweep'):
+            sweep(spec=spec, **kwargs)
+    else:
+        from .papermill import execute
+        with timeline.span('execute'):
+            execute(**kwargs)
 
 if __name__ == '__main__':
     main()
@@ -1,14 +1,64 @@
 #!/usr/bin/env python
 
-from utz import *
+from argparse import ArgumentParser
+from functools import partial
+from os import chdir, environ as env, getcwd, makedirs, sep
+from os.path import abspath, basename, dirname, exists, isfile, join, relpath
+from re import match
+from shutil import rmtree, which
+from subprocess import CalledProcessError
+import sys
+from sys import stderr
+from tempfile import NamedTemporaryFile
+import time
 
 from .cli import Arg, run_args, load_run_config
-from .config import clean_group, lists, version, Config, DEFAULT_IMAGE_REPO, DEFAULT_SRC_DIR_NAME, DEFAULT_SRC_MOUNT_DIR, DEFAULT_RUN_NB, IMAGE_HOME, DEFAULT_GROUP, DEFAULT_USER, DEFAULT_IMAGE, DEFAULT_DIND_IMAGE, GSMO_DIR, GSMO_DIR_NAME
+from .config import clean_group, lists, version, Config, PIP_CACHE_DST, PIP_CACHE_ENV, DEFAULT_IMAGE_REPO, DEFAULT_SRC_DIR_NAME, DEFAULT_SRC_MOUNT_DIR, DEFAULT_RUN_NB, IMAGE_HOME, DEFAULT_GROUP, DEFAULT_USER, DEFAULT_IMAGE, DEFAULT_DIND_IMAGE, GSMO_DIR, GSMO_DIR_NAME
+from .context import build_context
+from .digest import hash_obj, hash_paths
 from .err import OK, RAISE, WARN
+from . import docker_api, dockerfile as layers, timeline
+from .image import cached_image, docker_sock_group, image_hash, image_id, last_build, record_build, IMAGE_HASH_ENV, IMAGE_HASH_LABEL
+from .manifest import changes, manifest, read_manifest
 from .mount import Mount, Mounts
+from .pool import Pool, DEFAULT_MAX_RUNS, IDLE_CMD
+
+# Handled by gsmo.run_queue (before the main parser, whose optional `input` positional would swallow their args)
+QUEUE_CMDS = [ 'queue', 'worker', ]
+
+
+def without_args(args, *flags):
+    '''`args`, minus `flags` (options that take a value) and their values'''
+    args = list(args)
+    remaining = []
+    while args:
+        arg = args.pop(0)
+        if arg in flags:
+            if args:
+                args.pop(0)
+        elif not any(arg.startswith(f'{flag}=') for flag in flags if flag.startswith('--')):
+            remaining.append(arg)
+    return remaining
+
+
+def main(*args, forward=True):
+    '''Run `gsmo` with `args` (default: `sys.argv[1:]`); CLI invocations (no `args`) are forwarded to a running `gsmo
+    serve` daemon, if `forward` (the daemon's forked children run with `forward=False`)'''
+    argv = list(args) or sys.argv[1:]
+    if argv and argv[0] == 'serve':
+        from .serve import main as serve_main
+        return serve_main(*argv[1:])
+    if not args and forward:
+        # CLI invocations run in a `gsmo serve` daemon, if one is running
+        from .serve import forward
+        if (code := forward(argv)) is not None:
+            sys.exit(code)
 
-def main(*args):
     print(f'gsmo.main({args})')
+    if argv and argv[0] in QUEUE_CMDS:
+        from .run_queue import main as queue_main
+        return queue_main(*argv)
+
     parser = ArgumentParser()
     parser.add_argument('input',nargs='?',help='Input directory containing run.ipynb (and optionally gsmo.yml, or other path specified by "-y"); defaults to current directory')
 
@@ -20,9 +70,15 @@ def main(*args):
         Arg('--dir',help='Root dir for jupyter notebook server (default: --dst / `/src`'),
     ]
 
+    host_run_args = [
+        Arg('--affected',help="Run this repo's submodules (rather than its own run notebook) that have changed since this Git revision (their trees other than output dirs, `inputs`, or gsmo.yml), along with modules that depend on them"),
+        Arg('--skip-unchanged',default=None,action='store_true',help="Exit without building an image or running anything if the run notebook, run config, `inputs`, module config files, and image all match the manifest recorded by the last successful run"),
+    ]
+
     docker_args = [
         Arg('-a','--apt',help='Comma-separated list of packages to apt-get install'),
         Arg('-b','--build-arg',action='append',help='Comma-separated list of packages to apt-get install'),
+        Arg('-B','--rebuild',default=None,action='store_true',help="Build the Docker image even if an image with a matching content hash (of the rendered Dockerfile and its inputs) already exists"),
         Arg('--dev',default=None,action='store_true',help="Run in dev mode: use a 'latest' Docker image tag (':latest' or ':dind') and mount this gsmo directory into the Docker image (as /gsmo)"),
         Arg('--dind',default=None,action='store_true',help="When set, mount /var/run/docker.sock in container (and default to a base image that contains docker installed)"),
         Arg('--dst',help='Path inside Docker container to mount current directory/repo to (default: /src)'),
@@ -37,11 +93,15 @@ def main(*args):
         Arg('-G','--group',action='append',help="Additional groups to add docker image user to"),
         Arg('-l','--label',action='append',help='Labels to apply to run container, in k=v format'),
         Arg('-L','--label-file',help='File with labels to apply to run container, in k=v format'),
+        Arg('--layered',default=None,action='store_true',help="Generate a BuildKit Dockerfile with layers ordered by how often they change (apt, pinned pip deps, unpinned pip deps, user setup, ENV/LABEL), and apt/pip cache mounts"),
         Arg('-M','--missing-paths',default=0,action='count',help='Relax checking of paths (for propagating mounts and groups into Docker): 1x ⟹ warn, 2x ⟹ ignore'),
         Arg('-n','--dry-run',action='count',default=0,help="Prepare and print run cmd (including building Docker image), but don't execute it. If passed twice, stop before building Docker image"),
         Arg('--name',help='Container name (defaults to directory basename)'),
         Arg('-p','--pip',help='Comma-separated (or multi-arg) list of packages to pip install'),
+        Arg('--pool',nargs='?',const=1,type=int,help='Run (or open a shell) in a pool of warm, reusable containers for this module (optionally: the max number of pooled containers; default 1), instead of a fresh container; mounts and `--container-pip` installs are set up once per pooled container'),
+        Arg('--pool-max-runs',type=int,help=f'Recycle pooled containers after this many runs (default: {DEFAULT_MAX_RUNS})'),
         Arg('--container-pip','--pie','--pip-e',action='append',help='When running the container, `pip install -e` a directory or directories (especially subdirectories of the project being run, which are mounted into the container and are not available for `pip install`ing at image-build time) before running the usual entrypoint script'),
+        Arg('--profile',default=None,action='store_true',help='Record a timeline of the run (config loading, Dockerfile render, image build, container run, `--container-pip` installs, kernel start, notebook cells, git commit) to <out>/profile.json, in Chrome trace format (view in chrome://tracing or ui.perfetto.dev)'),
         Arg('-P','--port',action='append',help='Ports (or ranges) to expose from the container (if Jupyter server is being run, the first port in the first provided range will be used); can be passed multiple times and/or as comma-delimited lists'),
         Arg('--rm','--remove-container',default=None,action='store_true',help="Remove Docker container after run (pass `--rm` to `docker run`)"),
         Arg('-R','--skip-requirements-txt',default=None,action='store_true',help="Skip {reading,`pip install`ing} any requirements.txt that is present"),
@@ -63,13 +123,27 @@ def main(*args):
     shell_parser = subparsers.add_parser('shell', help='Boot a Bash shell in a Docker image built for this module', aliases=['sh','s','bash'])
     shell_parser.set_defaults(cmd='shell')
 
+    rehydrate_parser = subparsers.add_parser('rehydrate', help='Restore outputs that were externalized from an executed notebook (see `externalize` config)')
+    rehydrate_parser.set_defaults(cmd='rehydrate')
+    rehydrate_parser.add_argument('-f','--file',action='append',help='Output notebook(s) to restore externalized outputs into (default: the module\'s `run` notebook, under its `out` directory)')
+    rehydrate_parser.add_argument('-d','--outputs-dir',help="Externalized-output store (default: an `outputs` directory next to each notebook)")
+    rehydrate_parser.add_argument('-o','--output',help='Write the rehydrated notebook here (default: overwrite the input notebook; only valid with a single notebook)')
+
+    perf_parser = subparsers.add_parser('perf', help='Compare per-cell timings of the latest run to previous runs (see `history` config)')
+    perf_parser.set_defaults(cmd='perf')
+    perf_parser.add_argument('-f','--file',action='append',help='Output notebook(s) (or their .history.jsonl files) to report on (default: the module\'s `run` notebook, under its `out` directory)')
+    perf_parser.add_argument('-n','--runs',type=int,help='Compare against the median of this many previous successful runs (default: 10)')
+    perf_parser.add_argument('-t','--max-slowdown',type=float,help='Exit non-zero if a cell took more than this many times its baseline duration')
+    perf_parser.add_argument('-m','--min-secs',type=float,help='Ignore cells that took less than this many seconds, when checking -t/--max-slowdown (default: 1)')
+    perf_parser.add_argument('-a','--accept',action='store_true',help="Accept the latest run's timings (e.g. after an expected slowdown) as the new baseline: mark it successful, and stop comparing against earlier runs")
+
     for arg in docker_args:
         parser.add_argument(*arg.args, **arg.kwargs)
 
     for arg in jupyter_args:
         jupyter_parser.add_argument(*arg.args, **arg.kwargs)
 
-    for arg in run_args:
+    for arg in run_args + host_run_args:
         run_parser.add_argument(*arg.args, **arg.kwargs)
 
     if args:
@@ -77,6 +151,9 @@ def main(*args):
     else:
         args = parser.parse_args()
 
+    if args.profile:
+        timeline.enable()
+
     jupyter_mode = shell_mode = run_mode = False
     cmd = getattr(args, 'cmd', None)
     if cmd =='jupyter':
@@ -85,11 +162,57 @@ def main(*args):
         shell_mode = True
     elif cmd == 'run':
         run_mode = True
+    elif cmd == 'rehydrate':
+        from .config import DEFAULT_NB_DIR
+        from .outputs import rehydrate, OUTPUTS_DIR
+        if args.input:
+            chdir(args.input)
+        config = Config(args)
+        nbs = args.file or [ join(config.get('out', DEFAULT_NB_DIR), basename(config.get('run', DEFAULT_RUN_NB))) ]
+        if args.output and len(nbs) > 1:
+            raise ValueError(f'-o/--output requires a single notebook, found {len(nbs)}')
+        outputs_dir = args.outputs_dir or config.get('outputs_dir')
+        for nb in nbs:
+            restored = rehydrate(nb, outputs_dir or join(dirname(nb), OUTPUTS_DIR), args.output)
+            print(f'Restored {restored} outputs into {args.output or nb}')
+        return
+    elif cmd == 'perf':
+        from . import history
+        from .config import DEFAULT_NB_DIR
+        if args.input:
+            chdir(args.input)
+        config = Config(args)
+        paths = args.file or [ join(config.get('out', DEFAULT_NB_DIR), basename(config.get('run', DEFAULT_RUN_NB))) ]
+        max_slowdown = args.max_slowdown or config.get('max_slowdown')
+        slow = []
+        for path in paths:
+            if not path.endswith(history.HISTORY_SUFFIX):
+                path = history.history_path(path)
+            if args.accept:
+                if history.accept(path):
+                    print(f'{path}: accepted latest run as the new baseline')
+                else:
+                    print(f'{path}: no history (run with `--history`)')
+                continue
+            entries = history.load(path)
+            if not entries:
+                print(f'{path}: no history (run with `--history`)')
+                continue
+            rows = history.compare(entries, args.runs or history.BASELINE_RUNS)
+            print(f'{path}: {len(entries)} runs, latest {entries[-1]["time"]}')
+            print(history.report(rows))
+            if max_slowdown:
+                slow += history.regressions(rows, max_slowdown, history.MIN_SECS if args.min_secs is None else args.min_secs)
+        if slow:
+            print(f'{len(slow)} cell(s) slowed down by more than {max_slowdown}x')
+            exit(1)
+        return
     else:
         raise ValueError(f'Unknown cmd: {cmd}')
 
     if run_mode:
-        run_config = load_run_config(args)
+        with timeline.span('load_run_config'):
+            run_config = load_run_config(args)
 
         dir = args.dir
         if dir:
@@ -102,7 +225,8 @@ def main(*args):
 
     cwd = getcwd()
 
-    config = Config(args)
+    with timeline.span('Config'):
+        config = Config(args)
     get = partial(Config.get, config)
 
     container_pips = lists(get('container_pip')) + lists(get('pie'))
@@ -221,6 +345,14 @@ def main(*args):
 
     out = get('out') or 'nbs'
 
+    profile_events = None
+    if args.profile:
+        # Host- and container-side events are appended to one file, and merged into <out>/profile.json at the end
+        from .config import state_path, STATE_DIR
+        profile_events = abspath(state_path(timeline.EVENTS_FILE))
+        timeline.start(profile_events)
+        container_envs[timeline.PROFILE_ENV] = join(workdir, STATE_DIR, timeline.EVENTS_FILE)
+
     mounts = lists(get('mount', []))
     mounts = Mounts(mounts, err=missing_paths)
     env_mnts = env.get('GSMO_MOUNTS')
@@ -229,27 +361,11 @@ def main(*args):
 
     def dind_mnt(src, dst):
         mnt = Mount(src, dst, err=missing_paths)
-        print(f'inspecting mount {mnt} for re-mapping: {env_mnts}')
-        if env_mnts:
-            dst2src = env_mnts.dst2src
-            dir = src
-            relpath = None
-            while True:
-                if dir in dst2src:
-                    host_src = dst2src[dir]
-                    if relpath:
-                        host_src = join(host_src, relpath)
-                    host_mnt = Mount(host_src,dst,keep_missing=True)
-                    print(f'Re-mapping mount {mnt} to host src: {host_mnt}')
-                    return host_mnt
-                parent = dirname(dir)
-                if parent == dir:
-                    break
-                if not relpath:
-                    relpath = basename(dir)
-                else:
-                    relpath = join(basename(dir), relpath)
-                dir = parent
+        # When running inside a gsmo container (DinD), `src` is a container path; map it to the host path it's bound from
+        if env_mnts and (host_src := env_mnts.remap(src)) is not None:
+            host_mnt = Mount(host_src,dst,keep_missing=True)
+            print(f'Re-mapping mount {mnt} to host src: {host_mnt}')
+            return host_mnt
         return mnt
 
     mounts = Mounts([ dind_mnt(m.src, m.dst) for m in mounts.mounts ])
@@ -291,16 +407,53 @@ def main(*args):
         container_pips = [gsmo_dir] + container_pips
 
     use_docker = get('docker', True)
-    rm = get('remove_container')
+    rm = get(['rm','remove_container'])
+
+    pool = get('pool')
+    pool_max_runs = get('pool_max_runs', DEFAULT_MAX_RUNS)
+    if pool and (jupyter_mode or not use_docker):
+        stderr.write(f'Ignoring `pool` setting (only supported for Docker `run`/`shell` modes)\n')
+        pool = None
 
     ports = lists(get('port'))
     apts = lists(get('apt'))
 
     tags = lists(get('tag'))
     name = get('name', default=basename(cwd)).lower()
+
+    if run_mode and (affected := get('affected')):
+        from .modules import Modules
+        from .run_queue import split_args
+        # Forward the other CLI args to each module's run; the notebook and output dir are passed per-module, and
+        # `input`/`-C` (already applied here) would be relative to this repo
+        opts, module_run_args = split_args(argv)
+        if args.input in opts:
+            opts.remove(args.input)
+        module_run_args = without_args(module_run_args, '--affected', '-C', '--dir', '-o', '--out', '-x', '--run', '--execute')
+        Modules().run_all(nb=args.run or DEFAULT_RUN_NB, out=args.out, affected=affected, gsmo_args=(opts, module_run_args))
+        return
+
+    if run_mode and get('skip_unchanged') and exists(run_nb := get('run', DEFAULT_RUN_NB)):
+        output = out if out.endswith('.ipynb') else join(out, basename(run_nb))
+        last_img_hash = (read_manifest(output) or {}).get('image')
+        if use_docker and not (last_img_hash and cached_image(name, last_img_hash)):
+            # The image the last run used (identified by its content hash) is gone or has been rebuilt
+            last_img_hash = f'{name} (unknown hash)'
+        current = manifest(run_nb, run_config, lists(get('inputs')), image=last_img_hash if use_docker else None)
+        if not (reasons := changes(output, current)):
+            print(f'Inputs unchanged since last successful run ({output}); skipping')
+            return
+        print(f'Running: {"; ".join(reasons)}')
+
+    # Deferred until an image/container is actually needed (`utz` imports pandas, and dominates CLI startup time)
+    from utz import o, singleton
+    from utz.process import run
+    import yaml
+
     skip_requirements_txt = args.skip_requirements_txt
     root = get('root')
 
+    from .util.git_id import get_git_id
     from .util.unix_id import UnixId
     id = UnixId()
 
@@ -327,6 +480,9 @@ def main(*args):
         sudo = True
 
     dry_run = get('dry_run')
+    rebuild = get('rebuild')
+    layered = get('layered')
+    minimal_context = get('minimal_context', True)
 
     if jupyter_mode:
         jupyter_src_port = jupyter_dst_port = None
@@ -413,25 +569,41 @@ def main(*args):
         cmd_args = [ '--run', run_nb, '--out', out, ]
         if commit:
             cmd_args += [ ['--commit',path] for path in commit]
+        if get('zygote'):
+            cmd_args += [ '--zygote', ]
+        if get('memo'):
+            cmd_args += [ '--memo', ]
+        if get('stream'):
+            cmd_args += [ '--stream', ]
+        if get('fast_commit'):
+            cmd_args += [ '--fast-commit', ]
+        if get('history'):
+            cmd_args += [ '--history', ]
+        if (max_slowdown := get('max_slowdown')):
+            cmd_args += [ '--max-slowdown', str(max_slowdown), ]
+        if (externalize := get('externalize')):
+            cmd_args += [ '--externalize', ] if externalize is True else [ '--externalize', str(externalize), ]
+        if (sweep := get('sweep')):
+            if relpath(abspath(sweep), cwd).startswith('..'):
+                # Sweep files outside the module directory need to be mounted into the container
+                SWEEP_YML_PATH = '/sweep.yml'
+                mounts += dind_mnt(abspath(sweep), SWEEP_YML_PATH)
+                sweep = SWEEP_YML_PATH
+            else:
+                sweep = relpath(abspath(sweep), cwd)
+            cmd_args += [ '--sweep', sweep, ]
 
     if dind:
-        [gid,grp] = line(
-            'docker','run',
-            '-v','/var/run/docker.sock:/var/run/docker.sock',
-            '--rm','--entrypoint','stat',
-            base_image,
-            '-c','%g %G','/var/run/docker.sock',
-        ).split(' ')
+        gid, grp = docker_sock_group(base_image)
         docker_sock = o(gid=gid,grp=grp)
         print(f'Parsed /var/run/docker.sock group: {grp} ({gid})')
 
     # Remove any existing container
     run_in_existing_container = False
     rm_existing_container = False
-    if use_docker:
-        container = process.json('docker','container','inspect',name, err_ok=True)
+    if use_docker and not pool:
+        container = docker_api.inspect_container(name)
         if container:
-            container = singleton(container, dedupe=False)
             if container.get('State',{}).get('Running',False):
                 container_labels = container.get('Config').get('Labels',{})
                 if not container_labels.get('gsmo.image',{}):
@@ -441,6 +613,17 @@ def main(*args):
             else:
                 rm_existing_container = True
 
+    jupyter_runtime_dir = None
+    if jupyter_mode and use_docker and not run_in_existing_container:
+        # Have the server write its connection info (incl. token) to a mounted directory, which we watch for it
+        from . import jupyter_runtime
+        from .config import state_path
+        jupyter_runtime_dir = state_path('jupyter', name)
+        makedirs(jupyter_runtime_dir, exist_ok=True)
+        jupyter_runtime.clear(jupyter_runtime_dir)
+        mounts += dind_mnt(jupyter_runtime_dir, jupyter_runtime.RUNTIME_DIR_DST)
+        container_envs[jupyter_runtime.RUNTIME_DIR_ENV] = jupyter_runtime.RUNTIME_DIR_DST
+
     from utz import docker
     from utz.use import use
 
@@ -460,6 +643,7 @@ def main(*args):
         'version': version,
     }
 
+    img_hash = None
     if not run_in_existing_container:
         dockerfile = join(cwd, 'Dockerfile')
         if exists(dockerfile) and not explict_base_img:
@@ -468,18 +652,24 @@ def main(*args):
         else:
             extend = None
 
+        render_start = timeline.now()
         file = docker.File(extend=extend)
         with use(file), file:
             if not extend:
+                if layered:
+                    file.write(layers.SYNTAX)
                 FROM(base_image)
 
             if apts:
                 if use_docker:
                     build_image = True
-                    RUN(
-                        'apt-get update',
-                        f'apt-get install -y {" ".join(apts)}'
-                    )
+                    if layered:
+                        layers.apt_install(file, apts)
+                    else:
+                        RUN(
+                            'apt-get update',
+                            f'apt-get install -y {" ".join(apts)}'
+                        )
                 else:
                     stderr.write(f'Installing apt deps skipped in docker-less mode: {" ".join(apts)}\n')
 
@@ -495,41 +685,24 @@ def main(*args):
             if pips:
                 if use_docker:
                     build_image = True
-                    RUN('pip install "%s"' % "\" \"".join(pips))
+                    if layered:
+                        # Pinned deps change less often than unpinned ones; install them in separate, earlier layers
+                        pinned, unpinned = layers.split_pinned(pips)
+                        layers.pip_install(file, pinned)
+                        layers.pip_install(file, unpinned)
+                    else:
+                        RUN('pip install "%s"' % "\" \"".join(pips))
                 else:
                     import pip
                     print('pip install "%s"' % "\" \"".join(pips))
                     pip.main(['install'] + pips)
 
-            ENV('GSMO=1', { f'GSMO_{k.upper()}':v for k,v in default_kvs.items()})
-
-            if image_envs:
-                build_image = True
-                ENV(image_envs)
-
-            if image_env_file:
-                build_image = True
-                with open(image_env_file,'r') as f:
-                    ENV(*[ l.strip() for l in f.readlines() ])
-
-            LABEL('gsmo', { f'gsmo.{k}':v for k,v in default_kvs.items()})
-
-            if labels:
-                build_image = True
-                LABEL(**labels)
-
-            if labels_file:
-                build_image = True
-                with open(labels_file,'r') as f:
-                    LABEL(*[ l.strip() for l in f.readlines() ])
-
+            user_cmds = []
             if use_docker:
                 if image_user or image_group or sudo or dind:
-                    cmds = []
-
                     if image_group or dind:
                         assert image_group
-                        cmds += [f'groupadd -f -o -g {id.gid} {image_group}']
+                        user_cmds += [f'groupadd -f -o -g {id.gid} {image_group}']
 
                     if image_user or dind:
                         assert image_user
@@ -537,24 +710,56 @@ def main(*args):
                             useradd = f'useradd -u {id.uid} -g {id.gid} -G {docker_sock.gid} -s /bin/bash -m -d {IMAGE_HOME} {image_user}'
                         else:
                             useradd = f'useradd -u {id.uid} -g {id.gid} -s /bin/bash -m -d {IMAGE_HOME} {image_user}'
-                        cmds += [useradd,]
+                        user_cmds += [useradd,]
 
                     if sudo or dind:
                         # user isn't known at build-time though, so pswd-less sudo is patched in here
-                        cmds += [ 'perl -pi -e "s/^%%sudo(.*ALL=).*/%s\\1(ALL) NOPASSWD: ALL/" /etc/sudoers' % image_user, ]
+                        user_cmds += [ 'perl -pi -e "s/^%%sudo(.*ALL=).*/%s\\1(ALL) NOPASSWD: ALL/" /etc/sudoers' % image_user, ]
 
-                    cmds += [
+                    user_cmds += [
                         f'chown -R {id.uid}:{id.gid} {IMAGE_HOME}'
                     ]
 
-                    build_image = True
-                    RUN(*cmds)
+            def user_setup():
+                if user_cmds:
+                    RUN(*user_cmds)
                     if image_user:
                         if image_group:
                             USER(id.uid, id.gid)
                         else:
                             USER(id.uid)
 
+            if user_cmds:
+                build_image = True
+                if layered:
+                    # User/group setup rarely changes; put it ahead of the ENV/LABEL layers (which embed run-specific values)
+                    user_setup()
+
+            ENV('GSMO=1', { f'GSMO_{k.upper()}':v for k,v in default_kvs.items()})
+
+            if image_envs:
+                build_image = True
+                ENV(image_envs)
+
+            if image_env_file:
+                build_image = True
+                with open(image_env_file,'r') as f:
+                    ENV(*[ l.strip() for l in f.readlines() ])
+
+            LABEL('gsmo', { f'gsmo.{k}':v for k,v in default_kvs.items()})
+
+            if labels:
+                build_image = True
+                LABEL(**labels)
+
+            if labels_file:
+                build_image = True
+                with open(labels_file,'r') as f:
+                    LABEL(*[ l.strip() for l in f.readlines() ])
+
+            if not layered:
+                user_setup()
+
             if build_image:
                 assert use_docker
                 if dry_run == 2:
@@ -562,50 +767,98 @@ def main(*args):
                     file.close(closed_ok=True)
                     with open(file.path,'r') as f:
                         print(f.read())
+                    build = last_build(name)
+                    if build:
+                        print(f'Last build of image {name}: {build["seconds"]:.1f}s%s' % (' (layered)' if build.get('layered') else ''))
+                    else:
+                        print(f'No recorded builds of image {name}')
                     exit(0)
                 else:
-                    file.build(name, closed_ok=True)
+                    # Skip the build if an image with the same content hash already exists
+                    file.close(closed_ok=True)
+                    timeline.event('render Dockerfile', render_start, timeline.now() - render_start)
+                    img_hash = image_hash(file.path, [ reqs_txt, image_env_file, labels_file, extend, ], dir=cwd)
+                    if img_hash and not rebuild and cached_image(name, img_hash):
+                        print(f'Image {name} is up to date (hash {img_hash}); skipping build')
+                    else:
+                        if img_hash:
+                            LABEL({ IMAGE_HASH_LABEL: img_hash })
+                            ENV({ IMAGE_HASH_ENV: img_hash })
+                        if layered:
+                            env['DOCKER_BUILDKIT'] = '1'
+                        start = time.time()
+                        file.close(closed_ok=True)
+                        context = build_context(file.path, cwd) if minimal_context else cwd
+                        try:
+                            with timeline.span('docker build', image=name):
+                                file.build(name, dir=context, closed_ok=True)
+                        finally:
+                            if context != cwd:
+                                rmtree(context)
+                        elapsed = time.time() - start
+                        print(f'Built image {name} in {elapsed:.1f}s')
+                        record_build(name, elapsed, hash=img_hash, layered=bool(layered))
                     image = name
                     if tags:
                         for tag in tags:
-                            run('docker','tag',name,f'{name}:{tag}')
+                            docker_api.tag(name, f'{name}:{tag}')
 
     # Determine user to run as (inside Docker container)
     user_args = []
     if not root:
-        uid = line('id','-u')
-        if uid == '0':
+        if id.uid == '0':
             root = True
         else:
-            gid = line('id','-g')
-            user_args = [ '-u', f'{uid}:{gid}' ]
+            user_args = [ '-u', f'{id.uid}:{id.gid}' ]
 
     # Remove any existing container
     if rm_existing_container:
-        run('docker','container','rm',name)
+        docker_api.remove_container(name)
 
     interactive = not args.no_interactive
     if interactive:
         flags = [ '-it' ]
     else:
         flags = []
+    # `docker run`-only flags (`docker exec` rejects `--rm`)
+    rm_flags = []
     if rm:
         assert use_docker
-        if not run_in_existing_container:
-            flags += ['--rm']
-
-    if container_pips:
-        cmd_args = [ len(container_pips) ] + container_pips + [ entrypoint ] + cmd_args
-        entrypoint = join(gsmo_dir,'pip_entrypoint.sh')
-
+        if pool:
+            stderr.write('Ignoring `remove_container` setting (pooled containers are reused across runs)\n')
+        elif not run_in_existing_container:
+            rm_flags = ['--rm']
+
+    def chain(entrypoint, cmd_args):
+        '''Wrap an entrypoint in the `pip install -e` and DinD setup scripts, as necessary'''
+        if container_pips:
+            cmd_args = [ len(container_pips) ] + container_pips + [ entrypoint ] + cmd_args
+            entrypoint = join(gsmo_dir,'pip_entrypoint.sh')
+
+        if dind:
+            cmd_args = [entrypoint] + cmd_args
+            entrypoint = join(gsmo_dir,'dind_entrypoint.sh')
+
+        return entrypoint, cmd_args
+
+    pip_cache_args = []
+    if container_pips and use_docker and get('pip_cache', True):
+        # Editable installs persist in a named volume, and unchanged packages are only re-linked on later runs
+        container_envs[PIP_CACHE_ENV] = PIP_CACHE_DST
+        pip_cache_args = [ '-v', f'gsmo-pip-{name}:{PIP_CACHE_DST}' ]
+
+    # Pooled containers run the setup chain once (ending in an idle command), and runs are `exec`'d into them directly
+    run_entrypoint, run_cmd_args = entrypoint, cmd_args
+    entrypoint, cmd_args = chain(entrypoint, cmd_args)
     if dind:
-        cmd_args = [entrypoint] + cmd_args
-        entrypoint = join(gsmo_dir,'dind_entrypoint.sh')
         groups.append(docker_sock.gid)
 
     if run_mode:
         RUN_CONFIG_YML_PATH = '/run_config.yml'
-        if run_config:
+        if run_config and pool:
+            # Pooled containers' mounts are fixed when they're created; pass run config inline instead
+            run_cmd_args += [ '-y', yaml.safe_dump(dict(run_config), sort_keys=False) ]
+        elif run_config:
             run_config_file = NamedTemporaryFile(dir=env.get('GSMO_DIR'), suffix='.yml', delete=False)
             run_config_path = run_config_file.name
             print(f'Writing run config to {run_config_path} (gsmo dir: {gsmo_dir})')
@@ -618,19 +871,8 @@ def main(*args):
     else:
         print('no run mode')
 
-    def get_git_id(k, fmt):
-        try:
-            v = line('git','config',f'user.{k}')
-        except CalledProcessError:
-            v = line('git','log','-n','1',f'--format={fmt}')
-            stderr.write(f'Falling back to Git user {k} from most recent commit: {v}\n')
-        return v
-
     # Get Git user name/email for propagating into image
-    git_id = o(
-        name  = get_git_id( 'name', '%an'),
-        email = get_git_id('email', '%ae'),
-    )
+    git_id = o(**get_git_id())
 
     # Set up author info for git committing
     container_envs = {
@@ -672,7 +914,9 @@ def main(*args):
     else:
         all_flags = \
             exec_flags + \
+            rm_flags + \
             mounts.args() + \
+            pip_cache_args + \
             port_args + \
             user_args + \
             label_args + \
@@ -686,7 +930,7 @@ def main(*args):
             cmd_args
 
     if use_docker:
-        if jupyter_mode and check('which', 'open'):
+        if jupyter_mode and which('open'):
             # 1. run docker container in detached mode
             # 2. parse+open jupyter token URL in browser (try every 1s)
             # 3. re-attach container
@@ -706,7 +950,10 @@ def main(*args):
                 run(*cmd, dry_run=True)
             else:
                 def get_jupyter_link():
-                    lns = lines('docker','exec',name,'jupyter','notebook','list')
+                    code, out = docker_api.exec(name, ['jupyter','notebook','list'])
+                    if code:
+                        raise RuntimeError(f'`jupyter notebook list` exited {code}')
+                    lns = out.splitlines()
                     [ first, *rest ] = lns
                     if first != 'Currently running servers:':
                         raise Exception('Unexpected `jupyter notebook list` output:\n\t%s' % "\n\t".join(lns))
@@ -724,8 +971,18 @@ def main(*args):
                         return None
 
                 run(*cmd)
-                from utz.backoff import backoff
-                url = backoff(get_jupyter_link, init=.5, step=1.6, max=5)
+                if jupyter_runtime_dir:
+                    from .jupyter_runtime import server_url, wait_for_server
+                    def alive():
+                        return (docker_api.inspect_container(name) or {}).get('State',{}).get('Running',False)
+                    info = wait_for_server(jupyter_runtime_dir, alive=alive)
+                    if info.get('port') != int(jupyter_dst_port):
+                        raise RuntimeError(f'Jupyter running on unexpected port {info.get("port")} (!= {jupyter_dst_port})')
+                    url = server_url(info, jupyter_src_port)
+                else:
+                    # Existing containers don't have the runtime dir mounted; poll `jupyter notebook list`
+                    from utz.backoff import backoff
+                    url = backoff(get_jupyter_link, init=.5, step=1.6, max=5)
                 if jupyter_open:
                     try:
                         run('open',url)
@@ -738,18 +995,57 @@ def main(*args):
                         run('docker','attach',name)
         else:
             print(f'running from {cwd}')
-            if run_in_existing_container:
-                run(
-                    'docker','exec',
-                    all_args,
-                    dry_run=dry_run,
-                )
-            else:
-                run(
-                    'docker','run',
-                    all_args,
-                    dry_run=dry_run,
-                )
+            try:
+                if pool:
+                    pool_entrypoint, pool_cmd_args = chain(IDLE_CMD[0], IDLE_CMD[1:])
+                    # Pooled containers outlive this run; profiling is (un)set per `exec` instead
+                    profile_env = f'{timeline.PROFILE_ENV}={container_envs.get(timeline.PROFILE_ENV, "")}'
+                    pool_exec_flags = exec_flags + [ '-e', profile_env, ]
+                    pool_run_args = \
+                        [ arg for arg in env_args if arg != [ '-e', profile_env, ] ] + \
+                        workdir_args + \
+                        mounts.args() + \
+                        pip_cache_args + \
+                        port_args + \
+                        user_args + \
+                        label_args + \
+                        group_args
+                    # Pooled containers are recycled when the image, or any of the settings they're created with, change
+                    pool_hash = hash_obj([
+                        img_hash or image_id(image),
+                        pool_run_args,
+                        pool_entrypoint,
+                        pool_cmd_args,
+                        hash_paths([ container_env_file ]),
+                    ])[:16]
+                    if dry_run:
+                        print(f'Would run in pooled container for {name} (max {pool} containers, hash {pool_hash}):')
+                        run('docker','exec',pool_exec_flags,f'{name}-pool-<idx>',run_entrypoint,run_cmd_args, dry_run=True)
+                    else:
+                        pool = Pool(name, pool_hash, size=pool, max_runs=pool_max_runs)
+                        with pool.acquire(pool_run_args, image, pool_entrypoint, pool_cmd_args) as container:
+                            with timeline.span('docker exec', container=container):
+                                run('docker','exec',pool_exec_flags,container,run_entrypoint,run_cmd_args)
+                elif run_in_existing_container:
+                    with timeline.span('docker exec', container=name):
+                        run(
+                            'docker','exec',
+                            all_args,
+                            dry_run=dry_run,
+                        )
+                else:
+                    with timeline.span('docker run', container=name):
+                        run(
+                            'docker','run',
+                            all_args,
+                            dry_run=dry_run,
+                        )
+            finally:
+                if profile_events and exists(profile_events):
+                    trace = join(dirname(out) if out.endswith('.ipynb') else out, timeline.TRACE_FILE)
+                    makedirs(dirname(abspath(trace)), exist_ok=True)
+                    n = timeline.merge(profile_events, trace)
+                    print(f'Wrote {n} profile events to {trace}')
     else:
         if jupyter_src_port != jupyter_dst_port:
             raise ValueError(f'Mismatching jupyter ports in non-docker mode: {jupyter_src_port} != {jupyter_dst_port}')
@@ -0,0 +1,161 @@
+from datetime import datetime, timezone
+from hashlib import sha256
+import json
+from os.path import exists, splitext
+from statistics import median
+
+from .nb import read_nb
+from .timeline import parse_time
+
+# Per-run cell timings/resource usage are appended (one JSON line per run) to a file next to the output notebook
+HISTORY_SUFFIX = '.history.jsonl'
+# `gsmo perf` compares the latest run against the median of this many previous (successful) runs
+BASELINE_RUNS = 10
+# Cells faster than this (in the latest run) aren't flagged as regressions (their timings are mostly noise)
+MIN_SECS = 1.
+
+# Run (silently) in the kernel after each cell: cumulative CPU seconds, and peak RSS (bytes) since the last call
+USAGE_CODE = '''
+def __gsmo_usage():
+    import resource, sys
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = usage.ru_utime + usage.ru_stime
+    try:
+        # Linux: peak RSS since the last reset ("VmHWM"), which writing "5" to clear_refs resets
+        with open('/proc/self/status', 'r') as f:
+            rss = next(int(ln.split()[1]) for ln in f if ln.startswith('VmHWM:')) * 1024
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except (OSError, StopIteration):
+        # Peak RSS since the kernel started (bytes on macOS, KiB elsewhere)
+        rss = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return (cpu, rss)
+__gsmo_result = __gsmo_usage()
+del __gsmo_usage
+'''
+
+
+def history_path(output):
+    return f'{splitext(output)[0]}{HISTORY_SUFFIX}'
+
+
+def cell_stats(nb_path):
+    '''[index, source hash, seconds, CPU seconds, peak RSS] for each executed code cell in an output notebook
+
+    Cells replayed from a `memo` cache (which take ~0s, and have no usage stats) are skipped.
+    '''
+    stats = []
+    for idx, cell in enumerate(read_nb(nb_path)['cells']):
+        pm = cell.get('metadata', {}).get('papermill', {})
+        if cell['cell_type'] != 'code' or not pm.get('start_time') or not pm.get('end_time'):
+            continue
+        meta = cell['metadata'].get('gsmo', {})
+        if meta.get('memoized'):
+            continue
+        source = cell['source'] if isinstance(cell['source'], str) else ''.join(cell['source'])
+        usage = meta.get('usage', {})
+        stats.append([
+            idx,
+            sha256(source.encode()).hexdigest()[:8],
+            round((parse_time(pm['end_time']) - parse_time(pm['start_time'])) / 1e6, 3),
+            usage.get('cpu'),
+            usage.get('rss'),
+        ])
+    return stats
+
+
+def new_entry(output, success=True):
+    '''History entry for output notebook `output`'''
+    return dict(
+        time=datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        success=success,
+        cells=cell_stats(output),
+    )
+
+
+def write(path, entries):
+    with open(path,'w') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+
+def record(output, success=True, entry=None):
+    '''Append the cell stats of output notebook `output` (or a precomputed `entry`) to its history file; returns the
+    history file's path'''
+    path = history_path(output)
+    if entry is None:
+        entry = new_entry(output, success)
+    with open(path,'a') as f:
+        f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+    return path
+
+
+def load(path):
+    if not exists(path):
+        return []
+    with open(path,'r') as f:
+        return [ json.loads(ln) for ln in f if ln.strip() ]
+
+
+def accept(path):
+    '''Mark the latest run in history file `path` as successful, and as a new baseline (e.g. after an expected
+    slowdown): runs before it are no longer compared against; returns the updated entry (or None, if there's no
+    history)'''
+    entries = load(path)
+    if not entries:
+        return None
+    entries[-1].update(success=True, baseline=True)
+    write(path, entries)
+    return entries[-1]
+
+
+def compare(entries, runs=BASELINE_RUNS):
+    '''Compare the latest run's cells to the median of the previous `runs` successful runs (since the last `accept`ed
+    one)
+
+    Cells are matched by source hash, so that editing other cells doesn't confuse the comparison. Returns a dict per
+    cell of the latest run: index, seconds, baseline (median seconds, or None if there's no history for the cell),
+    ratio, CPU seconds, and peak RSS.
+    '''
+    if not entries:
+        return []
+    [ *prev, latest ] = entries
+    if (accepted := [ idx for idx, entry in enumerate(prev) if entry.get('baseline') ]):
+        prev = prev[accepted[-1]:]
+    prev = [ entry for entry in prev if entry.get('success') ][-runs:]
+    rows = []
+    for idx, src, secs, cpu, rss in latest['cells']:
+        history = [ cell[2] for entry in prev for cell in entry['cells'] if cell[1] == src ]
+        baseline = median(history) if history else None
+        rows.append(dict(
+            idx=idx,
+            secs=secs,
+            baseline=baseline,
+            ratio=secs / baseline if baseline else None,
+            cpu=cpu,
+            rss=rss,
+        ))
+    return rows
+
+
+def regressions(rows, max_slowdown, min_secs=MIN_SECS):
+    '''Cells that took at least `min_secs`, and more than `max_slowdown` times their baseline'''
+    return [
+        row for row in rows
+        if row['ratio'] is not None and row['secs'] >= min_secs and row['ratio'] > max_slowdown
+    ]
+
+
+def report(rows):
+    def fmt(v, f): return '' if v is None else f.format(v)
+    lines = [ f'{"cell":>5} {"secs":>9} {"baseline":>9} {"ratio":>6} {"cpu":>9} {"peak RSS":>10}' ]
+    for row in rows:
+        lines.append(' '.join([
+            f'{row["idx"]:>5}',
+            f'{row["secs"]:>9.3f}',
+            f'{fmt(row["baseline"], "{:.3f}"):>9}',
+            f'{fmt(row["ratio"], "{:.2f}x"):>6}',
+            f'{fmt(row["cpu"], "{:.3f}"):>9}',
+            f'{fmt(row["rss"] and row["rss"] / 2**20, "{:.1f}MiB"):>10}',
+        ]))
+    return '\n'.join(lines)
@@ -0,0 +1,170 @@
+from glob import glob
+import json
+from os import environ, makedirs, replace
+from os.path import exists, join
+from re import match
+import shlex
+from time import time
+
+from . import docker_api
+from .config import state_path, CACHE_DIR, STATE_DIR
+from .docker_api import DOCKER_SOCK
+from .digest import hash_file, hash_obj, hash_paths
+
+IMAGE_HASH_LABEL = 'gsmo.hash'
+IMAGE_HASH_ENV = 'GSMO_IMAGE_HASH'
+BUILDS_FILE = 'builds.json'
+
+# Host-wide cache of the Docker socket's group, as seen from inside each base image
+DOCKER_SOCK_GROUPS_PATH = join(CACHE_DIR, 'docker_sock_groups.json')
+
+
+def instructions(dockerfile):
+    '''Parse a Dockerfile into (instruction, args) pairs, joining line-continuations and skipping comments'''
+    with open(dockerfile,'r') as f:
+        lns = f.read().split('\n')
+
+    cur = ''
+    for ln in lns:
+        stripped = ln.strip()
+        if not cur and (not stripped or stripped.startswith('#')):
+            continue
+        if stripped.endswith('\\'):
+            cur += stripped[:-1] + ' '
+            continue
+        cur += stripped
+        if (m := match(r'(?P<cmd>\w+)\s*(?P<args>.*)$', cur)):
+            yield m['cmd'].upper(), m['args']
+        cur = ''
+
+
+def base_images(dockerfile):
+    '''Images named in FROM instructions (excluding references to earlier build stages)'''
+    images = []
+    stages = set()
+    for cmd, args in instructions(dockerfile):
+        if cmd != 'FROM':
+            continue
+        pcs = [ pc for pc in args.split() if not pc.startswith('--') ]
+        if not pcs:
+            continue
+        image = pcs[0]
+        if len(pcs) == 3 and pcs[1].lower() == 'as':
+            stages.add(pcs[2])
+        if image not in stages:
+            images.append(image)
+    return images
+
+
+def copy_srcs(dockerfile, dir):
+    '''Build-context paths that COPY/ADD instructions read from
+
+    Returns None if any source can't be resolved statically (build-args, remote URLs), in which case the build's inputs
+    aren't known.
+    '''
+    srcs = []
+    for cmd, args in instructions(dockerfile):
+        if cmd not in ['COPY','ADD']:
+            continue
+        if args.startswith('['):
+            pcs = json.loads(args)
+        else:
+            pcs = shlex.split(args)
+        flags = [ pc for pc in pcs if pc.startswith('--') ]
+        if any(flag.startswith('--from') for flag in flags):
+            continue
+        pcs = [ pc for pc in pcs if not pc.startswith('--') ]
+        for src in pcs[:-1]:
+            if '$' in src or match(r'^\w+://', src):
+                return None
+            paths = sorted(glob(join(dir, src)))
+            if not paths:
+                return None
+            srcs += paths
+    return srcs
+
+
+def image_id(image):
+    '''Local ID (digest) of an image, or None if it isn't present'''
+    info = docker_api.inspect_image(image)
+    return info['Id'] if info else None
+
+
+def image_hash(dockerfile, paths=None, dir=None):
+    '''Content hash identifying an image build
+
+    Combines the rendered Dockerfile, extra input files (requirements.txt, env/label files, etc.), files the Dockerfile
+    COPYs/ADDs, and the IDs of its base images. Returns None if the build's inputs can't be determined (in which case the
+    image should always be rebuilt).
+    '''
+    srcs = copy_srcs(dockerfile, dir) if dir else []
+    if srcs is None:
+        print(f"Couldn't resolve COPY/ADD sources in {dockerfile}; skipping image cache")
+        return None
+    bases = { base: image_id(base) for base in base_images(dockerfile) }
+    return hash_obj(dict(
+        dockerfile=hash_file(dockerfile),
+        paths=hash_paths(paths or []),
+        srcs=hash_paths(srcs, root=dir),
+        bases=bases,
+    ))
+
+
+def cached_image(name, hash):
+    '''Return True iff image `name` exists and is labeled with content hash `hash`'''
+    info = docker_api.inspect_image(name)
+    labels = info and info.get('Config',{}).get('Labels')
+    if not labels:
+        return False
+    return labels.get(IMAGE_HASH_LABEL) == hash
+
+
+def load_builds():
+    path = join(STATE_DIR, BUILDS_FILE)
+    if not exists(path):
+        return {}
+    with open(path,'r') as f:
+        return json.load(f)
+
+
+def record_build(name, seconds, hash=None, layered=False):
+    '''Record the duration of an image build in the module's state dir'''
+    builds = load_builds()
+    builds[name] = dict(seconds=seconds, hash=hash, layered=layered, time=time())
+    with open(state_path(BUILDS_FILE),'w') as f:
+        json.dump(builds, f, indent=2)
+
+
+def last_build(name):
+    return load_builds().get(name)
+
+
+def docker_sock_group(image):
+    '''GID and name of the group that owns the Docker socket, as seen from inside a container of `image`
+
+    Finding this requires running a throwaway container (the socket's ownership can differ between the host and e.g.
+    a Docker Desktop VM), so results are cached per image (and Docker host).
+    '''
+    key = f'{environ.get("DOCKER_HOST", "")}|{image}'
+    groups = {}
+    if exists(DOCKER_SOCK_GROUPS_PATH):
+        with open(DOCKER_SOCK_GROUPS_PATH,'r') as f:
+            groups = json.load(f)
+    if key in groups:
+        return tuple(groups[key])
+
+    from utz.process import line
+    gid, grp = line(
+        'docker','run',
+        '-v',f'{DOCKER_SOCK}:{DOCKER_SOCK}',
+        '--rm','--entrypoint','stat',
+        image,
+        '-c','%g %G',DOCKER_SOCK,
+    ).split(' ')
+    groups[key] = [ gid, grp ]
+    makedirs(CACHE_DIR, exist_ok=True)
+    tmp = f'{DOCKER_SOCK_GROUPS_PATH}.tmp'
+    with open(tmp,'w') as f:
+        json.dump(groups, f, indent=2)
+    replace(tmp, DOCKER_SOCK_GROUPS_PATH)
+    return gid, grp
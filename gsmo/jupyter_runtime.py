@@ -0,0 +1,59 @@
+from glob import glob
+import json
+from os import remove
+from os.path import join
+from time import sleep, time
+
+# Jupyter servers write their connection info (URL, port, token, etc.) to `$JUPYTER_RUNTIME_DIR/<prefix>-<pid>.json` once
+# they are listening; `gsmo jupyter` mounts a host directory there
+RUNTIME_DIR_ENV = 'JUPYTER_RUNTIME_DIR'
+RUNTIME_DIR_DST = '/jupyter-runtime'
+SERVER_INFO_GLOBS = [ 'nbserver-*.json', 'jpserver-*.json', ]
+
+
+def server_infos(runtime_dir):
+    paths = [ path for pattern in SERVER_INFO_GLOBS for path in glob(join(runtime_dir, pattern)) ]
+    infos = []
+    for path in paths:
+        try:
+            with open(path,'r') as f:
+                infos.append(json.load(f))
+        except (OSError, ValueError):
+            # Partially written, or removed (e.g. by a server shutting down) since the glob
+            pass
+    return infos
+
+
+def clear(runtime_dir):
+    '''Remove server info files left by previous servers'''
+    for pattern in SERVER_INFO_GLOBS:
+        for path in glob(join(runtime_dir, pattern)):
+            remove(path)
+
+
+def wait_for_server(runtime_dir, alive=None, timeout=60, interval=.05, alive_interval=1):
+    '''Wait for a Jupyter server to write its connection info to `runtime_dir`; return it
+
+    `alive` (optional) is called every `alive_interval` seconds, and should return False if the server has died.
+    '''
+    start = last_alive = time()
+    while True:
+        infos = server_infos(runtime_dir)
+        if infos:
+            return infos[0]
+        now = time()
+        if now - start > timeout:
+            raise TimeoutError(f'No Jupyter server info found in {runtime_dir} after {timeout}s')
+        if alive and now - last_alive > alive_interval:
+            if not alive():
+                raise RuntimeError(f'Jupyter server exited before writing its info to {runtime_dir}')
+            last_alive = now
+        sleep(interval)
+
+
+def server_url(info, port):
+    '''Tokenized URL for a server described by `info`, reached via host port `port`'''
+    url = f'http://127.0.0.1:{port}{info.get("base_url", "/")}'
+    if info.get('token'):
+        url += f'?token={info["token"]}'
+    return url
@@ -0,0 +1,64 @@
+from os import getcwd
+from os.path import abspath, exists, join
+
+from .config import DEFAULT_CONFIG_FILE
+from .digest import hash_obj, hash_paths
+from .nb import read_nb, write_nb
+
+# Run manifests are stored in output notebooks' metadata, under this key
+METADATA_KEY = 'gsmo'
+
+# Files that (along with the run notebook, config, and declared inputs) determine a module's run
+MODULE_FILES = [ DEFAULT_CONFIG_FILE, 'Dockerfile', 'requirements.txt', ]
+
+
+def hash_notebook(path):
+    '''Hash a notebook's cells' types and sources (ignoring outputs and metadata, which change on every run)'''
+    nb = read_nb(path)
+    return hash_obj([
+        (cell['cell_type'], ''.join(cell['source']) if isinstance(cell['source'], list) else cell['source'])
+        for cell in nb['cells']
+    ])
+
+
+def manifest(input, run_config=None, inputs=None, image=None, root=None):
+    '''Hashes of everything a module run depends on
+
+    Paths are hashed relative to `root` (default: current directory), so that manifests computed on the host and in a
+    container (where the module is mounted elsewhere) match.
+    '''
+    root = root or getcwd()
+    return dict(
+        notebook=hash_notebook(input),
+        config=hash_obj(run_config or {}),
+        inputs=hash_paths([ abspath(path) for path in inputs or [] ], root=root),
+        module=hash_paths([ join(root, path) for path in MODULE_FILES ], root=root),
+        image=image,
+    )
+
+
+def read_manifest(output):
+    '''Manifest recorded in an output notebook (or None)'''
+    if not exists(output):
+        return None
+    return read_nb(output).get('metadata', {}).get(METADATA_KEY, {}).get('manifest')
+
+
+def write_manifest(output, manifest, success=True):
+    nb = read_nb(output)
+    nb.setdefault('metadata', {}).setdefault(METADATA_KEY, {})['manifest'] = dict(manifest, success=success)
+    write_nb(nb, output)
+
+
+def changes(output, current):
+    '''Reasons the run recorded in `output` doesn't match the `current` manifest (empty iff the run can be skipped)'''
+    last = read_manifest(output)
+    if not last:
+        return [ f'no run manifest in {output}' ]
+    if not last.get('success'):
+        return [ 'last run failed' ]
+    return [
+        f'{k} changed'
+        for k, v in current.items()
+        if last.get(k) != v
+    ]
@@ -0,0 +1,129 @@
+import json
+from os import environ, listdir, makedirs, utime
+from os.path import dirname, exists, getmtime, join
+from shutil import rmtree
+from time import time
+
+from .digest import hash_obj, hash_paths
+from .image import IMAGE_HASH_ENV
+
+MEMO_DIR = 'memo'
+OUTPUTS_FILE = 'outputs.json'
+STATE_FILE = 'state.pkl'
+
+# Snapshot the kernel's namespace after cells that take at least this long (so that later runs can resume after them)
+SNAPSHOT_SECS = 1
+# Remove cache entries that haven't been used in this long
+MAX_AGE = 30 * 24 * 60 * 60
+
+# Run in the kernel to save its namespace. Modules are saved by name, other values are pickled individually; the
+# snapshot is discarded if any value can't be pickled, or references something defined in the notebook itself (which
+# wouldn't be resolvable when the snapshot is loaded in a fresh kernel).
+SNAPSHOT_CODE = '''
+def __gsmo_snapshot(path):
+    import pickle, types
+    ip = get_ipython()
+    hidden = ip.user_ns_hidden
+    values, modules = {}, {}
+    for k, v in list(ip.user_ns.items()):
+        if k.startswith('_') or (k in hidden and hidden[k] is v) or k in ('In', 'Out', 'exit', 'quit', 'get_ipython'):
+            continue
+        if isinstance(v, types.ModuleType):
+            modules[k] = v.__name__
+            continue
+        try:
+            data = pickle.dumps(v)
+        except Exception:
+            return f'unpicklable: {k}'
+        if b'__main__' in data:
+            return f'defined in notebook: {k}'
+        values[k] = data
+    with open(path, 'wb') as f:
+        pickle.dump(dict(values=values, modules=modules), f)
+    return ''
+__gsmo_result = __gsmo_snapshot(%r)
+del __gsmo_snapshot
+'''
+
+RESTORE_CODE = '''
+def __gsmo_restore(path):
+    import importlib, pickle
+    ns = get_ipython().user_ns
+    with open(path, 'rb') as f:
+        snapshot = pickle.load(f)
+    for k, name in snapshot['modules'].items():
+        ns[k] = importlib.import_module(name)
+    for k, data in snapshot['values'].items():
+        ns[k] = pickle.loads(data)
+    return ''
+__gsmo_result = __gsmo_restore(%r)
+del __gsmo_restore
+'''
+
+
+class Memo:
+    '''Cache of notebook cells' outputs (and, for slow cells, snapshots of the kernel state after them)
+
+    Each cell's key hashes its source along with the previous cell's key; the first key hashes the run's parameters,
+    kernel, image hash (`$GSMO_IMAGE_HASH`, when running in a gsmo image), and the contents of declared `inputs` paths.
+    '''
+    def __init__(self, dir, parameters=None, kernel_name=None, inputs=None, snapshot_secs=SNAPSHOT_SECS):
+        self.dir = dir
+        self.snapshot_secs = snapshot_secs
+        self.base = hash_obj(dict(
+            parameters=parameters,
+            kernel=kernel_name,
+            image=environ.get(IMAGE_HASH_ENV),
+            inputs=hash_paths(inputs or []),
+        ))
+
+    def keys(self, cells):
+        keys = []
+        key = self.base
+        for cell in cells:
+            key = hash_obj(dict(prev=key, type=cell.cell_type, source=cell.source))
+            keys.append(key)
+        return keys
+
+    def path(self, key, name): return join(self.dir, key, name)
+
+    def outputs(self, key):
+        path = self.path(key, OUTPUTS_FILE)
+        if not exists(path):
+            return None
+        with open(path,'r') as f:
+            return json.load(f)
+
+    def has_snapshot(self, key): return exists(self.path(key, STATE_FILE))
+
+    def touch(self, key):
+        path = join(self.dir, key)
+        if exists(path):
+            utime(path)
+
+    def resume_point(self, cells, keys):
+        '''Index of the last cell (in the leading run of cached cells) that has a kernel snapshot, or -1'''
+        resume = -1
+        for idx, (cell, key) in enumerate(zip(cells, keys)):
+            if cell.cell_type != 'code':
+                continue
+            if self.outputs(key) is None:
+                break
+            if self.has_snapshot(key):
+                resume = idx
+        return resume
+
+    def store(self, cell, key):
+        path = self.path(key, OUTPUTS_FILE)
+        makedirs(dirname(path), exist_ok=True)
+        with open(path,'w') as f:
+            json.dump(dict(outputs=cell.outputs, execution_count=cell.execution_count), f)
+
+    def prune(self, max_age=MAX_AGE):
+        if not exists(self.dir):
+            return
+        now = time()
+        for key in listdir(self.dir):
+            path = join(self.dir, key)
+            if now - getmtime(path) > max_age:
+                rmtree(path, ignore_errors=True)
@@ -1,10 +1,107 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
 from os import environ as env
+from os.path import exists, join, normpath, relpath
+from subprocess import CalledProcessError
 from tempfile import NamedTemporaryFile
 
+from .config import lists, load_config, DEFAULT_CONFIG_FILE, DEFAULT_NB_DIR
 from .papermill import execute
 from . import gsmo
 
 from utz import cd, sh
+from utz.process import lines
+
+
+def toposort(deps):
+    '''Order modules so that each comes after its dependencies (`deps` maps each module to a list of modules it depends on)
+
+    Ties are broken by the order of `deps`' keys. Raises on unknown dependencies and cycles.
+    '''
+    for module, module_deps in deps.items():
+        for dep in module_deps:
+            if dep not in deps:
+                raise ValueError(f'Module {module} depends on unknown module {dep}')
+
+    remaining = { module: set(module_deps) for module, module_deps in deps.items() }
+    order = []
+    while remaining:
+        ready = [ module for module, module_deps in remaining.items() if not module_deps ]
+        if not ready:
+            raise ValueError(f'Dependency cycle among modules: {", ".join(remaining)}')
+        for module in ready:
+            order.append(module)
+            del remaining[module]
+        for module_deps in remaining.values():
+            module_deps.difference_update(ready)
+    return order
+
+
+def dependents(deps, modules):
+    '''`modules`, plus all modules that (transitively) depend on them (`deps` maps each module to its dependencies)'''
+    closure = set(modules)
+    while (new := { module for module, module_deps in deps.items() if module not in closure and closure.intersection(module_deps) }):
+        closure |= new
+    return closure
+
+
+def is_submodule(module):
+    return exists(join(module, '.git'))
+
+
+def changed(module, rev, out=DEFAULT_NB_DIR, inputs=()):
+    '''Whether `module` (a subdirectory or submodule of the current repo) has changed since `rev`
+
+    Changes to the module's output directory `out` (e.g. commits of previous runs' results) are ignored. `inputs` (paths
+    relative to the module) that are outside the module are also checked.
+    '''
+    if is_submodule(module):
+        # Submodule: diff its working tree against the commit `rev` pointed it at
+        entry = lines('git','ls-tree',rev,'--',module)
+        if not entry:
+            return True
+        sha = entry[0].split()[2]
+        with cd(module):
+            try:
+                if lines('git','diff','--name-only',sha,'--','.',f':(exclude){out}'):
+                    return True
+            except CalledProcessError:
+                # `rev`'s commit isn't in the submodule's history
+                return True
+    elif lines('git','diff','--name-only',rev,'--',module,f':(exclude){join(module, out)}'):
+        return True
+
+    paths = [ normpath(join(module, path)) for path in inputs ]
+    paths = [ path for path in paths if relpath(path, module).startswith('..') ]
+    return bool(paths and lines('git','diff','--name-only',rev,'--',*paths))
+
+
+def run_module(module, nb='run.ipynb', out=DEFAULT_NB_DIR, dind=None, args=(), kwargs=None, module_kwargs=None, gsmo_args=None):
+    '''Run one module (from the parent directory), without committing it in the parent repo
+
+    `gsmo_args` (top-level `gsmo` options, and `run` args) are passed through to `gsmo` (in Docker mode).
+    '''
+    kwargs = kwargs or {}
+    opts, run_args = gsmo_args or ((), ())
+    with cd(module):
+        print(f'Running module: {module}')
+        if dind is not False:
+            with NamedTemporaryFile() as tmp:
+                with open(tmp.name,'w') as f:
+                    import yaml
+                    yaml.safe_dump(kwargs, f, sort_keys=False)
+                cmd = []
+                if 'GSMO_IMAGE' in env:
+                    cmd += ['-i',env['GSMO_IMAGE']]
+                cmd += ['-I',*opts,'run','-o',out,'-x',nb,'-Y',tmp.name,*run_args]
+                gsmo.main(*cmd)
+        else:
+            execute(
+                nb,
+                out,
+                *args,
+                **(module_kwargs or {}),
+            )
 
 
 class Modules:
@@ -17,37 +114,171 @@ class Modules:
         self.skips = skip
         self.conf = conf or {}
 
-    def run(self, module, nb='run.ipynb', out='nbs', dind=None, *args, **kwargs):
+    def skip(self, module):
         if self.skips and module in self.skips:
             print(f'Module {module} marked as "skip"; skipping')
-            return
+            return True
         if self.runs and module not in self.runs:
             print(f'Module {module} not marked as "run"; skipping')
-            return
+            return True
+        return False
 
-        module_kwargs = self.conf.get(module, {})
+    def module_kwargs(self, module, kwargs):
+        module_kwargs = dict(self.conf.get(module, {}))
+        module_kwargs.pop('deps', None)
         module_kwargs.update(kwargs)
+        return module_kwargs
 
-        with cd(module):
-            print(f'Running module: {module}')
-            if dind is not False:
-                with NamedTemporaryFile() as tmp:
-                    with open(tmp.name,'w') as f:
-                        import yaml
-                        yaml.safe_dump(kwargs, f, sort_keys=False)
-                    cmd = []
-                    if 'GSMO_IMAGE' in env:
-                        cmd += ['-i',env['GSMO_IMAGE']]
-                    cmd += ['-I','run','-o',out,'-x',nb,'-Y',tmp.name]
-                    gsmo.main(*cmd)
-            else:
-                execute(
-                    nb,
-                    out,
-                    *args,
-                    **module_kwargs,
-                )
+    def config(self, module):
+        '''`module`'s gsmo.yml, overlaid with its `conf` entry'''
+        config_path = join(module, DEFAULT_CONFIG_FILE)
+        config = load_config(config_path) if exists(config_path) else {}
+        return { **config, **self.conf.get(module, {}) }
+
+    def out(self, module, out=None):
+        '''Output directory for `module`'s runs: `out`, or its `out` config (default: DEFAULT_NB_DIR)'''
+        return out or self.config(module).get('out') or DEFAULT_NB_DIR
+
+    def deps(self, module):
+        '''Modules that `module` depends on: a "deps" list in its `conf` entry, or in its own gsmo.yml'''
+        deps = self.config(module).get('deps')
+        if isinstance(deps, str):
+            deps = deps.split(',')
+        return deps or []
+
+    def affected(self, deps, rev, out=None):
+        '''Modules (keys of `deps`) that have changed since `rev` (see `changed`), and their dependents'''
+        changes = []
+        for module in deps:
+            if changed(module, rev, out=self.out(module, out), inputs=lists(self.config(module).get('inputs'))):
+                changes.append(module)
+        affected = dependents(deps, changes)
+        print(f'Modules changed since {rev}: {", ".join(changes) or "none"}; affected: {", ".join(m for m in deps if m in affected) or "none"}')
+        return affected
+
+    def commit(self, module):
         sh('git','add',module)
+        if not lines('git','diff','--cached','--name-only','--',module):
+            # E.g. a dry run
+            print(f'Module {module}: nothing to commit')
+            return
         sh('git','commit','-m',module)
 
+    def run(self, module, nb='run.ipynb', out=None, dind=None, *args, **kwargs):
+        if self.skip(module):
+            return
+        run_module(module, nb, self.out(module, out), dind, args, kwargs, self.module_kwargs(module, kwargs))
+        if is_submodule(module):
+            # Plain subdirectories' runs commit their results in this repo themselves
+            self.commit(module)
+
+    def run_all(self, modules=None, workers=None, nb='run.ipynb', out=None, dind=None, *args, affected=None, gsmo_args=None, **kwargs):
+        '''Run modules concurrently (up to `workers` at a time), each after its dependencies have run
+
+        Modules default to the repo's submodules. Modules are committed in this repo one at a time, as they finish; if a
+        module fails, modules that depend on it aren't run, and an error is raised once all others have finished.
+        Modules that are plain subdirectories (rather than submodules) commit in this repo as they run, so they're run
+        one at a time, and other modules' commits wait until they're done.
+
+        With `affected` (a Git revision), only modules that have changed since then (and their dependents) are run.
+        Modules' outputs go to `out`, or their `out` configs; `gsmo_args` are passed through to `run_module`.
+        '''
+        if modules is None:
+            try:
+                modules = [
+                    ln.split(' ', 1)[1]
+                    for ln in lines('git','config','--file','.gitmodules','--get-regexp',r'\.path$')
+                ]
+            except CalledProcessError:
+                # No .gitmodules (or no submodules in it)
+                modules = []
+        elif isinstance(modules, str):
+            modules = modules.split(',')
+
+        deps = { module: self.deps(module) for module in modules }
+        order = toposort(deps)
+        if affected:
+            affected = self.affected(deps, affected, out)
+        pending = { module: set(deps[module]) for module in order }
+        failed = {}
+        futures = {}
+        uncommitted = []  # Finished submodules, not yet committed in this repo
+        subdir = None  # Plain-subdirectory module currently running, if any
+
+        def release(module):
+            for module_deps in pending.values():
+                module_deps.discard(module)
+
+        def abandon(module, reason):
+            print(f'Not running module {module}: {reason}')
+            failed[module] = reason
+            del pending[module]
+            abandon_dependents(module)
+
+        def abandon_dependents(module):
+            for dependent in [ dependent for dependent, module_deps in pending.items() if module in module_deps ]:
+                if dependent in pending:
+                    abandon(dependent, f'dependency {module} failed')
+
+        def finish(module, exc):
+            if exc:
+                print(f'Module {module} failed: {exc!r}')
+                failed[module] = exc
+                abandon_dependents(module)
+            else:
+                if is_submodule(module):
+                    uncommitted.append(module)
+                release(module)
+
+        def commit_finished():
+            # Commits to this repo happen here, in the parent process, one at a time
+            while uncommitted:
+                self.commit(uncommitted.pop(0))
+
+        # Fork (rather than spawn) workers, so that they inherit this process' imports and state
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('fork')) as executor:
+            while pending or futures:
+                # Plain subdirectories' runs commit in this repo, so they'd race with each other (and this process'
+                # commits) on its index; run at most one at a time, and hold other modules' commits until it's done
+                while (ready := [
+                    module
+                    for module, module_deps in pending.items()
+                    if not module_deps and not (subdir and not is_submodule(module))
+                ]):
+                    for module in ready:
+                        if subdir and not is_submodule(module):
+                            continue
+                        del pending[module]
+                        if affected is not None and module not in affected:
+                            print(f'Module {module} unaffected; skipping')
+                            release(module)
+                            continue
+                        if self.skip(module):
+                            # Skipped modules count as done, for the purposes of their dependents
+                            release(module)
+                            continue
+                        if not is_submodule(module):
+                            commit_finished()
+                            subdir = module
+                        futures[executor.submit(
+                            run_module, module, nb, self.out(module, out), dind, args, kwargs,
+                            self.module_kwargs(module, kwargs), gsmo_args,
+                        )] = module
+                if not futures:
+                    break
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    module = futures.pop(future)
+                    if module == subdir:
+                        subdir = None
+                    finish(module, future.exception())
+                if not subdir:
+                    commit_finished()
+            commit_finished()
+
+        if failed:
+            raise RuntimeError(
+                'Module(s) failed: %s' % ', '.join(f'{module} ({reason!r})' for module, reason in failed.items())
+            )
+
     def __call__(self, *args, **kwargs): return self.run(*args, **kwargs)
@@ -1,4 +1,4 @@
-from os.path import abspath, basename, exists, expanduser, expandvars, isabs, isfile, join, realpath, sep
+from os.path import abspath, basename, exists, expanduser, expandvars, isabs, isfile, join, normpath, realpath, relpath, sep
 from sys import stderr
 from typing import Iterable
 
@@ -51,27 +51,106 @@ class Mount:
     def __repr__(self): return str(self)
 
 
+def components(path):
+    '''Components of an absolute path (`/` → [])'''
+    return [ pc for pc in normpath(path).split(sep) if pc ]
+
+
+class Node:
+    __slots__ = ('children', 'mount')
+
+    def __init__(self):
+        self.children = {}
+        self.mount = None
+
+    def descendants(self):
+        for child in self.children.values():
+            if child.mount:
+                yield child.mount
+            yield from child.descendants()
+
+
 class Mounts:
+    '''Table of bind mounts, indexed by destination in a path-component trie
+
+    Adding a mount whose destination is already bound (to the same source) is a no-op, as is adding one that a mount of
+    an ancestor directory already covers (i.e. its source is the corresponding path under the ancestor's source); adding
+    an ancestor mount drops the existing mounts it covers. Binding a destination to two different sources raises.
+    '''
     def __init__(self, mounts, err=RAISE, keep_missing=False):
         if isinstance(mounts, str):
             mounts = mounts.split(',')
         self.err = err
         self.keep_missing = keep_missing
-        self.mounts = [ m for mount in mounts if (m := Mount(mount, err=err, keep_missing=keep_missing)) ]
+        self.root = Node()
+        self.mounts = []
+        for mount in mounts:
+            self.add(mount)
+
+    def node(self, path, create=False):
+        node = self.root
+        for pc in components(path):
+            child = node.children.get(pc)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[pc] = Node()
+            node = child
+        return node
+
+    def find(self, path):
+        '''Mount whose destination is the nearest ancestor-or-self of container path `path` (or None)'''
+        node = self.root
+        found = node.mount
+        for pc in components(path):
+            node = node.children.get(pc)
+            if node is None:
+                break
+            if node.mount:
+                found = node.mount
+        return found
+
+    def remap(self, path):
+        '''Host path corresponding to container path `path` (or None, if it's not under any mount)'''
+        mount = self.find(path)
+        if not mount:
+            return None
+        rel = relpath(normpath(path), mount.dst)
+        return mount.src if rel == '.' else join(mount.src, rel)
+
+    def add(self, mount):
+        mount = Mount(mount, err=self.err, keep_missing=self.keep_missing)
+        if mount is None:
+            return None
+        node = self.node(mount.dst, create=True)
+        if node.mount:
+            if node.mount.src != mount.src:
+                raise ValueError(f'Conflicting mounts at {mount.dst}: {node.mount.src}, {mount.src}')
+            return node.mount
+        if (parent := self.find(mount.dst)) and self.remap(mount.dst) == mount.src:
+            # Already covered by a bind of an ancestor directory
+            return parent
+        covered = [ child for child in node.descendants() if child.src == join(mount.src, relpath(child.dst, mount.dst)) ]
+        for child in covered:
+            self.node(child.dst).mount = None
+            self.mounts.remove(child)
+        node.mount = mount
+        self.mounts.append(mount)
+        return mount
 
     def __iadd__(self, other):
-        if isinstance(other, Iterable):
-            self.mounts += [ m for mnt in other if (m := Mount(mnt, err=self.err, keep_missing=self.keep_missing)) ]
-        else:
-            if isinstance(other, str):
-                other = Mount(str, err=self.err, keep_missing=self.keep_missing)
-            if other is None:
-                return self
-            if not isinstance(other, Mount):
-                raise RuntimeError(f'Invalid mount: %s' % str(other))
-            self.mounts.append(other)
+        if isinstance(other, (str, Mount)) or other is None:
+            other = [ other ] if other is not None else []
+        elif not isinstance(other, Iterable):
+            raise RuntimeError(f'Invalid mount: %s' % str(other))
+        for mount in other:
+            if mount is not None:
+                self.add(mount)
         return self
 
+    def __iter__(self): return iter(self.mounts)
+    def __len__(self): return len(self.mounts)
+
     def __str__(self): return ','.join(str(mount) for mount in self.mounts)
 
     @property
@@ -0,0 +1,18 @@
+import json
+from os import replace
+
+
+def read_nb(path):
+    '''Load a notebook as plain JSON (faster than nbformat, and without validation)'''
+    with open(path,'r') as f:
+        return json.load(f)
+
+
+def write_nb(nb, path):
+    '''Atomically write a notebook loaded by `read_nb`'''
+    tmp = f'{path}.tmp'
+    with open(tmp,'w') as f:
+        # Match nbformat's serialization, to keep diffs of committed notebooks minimal
+        json.dump(nb, f, indent=1, sort_keys=True, ensure_ascii=False)
+        f.write('\n')
+    replace(tmp, path)
@@ -0,0 +1,91 @@
+from hashlib import sha256
+import json
+from os import makedirs, replace
+from os.path import exists, join
+
+from .nb import read_nb, write_nb
+
+# Notebook outputs' mimetype values larger than this (in bytes, JSON-serialized) are moved into an output store
+DEFAULT_THRESHOLD = 100_000
+OUTPUTS_DIR = 'outputs'
+
+# Externalized outputs are replaced by a reference under this key, in the output's `metadata[<mimetype>]`
+REF_KEY = 'gsmo.externalized'
+
+
+def blob_path(dir, hash): return join(dir, hash[:2], hash)
+
+
+def put(dir, data):
+    '''Store serialized output `data` under its SHA-256 (if it isn't already present); return the hash'''
+    hash = sha256(data.encode()).hexdigest()
+    path = blob_path(dir, hash)
+    if not exists(path):
+        makedirs(join(dir, hash[:2]), exist_ok=True)
+        tmp = f'{path}.tmp'
+        with open(tmp,'w') as f:
+            f.write(data)
+        replace(tmp, path)
+    return hash
+
+
+def externalize(nb_path, dir, threshold=DEFAULT_THRESHOLD):
+    '''Move large outputs (e.g. images, HTML) from a notebook into content-addressed store `dir`; returns the number moved
+
+    Each moved value is replaced by a reference in the output's metadata; outputs left without any data get a
+    `text/plain` placeholder, so that notebook viewers show something.
+    '''
+    nb = read_nb(nb_path)
+    moved = 0
+    for cell in nb['cells']:
+        for output in cell.get('outputs', []):
+            data = output.get('data')
+            if not data:
+                continue
+            metadata = output.setdefault('metadata', {})
+            refs = []
+            for mimetype, value in list(data.items()):
+                serialized = json.dumps(value)
+                if len(serialized) <= threshold:
+                    continue
+                mime_metadata = metadata.setdefault(mimetype, {})
+                if not isinstance(mime_metadata, dict):
+                    continue
+                mime_metadata[REF_KEY] = dict(sha256=put(dir, serialized), size=len(serialized))
+                del data[mimetype]
+                refs.append(mimetype)
+            if refs and not data:
+                data['text/plain'] = f'[externalized output: {", ".join(refs)}; see `gsmo rehydrate`]'
+                metadata[REF_KEY] = dict(placeholder=True)
+            moved += len(refs)
+    if moved:
+        write_nb(nb, nb_path)
+    return moved
+
+
+def rehydrate(nb_path, dir, output=None):
+    '''Restore externalized outputs into a notebook (in place, or written to `output`); returns the number restored'''
+    nb = read_nb(nb_path)
+    restored = 0
+    for cell in nb['cells']:
+        for out in cell.get('outputs', []):
+            metadata = out.get('metadata')
+            if not metadata:
+                continue
+            data = out.setdefault('data', {})
+            if metadata.pop(REF_KEY, {}).get('placeholder'):
+                data.pop('text/plain', None)
+            for mimetype, mime_metadata in list(metadata.items()):
+                if not isinstance(mime_metadata, dict) or REF_KEY not in mime_metadata:
+                    continue
+                ref = mime_metadata.pop(REF_KEY)
+                path = blob_path(dir, ref['sha256'])
+                if not exists(path):
+                    raise FileNotFoundError(f'Externalized output {ref["sha256"]} ({mimetype}) not found in {dir}')
+                with open(path,'r') as f:
+                    data[mimetype] = json.load(f)
+                if not mime_metadata:
+                    del metadata[mimetype]
+                restored += 1
+    write_nb(nb, output or nb_path)
+    return restored
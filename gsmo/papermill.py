@@ -4,10 +4,11 @@
 from inspect import getfullargspec
 import json
 from jupyter_client import kernelspec
-from os import getcwd, makedirs, remove
+from os import environ, getcwd, makedirs, remove
 from os.path import abspath, basename, dirname, exists, join, splitext
 from pathlib import Path
 from shutil import move
+import sys
 from sys import executable
 from tempfile import NamedTemporaryFile
 from traceback import format_exception
@@ -17,6 +18,10 @@ from utz.collections import singleton
 from utz import git
 from utz.process import line, run
 
+from . import timeline
+from .image import IMAGE_HASH_ENV
+from .manifest import manifest, write_manifest
+
 EARLY_EXIT_EXCEPTION_MSG_PREFIX = 'OK: '
 
 def current_kernel():
@@ -33,6 +38,61 @@ def current_kernel():
     return singleton(kernels.keys())
 
 
+def git_commit(paths, msg, start_sha=None, fast=False):
+    '''Commit `paths`; if HEAD has moved since `start_sha` (e.g. a notebook made its own commits), the result is a merge
+    of `start_sha` and the current HEAD
+
+    `fast` commits with git plumbing instead (see `gsmo.commit.commit`), skipping git hooks and full index refreshes.
+    '''
+    if fast:
+        from .commit import commit
+        commit(paths, msg, start_sha)
+        return
+    last_sha = git.head.sha()
+    run(['git','add'] + paths)
+    run('git','commit','-m',msg)
+    if start_sha and start_sha != last_sha:
+        repo = git.Repo()
+        tree = repo.tree().hexsha
+        head = line('git','commit-tree',tree,'-p',start_sha,'-p',last_sha,'-m',msg)
+        run('git','reset',head)
+
+
+# `execute`'s gsmo-specific options (passed as a `gsmo` dict), and their defaults
+GSMO_OPTS = dict(
+    # Checkpoint the output notebook (atomically) every `checkpoint_cells` cells or `checkpoint_secs` seconds, and tee cell output to stdout/stderr and .gsmo/logs/<name>.log
+    stream=False,
+    checkpoint_cells=None,
+    checkpoint_secs=None,
+    # Commit the output notebook of a failed run even if `commit` is False
+    commit_failures=True,
+    # Fork kernels from a preloaded "zygote" process (True, or a list of modules to preload); defaults to on when running inside a zygote-forked kernel
+    zygote=None,
+    # Cache cell outputs (and kernel state after slow cells), and replay unchanged leading cells on re-runs; `inputs` are paths whose contents should invalidate the cache
+    memo=False,
+    inputs=None,
+    # Run config to record in the output notebook's run manifest (default: notebook parameters)
+    run_config=None,
+    # Move output values larger than this many bytes (True: outputs.DEFAULT_THRESHOLD) into a content-addressed store in `outputs_dir` (default: an `outputs` directory next to the output notebook, committed with it); `gsmo rehydrate` restores them
+    externalize=False,
+    outputs_dir=None,
+    # Commit with git plumbing (staging into a copy of the index, then one `update-ref`), which avoids refreshing large indexes but skips git hooks
+    fast_commit=False,
+    # Append per-cell durations, CPU times, and peak RSS to <output>.history.jsonl (committed alongside the output notebook)
+    history=False,
+    # Fail the run if a cell took more than this many times its median duration over recent runs (implies `history`)
+    max_slowdown=None,
+)
+
+
+def gsmo_opts(gsmo=None):
+    '''GSMO_OPTS, overlaid with `gsmo`; raises on unknown options'''
+    gsmo = gsmo or {}
+    if (unknown := set(gsmo).difference(GSMO_OPTS)):
+        raise ValueError(f'Unknown gsmo options: {", ".join(sorted(unknown))}')
+    return { **GSMO_OPTS, **gsmo }
+
+
 def execute(
     input,
     output=None,
@@ -50,11 +110,29 @@ def execute(
     start_sha=None,
     msg_path='_MSG',
     tmp_output=True,
+    # gsmo-specific options (see GSMO_OPTS); namespaced, so that they don't capture notebook parameters of the same name
+    gsmo=None,
     *args,
     **kwargs
 ):
     '''Run a jupyter notebook using papermill, and git commit the output
+
+    Other kwargs are notebook parameters; gsmo-specific options (see GSMO_OPTS) are passed as a `gsmo` dict.
     '''
+    opts = gsmo_opts(gsmo)
+    stream = opts['stream']
+    checkpoint_cells = opts['checkpoint_cells']
+    checkpoint_secs = opts['checkpoint_secs']
+    commit_failures = opts['commit_failures']
+    zygote = opts['zygote']
+    memo = opts['memo']
+    inputs = opts['inputs']
+    run_config = opts['run_config']
+    externalize = opts['externalize']
+    outputs_dir = opts['outputs_dir']
+    fast_commit = opts['fast_commit']
+    history = opts['history']
+    max_slowdown = opts['max_slowdown']
     if not exists(input) and not input.endswith('.ipynb'):
         input += '.ipynb'
     if not exists(input):
@@ -132,14 +210,62 @@ def execute(
     else:
         cwd = dirname(abspath(input))
 
-    if tmp_output:
+    log = None
+    if stream:
+        # Checkpoint into `output` as the run progresses; papermill's own (non-atomic) writes go to a staging file next
+        # to it, which is renamed into place at the end
+        from .config import state_path
+        from .stream import staging_path, Tee, CHECKPOINT_CELLS, CHECKPOINT_SECS
+        staging_output = staging_path(output)
+        exec_kwargs['stream'] = dict(
+            path=output,
+            cells=CHECKPOINT_CELLS if checkpoint_cells is None else checkpoint_cells,
+            secs=CHECKPOINT_SECS if checkpoint_secs is None else checkpoint_secs,
+        )
+        # Tee cells' stdout/stderr to this process' stdout/stderr, and a log file
+        log_path = state_path('logs', f'{splitext(basename(output))[0]}.log', root=dirname(abspath(input)))
+        print(f'Streaming run output to {output} (log: {log_path})')
+        log = open(log_path,'w')
+        exec_kwargs['stdout_file'] = Tee(sys.stdout, log)
+        exec_kwargs['stderr_file'] = Tee(sys.stderr, log)
+    elif tmp_output:
         prefix, _ = splitext(basename(output))
         staging_output = NamedTemporaryFile(prefix=prefix, suffix='.ipynb').name
     else:
         staging_output = output
 
+    if zygote is None:
+        from .zygote import SOCKET_ENV
+        zygote = bool(environ.get(SOCKET_ENV))
+    if max_slowdown:
+        history = True
+    if zygote or memo or stream or history:
+        from .engine import ENGINE_NAME
+        exec_kwargs['engine_name'] = ENGINE_NAME
+        exec_kwargs['zygote'] = zygote
+    if history:
+        exec_kwargs['usage'] = True
+    if isinstance(inputs, (str, Path)):
+        inputs = [ inputs ]
+    # papermill runs the notebook from `cwd`; resolve input paths relative to the caller's directory first
+    inputs = [ abspath(path) for path in inputs or [] ]
+    if memo:
+        from .config import state_path
+        from .memo import MEMO_DIR
+        exec_kwargs['memo'] = memo
+        exec_kwargs['memo_dir'] = state_path(MEMO_DIR, root=dirname(abspath(input)))
+        exec_kwargs['inputs'] = inputs
+
+    run_manifest = manifest(
+        input,
+        run_config if run_config is not None else exec_kwargs['parameters'],
+        inputs,
+        image=environ.get(IMAGE_HASH_ENV),
+    )
+
     exc = None
     success_msg = None
+    exec_start = timeline.now()
     try:
         execute_notebook(
             str(input),
@@ -164,12 +290,44 @@ def execute(
             exc = e
             success_msg = None
     finally:
-        if tmp_output:
+        if log:
+            log.close()
+        # papermill may fail before writing the staging notebook (e.g. a missing kernel); don't mask its exception
+        if (stream or tmp_output) and exists(staging_output):
             print(f'moving run notebook from {staging_output} to {output}')
             move(staging_output, output)
 
+    timeline.notebook_events(output, start=exec_start)
+    write_manifest(output, run_manifest, success=exc is None)
 
-    if commit or exc:
+    history_file = None
+    if history:
+        from . import history as hist
+        entry = hist.new_entry(output, success=exc is None)
+        if max_slowdown and not exc:
+            slow = hist.regressions(hist.compare(hist.load(hist.history_path(output)) + [ entry ]), max_slowdown)
+            if slow:
+                print(hist.report(slow))
+                exc = RuntimeError(f'{len(slow)} cell(s) slowed down by more than {max_slowdown}x: {", ".join(str(row["idx"]) for row in slow)}')
+                # Regressed runs aren't part of future baselines
+                entry['success'] = False
+        history_file = hist.record(output, entry=entry)
+
+    commit_outputs = None
+    if externalize:
+        from .outputs import externalize as externalize_outputs, DEFAULT_THRESHOLD, OUTPUTS_DIR
+        threshold = DEFAULT_THRESHOLD if externalize is True else externalize
+        if not outputs_dir:
+            # Tracked alongside the output notebook (unlike an explicit `outputs_dir`, which may be outside the repo)
+            outputs_dir = join(dirname(output), OUTPUTS_DIR)
+            commit_outputs = outputs_dir
+        moved = externalize_outputs(output, outputs_dir, threshold)
+        if moved:
+            print(f'Externalized {moved} outputs from {output} to {outputs_dir}')
+        else:
+            commit_outputs = None
+
+    if commit or (exc and commit_failures):
         if exc:
             msg = '\n'.join(
                 [
@@ -177,9 +335,9 @@ def execute(
                     '',
                     ''.join(
                         format_exception(
-                            etype=type(exc),
-                            value=exc,
-                            tb=exc.__traceback__,
+                            type(exc),
+                            exc,
+                            exc.__traceback__,
                         )
                     ),
                 ]
@@ -195,6 +353,10 @@ def execute(
         elif isinstance(commit, Path):
             commit = [str(commit)]
         commit += [output]
+        if history_file:
+            commit += [history_file]
+        if commit_outputs:
+            commit += [commit_outputs]
         if not msg:
             if exists(msg_path):
                 with open(msg_path,'r') as f:
@@ -204,14 +366,8 @@ def execute(
                 msg = success_msg
             else:
                 msg = name
-        last_sha = git.head.sha()
-        run(['git','add'] + commit)
-        run('git','commit','-m',msg)
-        if start_sha != last_sha:
-            repo = git.Repo()
-            tree = repo.tree().hexsha
-            head = line('git','commit-tree',tree,'-p',start_sha,'-p',last_sha,'-m',msg)
-            run('git','reset',head)
+        with timeline.span('git commit'):
+            git_commit(commit, msg, start_sha, fast=fast_commit)
 
-        if exc:
-            raise exc
+    if exc:
+        raise exc
@@ -0,0 +1,144 @@
+from contextlib import contextmanager
+from fcntl import flock, LOCK_EX, LOCK_NB, LOCK_UN
+import json
+from os import makedirs, remove
+from os.path import exists, join
+
+from . import docker_api
+from .config import CACHE_DIR
+
+# Pooled containers are labeled with the module name they serve, and a hash of the image and settings they were created with
+POOL_LABEL = 'gsmo.pool'
+POOL_HASH_LABEL = 'gsmo.pool.hash'
+
+# Pooled containers idle in this command (after any entrypoint setup, e.g. `pip install -e`s, is done)
+READY_PATH = '/tmp/gsmo-pool-ready'
+IDLE_CMD = [ '/bin/sh', '-c', f'touch {READY_PATH} && exec sleep infinity', ]
+
+DEFAULT_MAX_RUNS = 100
+
+
+class Pool:
+    '''Warm, labeled containers for a module, which runs are `docker exec`'d into
+
+    Containers are created on demand (up to `size` of them), with the module's mounts already attached and entrypoint
+    setup already done; they idle until a run claims one (via a host-side lock file), and are recycled after `max_runs`
+    runs or when the module image changes.
+    '''
+    def __init__(self, name, hash, size=1, max_runs=DEFAULT_MAX_RUNS, dir=None):
+        self.name = name
+        self.hash = hash
+        self.size = size
+        self.max_runs = max_runs
+        self.dir = dir or join(CACHE_DIR, 'pool')
+        makedirs(self.dir, exist_ok=True)
+
+    def container_name(self, idx): return f'{self.name}-pool-{idx}'
+
+    def state_path(self, container): return join(self.dir, f'{container}.json')
+
+    def load_state(self, container):
+        path = self.state_path(container)
+        if not exists(path):
+            return {}
+        with open(path,'r') as f:
+            return json.load(f)
+
+    def save_state(self, container, state):
+        with open(self.state_path(container),'w') as f:
+            json.dump(state, f)
+
+    def inspect(self, container):
+        return docker_api.inspect_container(container)
+
+    def remove(self, container):
+        docker_api.remove_container(container, force=True)
+        if exists(self.state_path(container)):
+            remove(self.state_path(container))
+
+    def reusable(self, container):
+        '''Return an existing pooled container's `inspect` info if it can take another run (otherwise remove it)'''
+        info = self.inspect(container)
+        if not info:
+            return None
+        labels = info.get('Config',{}).get('Labels') or {}
+        state = self.load_state(container)
+        reason = None
+        if not info.get('State',{}).get('Running'):
+            reason = 'not running'
+        elif labels.get(POOL_HASH_LABEL) != self.hash:
+            reason = f'image or container settings changed ({labels.get(POOL_HASH_LABEL)} → {self.hash})'
+        elif state.get('id') == info['Id'] and state.get('runs', 0) >= self.max_runs:
+            reason = f'reached {self.max_runs} runs'
+        if reason:
+            print(f'Recycling pooled container {container}: {reason}')
+            self.remove(container)
+            return None
+        return info
+
+    def create(self, container, run_args, image, entrypoint, cmd_args):
+        '''Start a pooled container, and wait for its entrypoint setup to finish'''
+        from utz.backoff import backoff
+        from utz.process import run
+        run(
+            'docker','run','-d',
+            run_args,
+            '-l',f'{POOL_LABEL}={self.name}',
+            '-l',f'{POOL_HASH_LABEL}={self.hash}',
+            '--entrypoint',entrypoint,
+            '--name',container,
+            image,
+            cmd_args,
+        )
+
+        def ready():
+            if docker_api.exec(container, ['test','-e',READY_PATH])[0] == 0:
+                return True
+            if not (self.inspect(container) or {}).get('State',{}).get('Running'):
+                raise RuntimeError(f'Pooled container {container} exited during setup; see `docker logs {container}`')
+            return None
+
+        backoff(ready, init=.2, step=1.5, max=20, now=True)
+
+    @contextmanager
+    def acquire(self, run_args, image, entrypoint, cmd_args):
+        '''Claim an idle pooled container (creating one if necessary); yields its name
+
+        `entrypoint` and `cmd_args` are the container's setup chain; they're expected to end by executing IDLE_CMD.
+        '''
+        def claim(idx, block):
+            container = self.container_name(idx)
+            fd = open(join(self.dir, f'{container}.lock'),'w')
+            try:
+                flock(fd, LOCK_EX if block else LOCK_EX | LOCK_NB)
+            except BlockingIOError:
+                fd.close()
+                return None, None
+            return container, fd
+
+        container = fd = None
+        for idx in range(self.size):
+            container, fd = claim(idx, block=False)
+            if container:
+                break
+        if not container:
+            print(f'All {self.size} pooled container(s) for {self.name} are busy; waiting for {self.container_name(0)}')
+            container, fd = claim(0, block=True)
+
+        try:
+            info = self.reusable(container)
+            if not info:
+                print(f'Creating pooled container {container}')
+                self.create(container, run_args, image, entrypoint, cmd_args)
+                info = self.inspect(container)
+            state = self.load_state(container)
+            if state.get('id') != info['Id']:
+                state = dict(id=info['Id'], runs=0)
+            try:
+                yield container
+            finally:
+                state['runs'] += 1
+                self.save_state(container, state)
+        finally:
+            flock(fd, LOCK_UN)
+            fd.close()
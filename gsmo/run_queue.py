@@ -0,0 +1,261 @@
+from argparse import ArgumentParser, REMAINDER
+from contextlib import contextmanager
+from datetime import datetime
+import json
+from os import environ, getpid, kill
+from os.path import abspath, basename, exists, isdir, join
+from socket import gethostname
+import sqlite3
+from subprocess import check_output, run
+import sys
+from threading import Thread
+from time import sleep, time
+
+# Path of the queue database (default: gsmo-queue.db in the current repo's Git dir)
+QUEUE_ENV = 'GSMO_QUEUE'
+QUEUE_FILE = 'gsmo-queue.db'
+DEFAULT_POLL = 1.
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+# `gsmo run` subcommand (and aliases), which separates top-level `gsmo` options from `run` args in queued command lines
+RUN_CMDS = [ 'run', 'r', 'nb', ]
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    module TEXT NOT NULL,
+    args TEXT NOT NULL,
+    opts TEXT,
+    name TEXT,
+    state TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 1,
+    enqueued REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    host TEXT,
+    pid INTEGER,
+    returncode INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_state ON runs (state, module);
+'''
+
+
+def split_args(args):
+    '''Split a `gsmo` command line (`[<gsmo options>] run [<run args>]`, or just `<run args>`) into top-level options and
+    `run` args'''
+    args = list(args)
+    for idx, arg in enumerate(args):
+        if arg in RUN_CMDS:
+            return args[:idx], args[idx+1:]
+    return [], args
+
+
+def container_name(module, opts=()):
+    '''Name of the container `gsmo <opts> run` in `module` would use (`--name`, the `name` config, or the directory's
+    basename; see `gsmo.main`)'''
+    args = list(opts)
+    for idx, arg in enumerate(args):
+        if arg == '--name' and idx + 1 < len(args):
+            return args[idx + 1].lower()
+        if arg.startswith('--name='):
+            return arg[len('--name='):].lower()
+    from .config import load_config, DEFAULT_CONFIG_FILE
+    config_path = join(module, DEFAULT_CONFIG_FILE)
+    config = load_config(config_path) if exists(config_path) else {}
+    return str(config.get('name') or basename(module)).lower()
+
+
+def default_path():
+    if (path := environ.get(QUEUE_ENV)):
+        return path
+    git_dir = check_output(['git','rev-parse','--absolute-git-dir']).decode().strip()
+    return join(git_dir, QUEUE_FILE)
+
+
+class Queue:
+    '''Durable (SQLite) queue of `gsmo run`s
+
+    Adding a run that is identical to a pending one (same module and args) coalesces them. Runs are claimed oldest-first,
+    skipping modules (and container names) that already have a run in progress, so that each module's runs (and runs
+    that would use the same container name, e.g. of modules in different directories with the same basename) are
+    serialized.
+    '''
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        db = sqlite3.connect(self.path, timeout=60)
+        try:
+            db.executescript(SCHEMA)
+            # Databases created before runs had a container `name`, or top-level `gsmo` options
+            columns = [ row[1] for row in db.execute('PRAGMA table_info(runs)') ]
+            for column in [ 'name', 'opts', ]:
+                if column not in columns:
+                    db.execute(f'ALTER TABLE runs ADD COLUMN {column} TEXT')
+        finally:
+            db.close()
+
+    @contextmanager
+    def transaction(self):
+        '''Connection with a write lock held (`BEGIN IMMEDIATE`), committed on exit'''
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                yield db
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+        finally:
+            db.close()
+
+    def add(self, module, args=(), opts=()):
+        '''Enqueue a run of `module` (a directory) with `gsmo run` args `args` (and top-level `gsmo` options `opts`, e.g.
+        `--name`, `-i`, `-n`); return its ID (and whether it was coalesced with an existing pending run)'''
+        module = abspath(module)
+        if not isdir(module):
+            raise ValueError(f'Nonexistent module directory: {module}')
+        name = container_name(module, opts)
+        args = json.dumps(list(args))
+        opts = json.dumps(list(opts))
+        with self.transaction() as db:
+            row = db.execute(
+                "SELECT id FROM runs WHERE state = ? AND module = ? AND args = ? AND COALESCE(opts, '[]') = ?",
+                (PENDING, module, args, opts),
+            ).fetchone()
+            if row:
+                db.execute('UPDATE runs SET requests = requests + 1 WHERE id = ?', (row['id'],))
+                return row['id'], True
+            cursor = db.execute(
+                'INSERT INTO runs (module, args, opts, name, state, enqueued) VALUES (?, ?, ?, ?, ?, ?)',
+                (module, args, opts, name, PENDING, time()),
+            )
+            return cursor.lastrowid, False
+
+    def recover(self, db):
+        '''Return runs claimed by dead workers (on this host) to the queue'''
+        host = gethostname()
+        for row in db.execute('SELECT id, pid FROM runs WHERE state = ? AND host = ?', (RUNNING, host)).fetchall():
+            try:
+                kill(row['pid'], 0)
+            except ProcessLookupError:
+                print(f'Re-queueing run {row["id"]} (worker {row["pid"]} died)')
+                db.execute('UPDATE runs SET state = ?, started = NULL, host = NULL, pid = NULL WHERE id = ?', (PENDING, row['id']))
+            except PermissionError:
+                pass
+
+    def claim(self):
+        '''Mark the oldest pending run whose module (and container name) has no run in progress as running, and return
+        it (or None)'''
+        with self.transaction() as db:
+            self.recover(db)
+            row = db.execute(
+                '''SELECT * FROM runs WHERE state = ?
+                   AND module NOT IN (SELECT module FROM runs WHERE state = ?)
+                   AND COALESCE(name, module) NOT IN (SELECT COALESCE(name, module) FROM runs WHERE state = ?)
+                   ORDER BY id LIMIT 1''',
+                (PENDING, RUNNING, RUNNING),
+            ).fetchone()
+            if not row:
+                return None
+            db.execute(
+                'UPDATE runs SET state = ?, started = ?, host = ?, pid = ? WHERE id = ?',
+                (RUNNING, time(), gethostname(), getpid(), row['id']),
+            )
+            return dict(row)
+
+    def finish(self, id, returncode):
+        with self.transaction() as db:
+            db.execute(
+                'UPDATE runs SET state = ?, finished = ?, returncode = ? WHERE id = ?',
+                (DONE if returncode == 0 else FAILED, time(), returncode, id),
+            )
+
+    def runs(self, states=None):
+        with self.transaction() as db:
+            if states:
+                query = f'SELECT * FROM runs WHERE state IN ({",".join("?" * len(states))}) ORDER BY id'
+                return [ dict(row) for row in db.execute(query, list(states)).fetchall() ]
+            return [ dict(row) for row in db.execute('SELECT * FROM runs ORDER BY id').fetchall() ]
+
+    def active(self):
+        return bool(self.runs([ PENDING, RUNNING, ]))
+
+
+def cmdline(run_):
+    '''`gsmo` args for a queue entry: its top-level options, `run`, and its `run` args'''
+    return [ *json.loads(run_.get('opts') or '[]'), 'run', *json.loads(run_['args']), ]
+
+
+def run_entry(run_):
+    '''Run a claimed queue entry (`gsmo <opts> run <args>`, in the module's directory); return its exit code'''
+    cmd = [ sys.executable, '-m', 'gsmo.gsmo', *cmdline(run_), ]
+    print(f'Run {run_["id"]}: {run_["module"]}: {" ".join(cmd[3:])}')
+    return run(cmd, cwd=run_['module']).returncode
+
+
+def work(queue, jobs=1, drain=False, poll=DEFAULT_POLL, runner=run_entry):
+    '''Process queued runs, `jobs` at a time, until interrupted (or, with `drain`, until the queue is empty)'''
+    def loop():
+        # Each thread opens its own connections (SQLite connections can't be shared across threads)
+        while True:
+            run_ = queue.claim()
+            if not run_:
+                if drain and not queue.active():
+                    return
+                sleep(poll)
+                continue
+            try:
+                returncode = runner(run_)
+            except Exception as e:
+                print(f'Run {run_["id"]} raised: {e!r}')
+                returncode = -1
+            queue.finish(run_['id'], returncode)
+            print(f'Run {run_["id"]} ({run_["module"]}) {"finished" if returncode == 0 else f"failed ({returncode})"}')
+
+    threads = [ Thread(target=loop, name=f'gsmo-worker-{idx}', daemon=True) for idx in range(jobs) ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        while thread.is_alive():
+            thread.join(1)
+
+
+def fmt_time(t): return datetime.fromtimestamp(t).isoformat(sep=' ', timespec='seconds') if t else ''
+
+
+def main(cmd, *args):
+    '''`gsmo queue …` / `gsmo worker …`'''
+    if cmd == 'queue':
+        parser = ArgumentParser(prog='gsmo queue', description='Add runs to (or list) the local run queue, which `gsmo worker`s process')
+        parser.add_argument('--db',help=f'Queue database (default: ${QUEUE_ENV}, or {QUEUE_FILE} in the current Git repo\'s .git dir)')
+        subparsers = parser.add_subparsers(dest='action')
+        add_parser = subparsers.add_parser('add', help='Enqueue a `gsmo run` of a module (coalesced with an identical pending run, if any)')
+        add_parser.add_argument('module',help='Module directory')
+        add_parser.add_argument('args',nargs=REMAINDER,help='`gsmo` args: `[<gsmo options>] run [<run args>]` (e.g. `--name foo -i img run -x nb.ipynb`), or just `run` args (e.g. -y, -Y, -x)')
+        ls_parser = subparsers.add_parser('ls', help='List pending and running runs (with -a: all runs)')
+        ls_parser.add_argument('-a','--all',action='store_true',help='Include finished runs')
+        args = parser.parse_args(args)
+        queue = Queue(args.db)
+        if args.action == 'add':
+            opts, run_args = split_args(args.args)
+            id, coalesced = queue.add(args.module, run_args, opts)
+            print(f'Coalesced with pending run {id}' if coalesced else f'Enqueued run {id}')
+        elif args.action == 'ls' or args.action is None:
+            for r in queue.runs(None if getattr(args, 'all', False) else [ PENDING, RUNNING, ]):
+                print('\t'.join([
+                    str(r['id']), r['state'], r['module'], ' '.join(cmdline(r)),
+                    f'x{r["requests"]}', fmt_time(r['enqueued']), fmt_time(r['started']), fmt_time(r['finished']),
+                    '' if r['returncode'] is None else str(r['returncode']),
+                ]))
+    elif cmd == 'worker':
+        parser = ArgumentParser(prog='gsmo worker', description='Process runs from the local run queue (see `gsmo queue`)')
+        parser.add_argument('--db',help=f'Queue database (default: ${QUEUE_ENV}, or {QUEUE_FILE} in the current Git repo\'s .git dir)')
+        parser.add_argument('-j','--jobs',type=int,default=1,help='Number of runs to execute concurrently (runs of the same module are always serialized)')
+        parser.add_argument('-x','--drain',action='store_true',help='Exit once the queue is empty (instead of waiting for more runs)')
+        parser.add_argument('-p','--poll',type=float,default=DEFAULT_POLL,help=f'Seconds between checks of an empty queue (default: {DEFAULT_POLL})')
+        args = parser.parse_args(args)
+        work(Queue(args.db), jobs=args.jobs, drain=args.drain, poll=args.poll)
+    else:
+        raise ValueError(f'Unknown queue cmd: {cmd}')
@@ -0,0 +1,80 @@
+'''`gsmo serve`: a resident daemon that runs `gsmo` CLI invocations in forked, pre-warmed children
+
+The daemon imports `gsmo` and its heavy dependencies (`utz`, pandas, PyYAML, GitPython) once, and listens on a unix
+socket. While it's running, `gsmo …` invocations just forward their argv, cwd, environment, and stdio to it (see
+`zygote.Server`), and exit with the status of the child it forks to run them. Output is written directly to the
+client's stdout/stderr (incl. TTYs, for `gsmo shell`/`jupyter`), and signals are relayed to the child.
+
+The socket path is keyed on the Python interpreter and the `gsmo` sources' modification times, so that clients don't
+talk to a daemon running stale code.
+'''
+from argparse import ArgumentParser
+from hashlib import sha256
+import os
+from os.path import dirname, getmtime, join
+import signal
+import sys
+from tempfile import gettempdir
+
+from . import zygote
+
+# Socket to serve on / forward to (default: `socket_path()`); "0" disables forwarding
+SERVE_ENV = 'GSMO_SERVE'
+WARM_MODULES = [ 'gsmo.gsmo', 'gsmo.modules', 'gsmo.run_queue', 'utz', 'utz.process', 'yaml', 'git', ]
+
+
+def socket_path():
+    if (path := os.environ.get(SERVE_ENV)):
+        return path
+    src = dirname(__file__)
+    mtime = max(getmtime(join(src, name)) for name in os.listdir(src) if name.endswith('.py'))
+    key = sha256(f'{sys.executable}:{src}:{mtime}'.encode()).hexdigest()[:16]
+    return join(gettempdir(), f'gsmo-serve-{os.getuid()}', f'{key}.sock')
+
+
+def forward(argv):
+    '''Run `gsmo <argv>` in a running daemon, if there is one; return its exit code (or None)'''
+    if os.environ.get(SERVE_ENV) == '0':
+        return None
+    path = socket_path()
+    if not zygote.is_alive(path):
+        return None
+    return zygote.request(path, argv, env=dict(os.environ))
+
+
+def handle(request):
+    '''Run one forwarded invocation (in a forked child, with the client's stdio, cwd, and environment)'''
+    from . import docker_api
+    from .gsmo import main
+    # Connect to the Docker daemon named by the client's environment
+    docker_api._client = None
+    sys.argv = [ 'gsmo', *request['argv'] ]
+    # Never forward back to this daemon (e.g. a bare `gsmo`, which has no explicit args)
+    main(*request['argv'], forward=False)
+
+
+def warm(modules=WARM_MODULES):
+    for module in modules:
+        try:
+            __import__(module)
+        except ImportError as e:
+            sys.stderr.write(f'Skipping preload of {module}: {e}\n')
+
+
+def main(*args):
+    parser = ArgumentParser(prog='gsmo serve', description='Run a daemon that executes `gsmo` invocations in pre-warmed, forked processes')
+    parser.add_argument('-s','--socket',help=f'Unix socket to listen on (default: ${SERVE_ENV}, or one keyed on the Python interpreter and gsmo sources)')
+    parser.add_argument('-t','--idle-timeout',type=float,help='Exit after this many seconds without requests (default: never)')
+    args = parser.parse_args(args)
+    path = args.socket or socket_path()
+    warm()
+    # Clean up the socket on `kill`
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f'gsmo serve: listening on {path}')
+    sys.stdout.flush()
+    server = zygote.Server(path, handle, idle_timeout=float('inf') if args.idle_timeout is None else args.idle_timeout)
+    try:
+        server.serve()
+    except RuntimeError as e:
+        sys.stderr.write(f'{e}\n')
+        return 1
@@ -0,0 +1,82 @@
+from os import replace
+from os.path import basename, dirname, join
+from time import time
+
+import nbformat
+from papermill.engines import NotebookExecutionManager
+
+# Default checkpoint frequency for streamed runs: whichever of these comes first
+CHECKPOINT_CELLS = 10
+CHECKPOINT_SECS = 30
+
+
+def staging_path(output):
+    '''Hidden staging path next to `output` (so that moving it into place is an atomic rename on the same filesystem)'''
+    return join(dirname(output), f'.{basename(output)}.partial.ipynb')
+
+
+def atomic_write(nb, path):
+    tmp = f'{path}.tmp'
+    with open(tmp,'w') as f:
+        f.write(nbformat.writes(nb))
+    replace(tmp, path)
+
+
+class Tee:
+    '''Write to several streams (e.g. the terminal and a log file), flushing each write'''
+    def __init__(self, *streams):
+        self.streams = streams
+
+    def write(self, s):
+        for stream in self.streams:
+            stream.write(s)
+            stream.flush()
+
+    def flush(self):
+        for stream in self.streams:
+            stream.flush()
+
+
+class StreamingExecutionManager(NotebookExecutionManager):
+    '''Checkpoint the executing notebook to `path` every `cells` cells or `secs` seconds (whichever comes first)
+
+    Papermill saves the whole notebook on every cell start/completion; this skips saves between checkpoints, and writes
+    checkpoints atomically (so that `path` always contains a complete notebook, even if the run is killed).
+    '''
+    def __init__(self, nb, path, cells=CHECKPOINT_CELLS, secs=CHECKPOINT_SECS, **kwargs):
+        self.path = path
+        self.cells = cells
+        self.secs = secs
+        self.cells_since_checkpoint = 0
+        self.last_checkpoint = time()
+        super().__init__(nb, **kwargs)
+
+    def checkpoint(self):
+        atomic_write(self.nb, self.path)
+        self.cells_since_checkpoint = 0
+        self.last_checkpoint = time()
+
+    def save(self, force=False, **kwargs):
+        if kwargs.get('nb'):
+            self.nb = kwargs['nb']
+        due = self.cells and self.cells_since_checkpoint >= self.cells
+        due = due or (self.secs is not None and time() - self.last_checkpoint >= self.secs)
+        if force or due:
+            self.checkpoint()
+        self.last_save_time = self.now()
+
+    def notebook_start(self, **kwargs):
+        super().notebook_start(**kwargs)
+        self.save(force=True)
+
+    def cell_complete(self, cell, cell_index=None, **kwargs):
+        self.cells_since_checkpoint += 1
+        super().cell_complete(cell, cell_index=cell_index, **kwargs)
+
+    def cell_exception(self, cell, cell_index=None, **kwargs):
+        super().cell_exception(cell, cell_index=cell_index, **kwargs)
+        self.save(force=True)
+
+    def notebook_complete(self, **kwargs):
+        super().notebook_complete(**kwargs)
+        self.save(force=True)
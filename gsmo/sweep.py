@@ -0,0 +1,127 @@
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+from inspect import getfullargspec
+from itertools import product
+from math import ceil
+from multiprocessing import get_context
+import os
+from os import makedirs
+from os.path import basename, dirname, exists, join, splitext
+from re import sub
+
+from utz import git
+
+from .papermill import execute, git_commit, gsmo_opts
+
+# cgroup v2 CPU quota ("<quota> <period>", or "max <period>")
+CPU_MAX_PATH = '/sys/fs/cgroup/cpu.max'
+MAX_NAME_LEN = 100
+
+
+def cpu_count():
+    '''CPUs available to this process, accounting for affinity masks and (cgroup v2) container CPU quotas'''
+    # Not available on macOS
+    sched_getaffinity = getattr(os, 'sched_getaffinity', None)
+    cpus = len(sched_getaffinity(0)) if sched_getaffinity else (os.cpu_count() or 1)
+    if exists(CPU_MAX_PATH):
+        with open(CPU_MAX_PATH,'r') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, ceil(int(quota) / int(period))))
+    return cpus
+
+
+def points(spec):
+    '''Expand a sweep spec into a list of parameter dicts
+
+    A list is taken as the points themselves; a dict is a grid, whose list values are swept over (and whose other values
+    are passed to every point).
+    '''
+    if isinstance(spec, list):
+        return [ dict(point) for point in spec ]
+    if not isinstance(spec, dict):
+        raise ValueError(f'Expected sweep spec to be a list of points or a dict (grid), found: {spec}')
+    keys = list(spec.keys())
+    values = [ v if isinstance(v, list) else [v] for v in spec.values() ]
+    return [ dict(zip(keys, vals)) for vals in product(*values) ]
+
+
+def point_name(point):
+    '''Filesystem-safe name for a sweep point, e.g. "n=1,model=abc"'''
+    name = ','.join(f'{k}={v}' for k, v in point.items())
+    name = sub(r'[^\w.=,+-]', '_', name)
+    if len(name) > MAX_NAME_LEN or not name:
+        name = sha256(name.encode()).hexdigest()[:16]
+    return name
+
+
+def run_point(input, output, point, kwargs, gsmo):
+    kwargs = dict(kwargs, **point)
+    gsmo = dict(gsmo, commit_failures=False)
+    if gsmo.get('run_config') is not None:
+        # Record each point's values in its output notebook's run manifest
+        gsmo['run_config'] = dict(gsmo['run_config'], **point)
+    try:
+        execute(input, output, commit=False, gsmo=gsmo, **kwargs)
+        return None
+    except Exception as e:
+        # PapermillExecutionErrors' reprs include the whole traceback
+        return f'{getattr(e, "ename", type(e).__name__)}: {getattr(e, "evalue", e)}'
+
+
+def sweep(input, out='nbs', spec=None, workers=None, commit=True, msg=None, gsmo=None, **kwargs):
+    '''Execute a notebook once per point of a parameter sweep (concurrently), then commit all output notebooks at once
+
+    Each point's output notebook is written to `<out>/<notebook name>/<point name>.ipynb`; other kwargs (and `gsmo`
+    options) are passed to every `execute` call (with each point's values overriding them).
+    '''
+    gsmo = gsmo_opts(gsmo)
+    if not exists(input) and not input.endswith('.ipynb'):
+        input += '.ipynb'
+    pts = points(spec)
+    reserved = set(getfullargspec(execute).args)
+    for point in pts:
+        if (clashes := reserved.intersection(point)):
+            raise ValueError(f'Sweep parameters clash with `execute` arguments: {", ".join(sorted(clashes))}')
+
+    name = splitext(basename(input))[0]
+    if out.endswith('.ipynb'):
+        out = dirname(out)
+    out_dir = join(out, name)
+    makedirs(out_dir, exist_ok=True)
+    outputs = [ join(out_dir, f'{point_name(point)}.ipynb') for point in pts ]
+    if len(set(outputs)) != len(outputs):
+        raise ValueError(f'Sweep points have colliding names: {outputs}')
+
+    start_sha = git.head.sha() if commit else None
+    workers = workers or cpu_count()
+    print(f'Running {len(pts)} sweep points of {input} with {workers} workers')
+    # Fork (rather than spawn) workers, so that they inherit this process' imports
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('fork')) as executor:
+        errors = list(executor.map(run_point, [input] * len(pts), outputs, pts, [kwargs] * len(pts), [gsmo] * len(pts)))
+
+    failed = [ (output, err) for output, err in zip(outputs, errors) if err ]
+    for output, err in failed:
+        print(f'Sweep point {output} failed: {err}')
+
+    if commit:
+        if commit is True:
+            commit = []
+        elif isinstance(commit, str):
+            commit = [commit]
+        if failed:
+            msg = '\n'.join([ f'Failed: {len(failed)}/{len(pts)} sweep points of {name}', '', ] + [ f'{output}: {err}' for output, err in failed ])
+        elif not msg:
+            msg = f'{name}: {len(pts)} sweep points'
+        from .history import history_path
+        from .outputs import OUTPUTS_DIR
+        paths = [ path for output in outputs for path in [ output, history_path(output) ] if exists(path) ]
+        if gsmo['externalize'] and not gsmo['outputs_dir'] and exists(outputs_dir := join(out_dir, OUTPUTS_DIR)):
+            # Points' externalized outputs (in the default store, next to their notebooks)
+            paths.append(outputs_dir)
+        git_commit(commit + paths, msg, start_sha, fast=gsmo['fast_commit'])
+
+    if failed:
+        raise RuntimeError(f'{len(failed)}/{len(pts)} sweep points failed: {", ".join(output for output, _ in failed)}')
+
+    return outputs
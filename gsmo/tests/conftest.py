@@ -0,0 +1,44 @@
+from os import chmod, environ as env
+from os.path import join
+from tempfile import TemporaryDirectory
+
+import pytest
+
+FAKE_DOCKER = '''#!/usr/bin/env bash
+# Fake `docker` CLI: logs its args, and reports that no containers/images exist
+echo "$@" >> "$FAKE_DOCKER_LOG"
+if [ "$2" == "inspect" ]; then
+  exit 1
+fi
+'''
+
+
+@pytest.fixture
+def fake_docker(monkeypatch):
+    '''Put a fake `docker` executable on the $PATH; yields the path of the log file it appends its invocations to'''
+    with TemporaryDirectory() as dir:
+        path = join(dir, 'docker')
+        with open(path,'w') as f:
+            f.write(FAKE_DOCKER)
+        chmod(path, 0o755)
+        log = join(dir, 'docker.log')
+        monkeypatch.setenv('PATH', f'{dir}:{env["PATH"]}')
+        monkeypatch.setenv('FAKE_DOCKER_LOG', log)
+        # Use the fake CLI, even if a Docker daemon's socket is present
+        from gsmo import docker_api
+        monkeypatch.setenv(docker_api.API_ENV, '0')
+        monkeypatch.setattr(docker_api, '_client', None)
+        yield log
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    '''An empty git repo (with one commit) in `tmp_path`, which is also made the cwd'''
+    from subprocess import check_call
+    monkeypatch.chdir(tmp_path)
+    for k in ['AUTHOR','COMMITTER']:
+        monkeypatch.setenv(f'GIT_{k}_NAME', 'gsmo')
+        monkeypatch.setenv(f'GIT_{k}_EMAIL', 'gsmo@example.com')
+    check_call(['git','init','-q'])
+    check_call(['git','commit','-q','--allow-empty','-m','init'])
+    return tmp_path
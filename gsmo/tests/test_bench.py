@@ -0,0 +1,145 @@
+'''Benchmarks of gsmo's own overhead, against a fake `docker` CLI and a local kernel
+
+Each phase (`gsmo -n run` planning, incl. Dockerfile rendering and mount resolution; `execute()` incl. its git commit)
+is run a few times per module, and its median wall time, subprocesses forked, and bytes written (to the module
+directory, incl. `.git`) are printed (`pytest -s`) and, if $GSMO_BENCH_OUT is set, appended to that file as JSON lines.
+'''
+from contextlib import contextmanager
+import json
+from os import environ, makedirs, walk
+from os.path import dirname, exists, getsize, isdir, join
+from shutil import copytree, ignore_patterns
+from statistics import median
+from subprocess import check_call, Popen
+from time import perf_counter
+
+import nbformat
+import pytest
+# Importing `utz` runs `git version` (via GitPython); do that before counting forks
+import utz
+
+from gsmo.gsmo import main
+from gsmo.papermill import execute
+
+BENCH_OUT_ENV = 'GSMO_BENCH_OUT'
+ROUNDS = 3
+EXAMPLES_DIR = join(dirname(dirname(dirname(__file__))), 'example')
+# Checked-out example modules (git submodules of this repo), plus a synthetic one that is always available
+EXAMPLES = sorted(
+    name for name in ['dind', 'factors', 'hailstone', 'submodules']
+    if exists(join(EXAMPLES_DIR, name, 'run.ipynb'))
+)
+MODULES = [ 'synthetic' ] + EXAMPLES
+
+GSMO_YML = '''
+mount:
+  - data
+apt: [ git ]
+pip: [ "tqdm" ]
+'''
+
+
+def synthetic_module(dir):
+    data = join(dir, 'data')
+    makedirs(data)
+    with open(join(data, 'input.txt'),'w') as f:
+        f.write('1\n2\n3\n')
+    with open(join(dir, 'gsmo.yml'),'w') as f:
+        f.write(GSMO_YML)
+    with open(join(dir, 'requirements.txt'),'w') as f:
+        f.write('pyyaml==6.0\n')
+    nb = nbformat.v4.new_notebook()
+    nb.metadata['kernelspec'] = dict(name='python3', display_name='Python 3', language='python')
+    nb.cells = [
+        nbformat.v4.new_code_cell('n = 10', metadata=dict(tags=['parameters'])),
+        nbformat.v4.new_code_cell("with open('data/input.txt') as f: xs = [ int(ln) for ln in f ]"),
+        nbformat.v4.new_markdown_cell('# Sum'),
+        nbformat.v4.new_code_cell('sum(xs) * n'),
+    ]
+    nbformat.write(nb, join(dir, 'run.ipynb'))
+
+
+@pytest.fixture
+def module(request, repo):
+    '''A copy of an example module, in a fresh git repo (the working directory)'''
+    name = request.param
+    dir = str(repo)
+    if name == 'synthetic':
+        synthetic_module(dir)
+    else:
+        copytree(join(EXAMPLES_DIR, name), dir, ignore=ignore_patterns('.git'), dirs_exist_ok=True)
+    # Configured (rather than only in $GIT_AUTHOR_*), so that `get_git_id` doesn't also need `git log`
+    check_call(['git','config','user.name','gsmo'])
+    check_call(['git','config','user.email','gsmo@example.com'])
+    check_call(['git','add','.'])
+    check_call(['git','commit','-qm',name])
+    return name, dir
+
+
+def dir_size(dir):
+    return sum(
+        getsize(path)
+        for root, _, files in walk(dir)
+        for file in files
+        if exists(path := join(root, file))
+    )
+
+
+@contextmanager
+def measure(dir, monkeypatch):
+    '''Yield a dict that is populated with the wall time, forks, and bytes written (under `dir`) of a `with` block'''
+    forks = []
+    init = Popen.__init__
+    def record(self, args, *a, **kw):
+        forks.append(args)
+        init(self, args, *a, **kw)
+    monkeypatch.setattr(Popen, '__init__', record)
+    stats = {}
+    size = dir_size(dir)
+    start = perf_counter()
+    try:
+        yield stats
+    finally:
+        stats['ms'] = (perf_counter() - start) * 1000
+        stats['forks'] = len(forks)
+        stats['bytes'] = dir_size(dir) - size
+        monkeypatch.setattr(Popen, '__init__', init)
+
+
+def bench(module, phase, fn, monkeypatch):
+    name, dir = module
+    rounds = []
+    for _ in range(ROUNDS):
+        with measure(dir, monkeypatch) as stats:
+            fn()
+        rounds.append(stats)
+    result = dict(
+        module=name,
+        phase=phase,
+        **{ k: median(r[k] for r in rounds) for k in ['ms', 'forks', 'bytes'] },
+    )
+    print(f'{name} {phase}: {result["ms"]:.1f}ms, {result["forks"]} forks, {result["bytes"]} bytes')
+    if (out := environ.get(BENCH_OUT_ENV)):
+        with open(out,'a') as f:
+            f.write(json.dumps(result) + '\n')
+    return result
+
+
+@pytest.mark.parametrize('module', MODULES, indirect=True)
+def test_bench_plan(module, monkeypatch, fake_docker):
+    _, dir = module
+    result = bench(module, 'plan', lambda: main('-n','-G',dir,'run'), monkeypatch)
+    # `git config`, and `docker` image inspection/build
+    assert result['forks'] <= 5
+    with open(fake_docker,'r') as f:
+        assert any(ln.startswith('build ') for ln in f)
+
+
+@pytest.mark.parametrize('module', MODULES, indirect=True)
+@pytest.mark.parametrize('fast_commit', [False, True])
+def test_bench_execute(module, fast_commit, monkeypatch):
+    _, dir = module
+    phase = 'execute (fast commit)' if fast_commit else 'execute'
+    bench(module, phase, lambda: execute('run.ipynb', 'nbs', gsmo=dict(zygote=False, fast_commit=fast_commit)), monkeypatch)
+    assert isdir(join(dir, 'nbs'))
+    assert not utz.process.lines('git','status','--porcelain','nbs')
@@ -0,0 +1,35 @@
+from subprocess import check_call, check_output
+
+from gsmo.commit import commit
+
+
+def git(*args):
+    return check_output(['git'] + list(args)).decode().strip()
+
+
+def test_commit(repo):
+    (repo / 'a').write_text('a')
+    (repo / 'b').write_text('b')
+    check_call(['git','add','a','b'])
+    check_call(['git','commit','-qm','a, b'])
+    start = git('rev-parse','HEAD')
+
+    (repo / 'nbs').mkdir()
+    (repo / 'nbs' / 'run.ipynb').write_text('{}')
+    (repo / 'a').write_text('aa')
+    (repo / 'b').unlink()
+    sha = commit(['nbs','b'], 'run')
+    assert git('rev-parse','HEAD') == sha
+    assert git('rev-list','--parents','-n1','HEAD').split() == [ sha, start ]
+    assert git('show','--name-status','--format=','HEAD').split('\n') == [ 'D\tb', 'A\tnbs/run.ipynb' ]
+    # Uncommitted paths are left as they were; the index matches the new HEAD
+    assert git('status','--porcelain') == 'M a'
+    assert git('reflog','-1','--format=%gs') == 'commit: run'
+
+    # HEAD moved during a run (e.g. the notebook committed): merge it with the run's starting commit
+    check_call(['git','commit','-qam','a'])
+    moved = git('rev-parse','HEAD')
+    (repo / 'nbs' / 'run.ipynb').write_text('{"x": 1}')
+    merge = commit(['nbs'], 'run 2', start_sha=sha)
+    assert git('rev-list','--parents','-n1','HEAD').split() == [ merge, sha, moved ]
+    assert git('status','--porcelain') == ''
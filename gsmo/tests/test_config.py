@@ -0,0 +1,32 @@
+from os import utime
+
+from gsmo import config
+from gsmo.config import load_config
+
+
+def test_load_config(tmp_path, monkeypatch):
+    path = tmp_path / 'gsmo.yml'
+    path.write_text('mount: [ a, b ]\nname: x\n')
+    parses = []
+    yaml_load = config.yaml_load
+    def counting_load(stream):
+        parses.append(stream)
+        return yaml_load(stream)
+    monkeypatch.setattr(config, 'yaml_load', counting_load)
+
+    assert load_config(str(path)) == dict(mount=['a','b'], name='x')
+    assert (tmp_path / '.gsmo' / 'config.json').exists()
+    assert load_config(str(path)) == dict(mount=['a','b'], name='x')
+    assert len(parses) == 1
+
+    # Changes (detected via size/mtime) are re-parsed
+    path.write_text('mount: [ a, b ]\nname: y\n')
+    utime(path, ns=(0, 1))
+    assert load_config(str(path))['name'] == 'y'
+    assert len(parses) == 2
+
+    # Configs that don't survive a JSON round-trip aren't cached
+    path.write_text('date: 2026-01-01\n')
+    assert str(load_config(str(path))['date']) == '2026-01-01'
+    assert str(load_config(str(path))['date']) == '2026-01-01'
+    assert len(parses) == 4
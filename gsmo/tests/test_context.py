@@ -0,0 +1,31 @@
+from os import stat
+
+from gsmo.context import build_context
+
+
+def test_build_context(tmp_path):
+    (tmp_path / 'requirements.txt').write_text('pandas\n')
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'a.py').write_text('a = 1\n')
+    (tmp_path / 'data').mkdir()
+    (tmp_path / 'data' / 'big.csv').write_text('x\n' * 1000)
+    (tmp_path / '.dockerignore').write_text('**/__pycache__\n')
+    dockerfile = tmp_path / 'Dockerfile'
+    dockerfile.write_text('FROM python\nCOPY requirements.txt /tmp/\nCOPY src /src\n')
+
+    context = build_context(str(dockerfile), str(tmp_path))
+    assert context == str(tmp_path / '.gsmo' / 'context')
+    staged = sorted(str(path.relative_to(context)) for path in (tmp_path / '.gsmo' / 'context').rglob('*'))
+    assert staged == [ '.dockerignore', 'requirements.txt', 'src', 'src/a.py', ]
+    # Files are hardlinked, not copied
+    assert stat(f'{context}/src/a.py').st_ino == stat(tmp_path / 'src' / 'a.py').st_ino
+
+    # No COPYs: empty context
+    dockerfile.write_text('FROM python\nRUN echo hi\n')
+    assert build_context(str(dockerfile), str(tmp_path)) == context
+    assert [ path.name for path in (tmp_path / '.gsmo' / 'context').iterdir() ] == [ '.dockerignore' ]
+
+    # Unresolvable or whole-directory sources fall back to the module directory
+    for instruction in [ 'COPY . /src', 'COPY $SRC /src', 'RUN --mount=type=bind,target=/src make', ]:
+        dockerfile.write_text(f'FROM python\n{instruction}\n')
+        assert build_context(str(dockerfile), str(tmp_path)) == str(tmp_path)
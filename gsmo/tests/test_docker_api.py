@@ -0,0 +1,116 @@
+from http.server import BaseHTTPRequestHandler
+import json
+from os.path import join
+from socketserver import ThreadingMixIn, UnixStreamServer
+import struct
+from tempfile import TemporaryDirectory
+from threading import Thread
+
+import pytest
+
+from gsmo.docker_api import APIError, Client
+
+CONTAINER = { 'Id': 'abc', 'State': { 'Running': True }, }
+
+
+class Server(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+    connections = 0
+    drops = 0
+
+
+class Handler(BaseHTTPRequestHandler):
+    '''Fake Docker Engine API: one container ("c"), which `exec`s print "hi" (and "err" to stderr), exiting 3'''
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args): pass
+
+    def send(self, status, body=None, content_type='application/json'):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def drop(self):
+        '''Close the connection without responding (as if the daemon dropped it after receiving the request)'''
+        self.server.drops += 1
+        self.close_connection = True
+
+    def do_GET(self):
+        if self.path == '/drop':
+            self.drop()
+        elif self.path == '/containers/c/json':
+            self.send(200, CONTAINER)
+        elif self.path == '/exec/e/json':
+            self.send(200, { 'ExitCode': 3 })
+        else:
+            self.send(404, { 'message': f'No such object: {self.path}' })
+
+    def do_DELETE(self):
+        if self.path == '/containers/c':
+            self.send(204)
+        else:
+            self.send(404, { 'message': 'not found' })
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path == '/drop':
+            self.drop()
+        elif self.path == '/containers/c/exec':
+            self.send(201, { 'Id': 'e' })
+        elif self.path == '/exec/e/start':
+            # Multiplexed stdout/stderr stream, terminated by closing the connection
+            frames = b''.join(struct.pack('>BxxxL', stream, len(data)) + data for stream, data in [ (1, b'hi\n'), (2, b'err\n') ])
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/vnd.docker.raw-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.wfile.write(frames)
+            self.close_connection = True
+        else:
+            self.send(404, { 'message': 'not found' })
+
+
+@pytest.fixture
+def server():
+    with TemporaryDirectory() as dir:
+        path = join(dir, 'docker.sock')
+        server = Server(path, Handler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        yield server, path
+        server.shutdown()
+
+
+def test_client(server):
+    server, path = server
+    client = Client(path)
+    assert client.inspect_container('c') == CONTAINER
+    assert client.inspect_container('missing') is None
+    assert client.inspect_image('missing') is None
+    # Requests so far reused one keep-alive connection
+    assert server.connections == 1
+    with pytest.raises(APIError):
+        client.remove_container('missing')
+    assert client.exec('c', ['echo','hi']) == (3, 'hi\n', 'err\n')
+    # The exec stream closed its connection; the client reconnects
+    assert client.inspect_container('c') == CONTAINER
+    assert server.connections == 2
+
+
+def test_retries(server):
+    server, path = server
+    client = Client(path)
+    # Idempotent requests are retried (once) on a fresh connection
+    with pytest.raises(ConnectionError):
+        client.request('GET', '/drop')
+    assert server.drops == 2
+    # Others aren't, once they may have reached the daemon
+    with pytest.raises(ConnectionError):
+        client.request('POST', '/drop', body={})
+    assert server.drops == 3
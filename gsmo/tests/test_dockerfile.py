@@ -0,0 +1,15 @@
+from gsmo.dockerfile import split_pinned
+
+
+def test_split_pinned():
+    assert split_pinned([
+        '"pandas==1.1.3"',
+        'requests',
+        'numpy>=1.19',
+        'six==1.*',
+        'pyyaml==5.3.1; python_version >= "3.6"',
+        '# comment',
+    ]) == (
+        [ 'pandas==1.1.3', 'pyyaml==5.3.1; python_version >= "3.6"', ],
+        [ 'requests', 'numpy>=1.19', 'six==1.*', ],
+    )
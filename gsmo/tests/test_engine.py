@@ -0,0 +1,37 @@
+import nbformat
+from pytest import raises
+
+from gsmo.papermill import execute
+
+
+def test_zygote(tmp_path):
+    nb = nbformat.v4.new_notebook(cells=[
+        # Kernels forked from the zygote shouldn't see gsmo's modules as top-level ones (gsmo/papermill.py, gsmo/timeline.py)
+        nbformat.v4.new_code_cell('import cProfile, os, papermill\nn = 2'),
+        nbformat.v4.new_code_cell('papermill.__file__.endswith("papermill/__init__.py"), n * 3, bool(os.environ.get("GSMO_ZYGOTE"))'),
+    ])
+    path = tmp_path / 'run.ipynb'
+    nbformat.write(nb, str(path))
+    execute(str(path), str(tmp_path / 'out.ipynb'), commit=False, gsmo=dict(commit_failures=False, zygote=[ 'json', ]))
+    out = nbformat.read(str(tmp_path / 'out.ipynb'), as_version=4)
+    assert out.cells[1].outputs[0]['data']['text/plain'] == '(True, 6, True)'
+
+
+def test_parameters(tmp_path):
+    '''Notebook parameters named like gsmo options are passed to the notebook'''
+    nb = nbformat.v4.new_notebook(cells=[ nbformat.v4.new_code_cell('history, inputs') ])
+    nb.metadata['language_info'] = dict(name='python')
+    path = tmp_path / 'run.ipynb'
+    nbformat.write(nb, str(path))
+    execute(str(path), str(tmp_path / 'out.ipynb'), commit=False, gsmo=dict(zygote=False), history='h', inputs=[ 1, 2, ])
+    out = nbformat.read(str(tmp_path / 'out.ipynb'), as_version=4)
+    assert out.cells[-1].outputs[0]['data']['text/plain'] == "('h', [1, 2])"
+    assert not (tmp_path / 'out.history.jsonl').exists()
+
+
+def test_early_failure(tmp_path):
+    '''Errors raised before papermill writes an output notebook propagate'''
+    path = tmp_path / 'run.ipynb'
+    nbformat.write(nbformat.v4.new_notebook(cells=[ nbformat.v4.new_code_cell('1') ]), str(path))
+    with raises(ValueError, match='No language found'):
+        execute(str(path), str(tmp_path / 'out.ipynb'), commit=False, gsmo=dict(zygote=False, commit_failures=False), n=1)
@@ -0,0 +1,69 @@
+import json
+
+import nbformat
+
+from gsmo import history
+
+
+def write_nb(path, cells):
+    '''Notebook with papermill timings (`secs`) and gsmo usage metadata for each code cell'''
+    nb = nbformat.v4.new_notebook()
+    for source, secs in cells:
+        cell = nbformat.v4.new_code_cell(source)
+        cell.metadata['papermill'] = dict(
+            start_time='2026-01-01T00:00:00.000000Z',
+            end_time=f'2026-01-01T00:00:{secs:09.6f}Z',
+            status='completed',
+        )
+        cell.metadata['gsmo'] = dict(usage=dict(cpu=secs / 2, rss=2**20))
+        nb.cells.append(cell)
+    nb.cells.append(nbformat.v4.new_markdown_cell('# end'))
+    nbformat.write(nb, str(path))
+
+
+def test_history(tmp_path):
+    output = str(tmp_path / 'run.ipynb')
+    for secs in [ 2, 3, 4, ]:
+        write_nb(output, [ ('x = 1', secs), ('y = 2', .1), ])
+        path = history.record(output)
+    assert path == str(tmp_path / 'run.history.jsonl')
+
+    # Cells are matched by source; "z = 3" is new, and the slow (but sub-second) "y = 2" is ignored
+    write_nb(output, [ ('z = 3', 5), ('x = 1', 7), ('y = 2', .5), ])
+    history.record(output)
+    entries = history.load(path)
+    assert len(entries) == 4
+    assert entries[-1]['cells'][1] == [ 1, entries[0]['cells'][0][1], 7., 3.5, 2**20 ]
+
+    rows = history.compare(entries)
+    assert [ (row['idx'], row['baseline']) for row in rows ] == [ (0, None), (1, 3), (2, .1) ]
+    assert [ row['idx'] for row in history.regressions(rows, 2) ] == [ 1 ]
+    assert history.regressions(rows, 2.5) == []
+    assert history.regressions(rows, 2, min_secs=0) == rows[1:]
+
+    # Failed runs aren't part of the baseline
+    with open(path,'a') as f:
+        f.write(json.dumps(dict(time='', success=False, cells=[ [ 0, entries[0]['cells'][0][1], 100, None, None ] ])) + '\n')
+    write_nb(output, [ ('x = 1', 7), ])
+    history.record(output)
+    [ row ] = history.compare(history.load(path), runs=2)
+    assert row['baseline'] == 5.5
+    assert 'MiB' in history.report(rows)
+
+    # Cells replayed from the memo cache are skipped
+    write_nb(output, [ ('x = 1', 0), ('y = 2', .1), ])
+    nb = nbformat.read(output, as_version=4)
+    nb.cells[0].metadata['gsmo'] = dict(memoized=True)
+    nbformat.write(nb, output)
+    assert [ cell[0] for cell in history.new_entry(output)['cells'] ] == [ 1 ]
+
+    # Accepting a slow run makes it the new baseline
+    write_nb(output, [ ('x = 1', 20), ])
+    history.record(output, success=False)
+    assert history.regressions(history.compare(history.load(path)), 2)
+    assert history.accept(path)['success']
+    write_nb(output, [ ('x = 1', 21), ])
+    history.record(output)
+    [ row ] = history.compare(history.load(path))
+    assert row['baseline'] == 20 and not history.regressions([ row ], 2)
+    assert history.accept(str(tmp_path / 'none.history.jsonl')) is None
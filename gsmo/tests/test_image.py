@@ -0,0 +1,34 @@
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from gsmo.image import base_images, copy_srcs, image_hash
+
+
+def write(path, content):
+    with open(path,'w') as f:
+        f.write(content)
+
+
+def test_copy_srcs_and_hash(fake_docker):
+    with TemporaryDirectory() as dir:
+        dockerfile = join(dir, 'Dockerfile')
+        write(join(dir, 'a.txt'), 'a')
+        write(dockerfile, '\n'.join([
+            'FROM python:3.8 AS build',
+            '# a comment',
+            'COPY --chown=1:1 a.txt \\',
+            '     /a.txt',
+            'FROM build',
+            'COPY --from=build /a.txt /b.txt',
+        ]))
+        assert base_images(dockerfile) == ['python:3.8']
+        assert copy_srcs(dockerfile, dir) == [join(dir, 'a.txt')]
+
+        h1 = image_hash(dockerfile, dir=dir)
+        assert h1 == image_hash(dockerfile, dir=dir)
+        write(join(dir, 'a.txt'), 'b')
+        assert image_hash(dockerfile, dir=dir) != h1
+
+        write(dockerfile, 'FROM python:3.8\nCOPY $SRC /src\n')
+        assert copy_srcs(dockerfile, dir) is None
+        assert image_hash(dockerfile, dir=dir) is None
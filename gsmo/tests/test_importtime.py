@@ -0,0 +1,33 @@
+from subprocess import run
+import sys
+
+# Upper bound (µs) on the cumulative import time of gsmo's CLI entry points (currently ~50ms)
+MAX_IMPORT_US = 200_000
+
+# Modules that should only be imported on code paths that use them
+HEAVY = [ 'utz', 'pandas', 'numpy', 'papermill', 'nbformat', 'jupyter_client', 'pkg_resources', ]
+
+
+def import_times(*modules):
+    '''Cumulative import time (µs) of each (non-nested) import (as reported by `python -X importtime`), and the modules
+    that ended up imported'''
+    code = f'import sys, {", ".join(modules)}; print(",".join(sys.modules))'
+    proc = run([ sys.executable, '-X', 'importtime', '-c', code, ], capture_output=True, text=True, check=True)
+    times = {}
+    for ln in proc.stderr.splitlines():
+        if not ln.startswith('import time:') or 'cumulative' in ln:
+            continue
+        _, _, cumulative, name = ln.replace('import time:', '|', 1).split('|')
+        # Nested imports are indented
+        if not name.startswith('  '):
+            times[name.strip()] = int(cumulative)
+    return times, proc.stdout.strip().split(',')
+
+
+def test_cli_import_time():
+    entrypoints = [ 'gsmo.gsmo', 'gsmo.entrypoint', ]
+    times, modules = import_times(*entrypoints)
+    imported = [ m for m in modules if m.split('.')[0] in HEAVY ]
+    assert not imported
+    total = sum(v for k, v in times.items() if k.split('.')[0] == 'gsmo')
+    assert total < MAX_IMPORT_US, times
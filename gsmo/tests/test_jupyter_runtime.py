@@ -0,0 +1,26 @@
+import json
+from os.path import join
+from threading import Timer
+
+import pytest
+
+from gsmo.jupyter_runtime import clear, server_url, wait_for_server
+
+
+def test_wait_for_server(tmp_path):
+    dir = str(tmp_path)
+    with open(join(dir, 'nbserver-1.json'),'w') as f:
+        json.dump(dict(port=1), f)
+    clear(dir)
+
+    info = dict(port=8888, base_url='/', token='abc')
+    def write():
+        with open(join(dir, 'nbserver-7.json'),'w') as f:
+            json.dump(info, f)
+    Timer(.2, write).start()
+    assert wait_for_server(dir, timeout=5) == info
+    assert server_url(info, 1234) == 'http://127.0.0.1:1234/?token=abc'
+
+    clear(dir)
+    with pytest.raises(RuntimeError):
+        wait_for_server(dir, alive=lambda: False, timeout=5, alive_interval=0)
@@ -0,0 +1,33 @@
+import json
+
+import nbformat
+
+from gsmo.manifest import changes, manifest, write_manifest
+
+
+def test_manifest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    nb = nbformat.v4.new_notebook()
+    nb.cells = [ nbformat.v4.new_code_cell('x = 1') ]
+    nbformat.write(nb, 'run.ipynb')
+    with open('input.txt','w') as f:
+        f.write('1')
+
+    current = manifest('run.ipynb', dict(n=1), ['input.txt'])
+    assert changes('out.ipynb', current) == [ 'no run manifest in out.ipynb' ]
+
+    # Outputs don't affect the notebook hash
+    nb.cells[0].outputs = [ nbformat.v4.new_output('stream', text='hi') ]
+    nbformat.write(nb, 'out.ipynb')
+    write_manifest('out.ipynb', current, success=False)
+    assert changes('out.ipynb', manifest('run.ipynb', dict(n=1), ['input.txt'])) == [ 'last run failed' ]
+
+    write_manifest('out.ipynb', current)
+    assert ''.join(json.load(open('out.ipynb'))['cells'][0]['outputs'][0]['text']) == 'hi'
+    assert changes('out.ipynb', manifest('out.ipynb', dict(n=1), ['input.txt'])) == []
+    assert changes('out.ipynb', manifest('run.ipynb', dict(n=2), ['input.txt'])) == [ 'config changed' ]
+    with open('input.txt','w') as f:
+        f.write('2')
+    with open('gsmo.yml','w') as f:
+        f.write('docker: false\n')
+    assert changes('out.ipynb', manifest('run.ipynb', dict(n=1), ['input.txt'])) == [ 'inputs changed', 'module changed' ]
@@ -0,0 +1,35 @@
+import nbformat
+
+from gsmo.memo import Memo, STATE_FILE
+
+
+def test_memo(tmp_path):
+    inp = tmp_path / 'input.txt'
+    inp.write_text('1')
+    cells = [
+        nbformat.v4.new_code_cell('x = 1'),
+        nbformat.v4.new_markdown_cell('# x'),
+        nbformat.v4.new_code_cell('y = x + 1'),
+        nbformat.v4.new_code_cell('y'),
+    ]
+    memo = Memo(str(tmp_path / 'memo'), parameters=dict(n=1), inputs=[inp])
+    keys = memo.keys(cells)
+    assert len(set(keys)) == 4
+    assert memo.resume_point(cells, keys) == -1
+
+    for cell, key in zip(cells, keys):
+        if cell.cell_type == 'code':
+            memo.store(cell, key)
+    open(memo.path(keys[2], STATE_FILE), 'wb').close()
+    assert memo.resume_point(cells, keys) == 2
+
+    # Changing a cell invalidates it and every later cell
+    cells[2].source = 'y = x + 2'
+    assert memo.keys(cells)[:2] == keys[:2]
+    assert memo.resume_point(cells, memo.keys(cells)) == -1
+    cells[2].source = 'y = x + 1'
+
+    # As do changes to parameters or input files
+    assert Memo(memo.dir, parameters=dict(n=2), inputs=[inp]).keys(cells)[0] != keys[0]
+    inp.write_text('2')
+    assert Memo(memo.dir, parameters=dict(n=1), inputs=[inp]).keys(cells)[0] != keys[0]
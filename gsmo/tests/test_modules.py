@@ -0,0 +1,139 @@
+import json
+from os import makedirs
+from os.path import dirname, exists
+from subprocess import check_call, check_output
+
+from pytest import raises
+from utz import cd
+
+from gsmo.modules import dependents, toposort, Modules
+
+
+def write(path, text):
+    if dirname(path):
+        makedirs(dirname(path), exist_ok=True)
+    with open(path,'w') as f:
+        f.write(text)
+
+
+def test_toposort():
+    assert toposort(dict(c=['a','b'], a=[], b=['a'], d=[])) == ['a','d','b','c']
+    with raises(ValueError, match='unknown module x'):
+        toposort(dict(a=['x']))
+    with raises(ValueError, match='cycle'):
+        toposort(dict(a=['b'], b=['a'], c=[]))
+
+
+def test_affected(repo, tmp_path_factory):
+    # Submodule "a"
+    src = tmp_path_factory.mktemp('a')
+    with cd(src):
+        check_call(['git','init','-q'])
+        write('run.ipynb', '{}')
+        check_call(['git','add','.'])
+        check_call(['git','commit','-qm','a'])
+    check_call(['git','-c','protocol.file.allow=always','submodule','add','-q',str(src),'a'])
+    # Subdirectory modules "b" (reads ../data) and "c" (depends on "b")
+    write('b/gsmo.yml', 'inputs: ../data\n')
+    write('c/gsmo.yml', 'deps: b\n')
+    write('data', '1')
+    check_call(['git','add','.'])
+    check_call(['git','commit','-qm','root'])
+
+    modules = Modules()
+    deps = { module: modules.deps(module) for module in ['a','b','c'] }
+    assert modules.affected(deps, 'HEAD') == set()
+
+    # Output notebooks don't count as changes
+    write('a/nbs/run.ipynb', '{}')
+    write('b/nbs/run.ipynb', '{}')
+    with cd('a'):
+        check_call(['git','add','nbs'])
+        check_call(['git','commit','-qm','run'])
+    check_call(['git','add','.'])
+    check_call(['git','commit','-qm','run'])
+    assert modules.affected(deps, 'HEAD~') == set()
+
+    write('a/run.ipynb', '{"cells": []}')
+    assert modules.affected(deps, 'HEAD') == {'a'}
+    write('data', '2')
+    assert modules.affected(deps, 'HEAD') == {'a','b','c'}
+    assert dependents(deps, ['b']) == {'b','c'}
+
+
+def fake_run_module(module, *args):
+    '''Stand-in for `run_module`: logs the module, writes and commits an output (in this repo, for plain subdirectories,
+    like `execute` does), and fails for "c"'''
+    from os import environ
+    with open(environ['RUN_LOG'],'a') as f:
+        f.write(f'{module}\n')
+    if module == 'c':
+        raise RuntimeError('c failed')
+    makedirs(module, exist_ok=True)
+    with cd(module):
+        with open('out.txt','a') as f:
+            f.write(f'{module}\n')
+        check_call(['git','add','out.txt'])
+        check_call(['git','commit','-qm','run' if exists('.git') else module])
+
+
+def test_run_all(repo, monkeypatch):
+    from gsmo import modules
+    monkeypatch.setattr(modules, 'run_module', fake_run_module)
+    monkeypatch.setenv('RUN_LOG', str(repo / 'log'))
+    # Submodule-style modules "a" and "e", and subdirectories "b", "c", and "d" (run one at a time)
+    for module in ['a','e']:
+        makedirs(module)
+        with cd(module):
+            check_call(['git','init','-q'])
+            check_call(['git','commit','-q','--allow-empty','-m','init'])
+    conf = dict(b=dict(deps=['a']), c=dict(deps=['a']), d=dict(deps='b,c'))
+    with raises(RuntimeError, match=r"Module\(s\) failed: c .*d \('dependency c failed'\)"):
+        Modules(conf=conf).run_all(['a','b','c','d','e'], workers=2)
+
+    with open('log','r') as f:
+        log = f.read().split()
+    assert sorted(log) == ['a','b','c','e']
+    assert log.index('a') < log.index('b') and log.index('a') < log.index('c')
+    subjects = check_output(['git','log','--format=%s']).decode().split()
+    assert sorted(subjects[:-1]) == ['a','b','e'] and subjects[-1] == 'init'
+    assert not check_output(['git','status','--porcelain','--','a','b','e'])
+    # Run directly, a subdirectory module isn't committed again
+    Modules().run('b')
+    assert check_output(['git','log','-1','--format=%s']).decode().strip() == 'b'
+
+
+def fake_main(*args):
+    from os import environ
+    with open(environ['RUN_LOG'],'a') as f:
+        f.write(json.dumps(args) + '\n')
+
+
+def test_run_affected(repo, monkeypatch, tmp_path_factory):
+    from gsmo import gsmo
+    main = gsmo.main
+    monkeypatch.setattr(gsmo, 'main', fake_main)
+    monkeypatch.setenv('RUN_LOG', str(repo / 'log'))
+    monkeypatch.delenv('GSMO_IMAGE', raising=False)
+    # No .gitmodules: nothing to run
+    main('run','--affected','HEAD')
+
+    src = tmp_path_factory.mktemp('a')
+    with cd(src):
+        check_call(['git','init','-q'])
+        write('gsmo.yml', 'out: results\n')
+        write('run.ipynb', '{}')
+        check_call(['git','add','.'])
+        check_call(['git','commit','-qm','a'])
+    check_call(['git','-c','protocol.file.allow=always','submodule','add','-q',str(src),'a'])
+    check_call(['git','commit','-qm','a'])
+    write('a/run.ipynb', '{"cells": []}')
+
+    # Other CLI args are forwarded to the module's run, whose outputs go to its configured `out` dir
+    main('-n','--name','x','run','--affected','HEAD','-y','b: 1')
+    with open('log','r') as f:
+        [ args ] = [ json.loads(line) for line in f ]
+    assert args[:-3] == ['-I','-n','--name','x','run','-o','results','-x','run.ipynb','-Y']
+    assert args[-2:] == ['-y','b: 1']
+    # The (dry) run changed nothing, so there's nothing to commit
+    assert check_output(['git','log','-1','--format=%s']).decode().strip() == 'a'
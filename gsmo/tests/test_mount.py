@@ -0,0 +1,28 @@
+from pytest import raises
+
+from gsmo.mount import Mount, Mounts
+
+
+def test_mounts(tmp_path):
+    for dir in [ 'a/b/c', 'x', ]:
+        (tmp_path / dir).mkdir(parents=True)
+    a, b, c, x = [ str(tmp_path / dir) for dir in [ 'a', 'a/b', 'a/b/c', 'x', ] ]
+
+    mounts = Mounts([ f'{c}:/m/b/c', f'{x}:/m/b/x', f'{a}:/m' ])
+    # /m/b/c is covered by /m; /m/b/x (a different host dir) isn't
+    assert str(mounts) == f'{x}:/m/b/x,{a}:/m'
+    mounts += f'{b}:/m/b'
+    mounts += Mount(x, '/m/b/x')
+    assert len(mounts) == 2
+    mounts += f'{c}:/n'
+    assert mounts.args() == [ '-v', f'{x}:/m/b/x', '-v', f'{a}:/m', '-v', f'{c}:/n', ]
+
+    with raises(ValueError, match='Conflicting mounts at /n'):
+        mounts += f'{x}:/n'
+
+    # Container path → host path
+    assert mounts.remap('/m') == a
+    assert mounts.remap('/m/b/c/d.txt') == f'{c}/d.txt'
+    assert mounts.remap('/m/b/x/y') == f'{x}/y'
+    assert mounts.remap('/n/') == c
+    assert mounts.remap('/o') is None
@@ -0,0 +1,48 @@
+import json
+
+import nbformat
+
+from gsmo.outputs import externalize, rehydrate, REF_KEY
+
+
+def test_roundtrip(tmp_path):
+    nb = nbformat.v4.new_notebook()
+    png = 'a' * 1000
+    html = '<b>hi</b>'
+    nb.cells = [
+        nbformat.v4.new_code_cell('plot()', outputs=[
+            nbformat.v4.new_output('display_data', data={ 'image/png': png, 'text/plain': '<Figure>' }, metadata={ 'image/png': { 'width': 10 } }),
+            nbformat.v4.new_output('execute_result', data={ 'text/html': png + html }, execution_count=1),
+        ]),
+        nbformat.v4.new_code_cell('x', outputs=[ nbformat.v4.new_output('display_data', data={ 'text/html': html }) ]),
+    ]
+    path = str(tmp_path / 'out.ipynb')
+    nbformat.write(nb, path)
+    original = json.load(open(path))
+
+    store = str(tmp_path / 'outputs')
+    assert externalize(path, store, threshold=100) == 2
+    [ [ img, result ], [ small ] ] = [ cell.outputs for cell in nbformat.read(path, as_version=4).cells ]
+    assert img['data'] == { 'text/plain': '<Figure>' }
+    assert img['metadata']['image/png']['width'] == 10
+    assert REF_KEY in img['metadata']['image/png']
+    assert result['data']['text/plain'].startswith('[externalized output: text/html')
+    assert small['data'] == { 'text/html': html }
+
+    # Idempotent, and identical outputs are stored once
+    assert externalize(path, store, threshold=100) == 0
+    rehydrated = str(tmp_path / 'rehydrated.ipynb')
+    assert rehydrate(path, store, rehydrated) == 2
+    assert json.load(open(rehydrated)) == original
+
+
+def test_execute_externalize(repo):
+    from subprocess import check_output
+    from gsmo.papermill import execute
+    nbformat.write(nbformat.v4.new_notebook(cells=[ nbformat.v4.new_code_cell("'x' * 1000") ]), 'run.ipynb')
+    execute('run.ipynb', 'nbs', gsmo=dict(externalize=100, zygote=False))
+    # The default store is next to the output notebook, and committed with it
+    committed = check_output(['git','show','--name-only','--format=','HEAD']).decode().split()
+    [ blob ] = [ path for path in committed if path.startswith('nbs/outputs/') ]
+    assert committed == [ blob, 'nbs/run.ipynb', ]
+    assert rehydrate('nbs/run.ipynb', 'nbs/outputs') == 1
@@ -0,0 +1,49 @@
+from subprocess import check_call, Popen
+
+import nbformat
+# Importing `utz` runs `git version` (via GitPython); do that before counting forks
+import utz
+
+from gsmo.gsmo import main
+
+# Subprocesses `gsmo -n run` may spawn while planning a run: one `git config`, plus `docker` container/image inspection
+# and the image build
+MAX_FORKS = 5
+
+
+def test_plan_forks(repo, monkeypatch, fake_docker):
+    # Configured (rather than only in $GIT_AUTHOR_*), so that `get_git_id` doesn't also need `git log`
+    check_call(['git','config','user.name','gsmo'])
+    check_call(['git','config','user.email','gsmo@example.com'])
+    nbformat.write(nbformat.v4.new_notebook(), 'run.ipynb')
+
+    cmds = []
+    init = Popen.__init__
+    def record(self, args, *a, **kw):
+        cmds.append(args)
+        init(self, args, *a, **kw)
+    monkeypatch.setattr(Popen, '__init__', record)
+
+    main('-n','-G',str(repo),'run')
+    names = [ cmd[0] if cmd[0] != 'docker' else ' '.join(cmd[:3]) for cmd in cmds ]
+    assert 'id' not in names and 'stat' not in names
+    assert names.count("git") == 1
+    assert len(cmds) <= MAX_FORKS, cmds
+
+
+def test_plan_pool(repo, monkeypatch, capsys, fake_docker):
+    nbformat.write(nbformat.v4.new_notebook(), 'run.ipynb')
+
+    def plan(*args):
+        main('-n','-G',str(repo),'--rm',*args,'run')
+        return [ line for line in capsys.readouterr().out.splitlines() if line.startswith('Would run') ]
+
+    [ docker_run ] = plan()
+    assert docker_run.startswith('Would run: docker run ') and ' --rm ' in docker_run
+
+    # `docker exec` doesn't accept `--rm`
+    pooled, docker_exec = plan('--pool','1')
+    assert docker_exec.startswith('Would run: docker exec ') and ' --rm ' not in docker_exec
+    # Pooled containers created with different settings aren't reused
+    assert plan('--pool','1')[0] == pooled
+    assert plan('--pool','1','-E','A=1')[0] != pooled
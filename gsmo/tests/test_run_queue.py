@@ -0,0 +1,90 @@
+import json
+import nbformat
+from threading import Lock
+from time import sleep
+
+from gsmo.run_queue import Queue, run_entry, split_args, work, DONE, FAILED, PENDING
+
+
+def test_queue(tmp_path):
+    a, b = tmp_path / 'a', tmp_path / 'b'
+    a.mkdir()
+    b.mkdir()
+    queue = Queue(str(tmp_path / 'queue.db'))
+
+    # Identical pending runs are coalesced
+    assert queue.add(str(a)) == (1, False)
+    assert queue.add(str(a)) == (1, True)
+    assert queue.add(str(a), ['-y', 'n: 2']) == (2, False)
+    assert queue.add(str(b)) == (3, False)
+    [ run ] = queue.runs([ PENDING ])[:1]
+    assert run['requests'] == 2
+
+    # Runs of the same module are serialized
+    assert queue.claim()['id'] == 1
+    assert queue.claim()['id'] == 3
+    assert queue.claim() is None
+    # A run identical to a running one isn't coalesced with it
+    assert queue.add(str(a)) == (4, False)
+    queue.finish(1, 0)
+    assert queue.claim()['id'] == 2
+
+    # As are runs of different modules that would use the same container name
+    c, d = tmp_path / 'x' / 'Q', tmp_path / 'y' / 'q'
+    c.mkdir(parents=True)
+    d.mkdir(parents=True)
+    (d / 'gsmo.yml').write_text('name: d\n')
+    assert queue.add(str(c)) == (5, False)
+    assert queue.add(str(d), opts=['--name', 'q']) == (6, False)
+    assert queue.add(str(d)) == (7, False)
+    assert queue.claim()['id'] == 5
+    assert queue.claim()['id'] == 7
+    assert queue.claim() is None
+    # 6 is blocked by 7's module, then by 5's container name
+    queue.finish(7, 0)
+    assert queue.claim() is None
+    queue.finish(5, 0)
+    assert queue.claim()['id'] == 6
+
+
+def test_work(tmp_path):
+    modules = [ tmp_path / name for name in 'abc' ]
+    for module in modules:
+        module.mkdir()
+    queue = Queue(str(tmp_path / 'queue.db'))
+    for module in modules * 2:
+        queue.add(str(module), [ '-y', f'x: {module.name}', ])
+    queue.add(str(modules[0]), [ 'fail', ])
+
+    lock = Lock()
+    running = set()
+    overlaps = []
+    def runner(run):
+        with lock:
+            if run['module'] in running:
+                overlaps.append(run['module'])
+            running.add(run['module'])
+        sleep(.05)
+        with lock:
+            running.remove(run['module'])
+        return 1 if json.loads(run['args']) == [ 'fail' ] else 0
+
+    work(queue, jobs=3, drain=True, poll=.01, runner=runner)
+    assert not overlaps
+    runs = queue.runs()
+    assert [ run['state'] for run in runs ] == [ DONE ] * 3 + [ FAILED ]
+
+
+def test_run_entry(repo, fake_docker):
+    module = repo / 'm'
+    module.mkdir()
+    nbformat.write(nbformat.v4.new_notebook(cells=[ nbformat.v4.new_code_cell('1') ]), str(module / 'nb.ipynb'))
+    assert split_args([ '-x', 'nb.ipynb', ]) == ([], [ '-x', 'nb.ipynb', ])
+    opts, args = split_args([ '-n', '--name', 'q', 'run', '-x', 'nb.ipynb', ])
+    assert (opts, args) == ([ '-n', '--name', 'q', ], [ '-x', 'nb.ipynb', ])
+    queue = Queue(str(repo / 'queue.db'))
+    queue.add(str(module), args, opts)
+    run = queue.claim()
+    assert run['name'] == 'q'
+    # Top-level options go before `run` (dry run: the fake `docker` just logs the image build)
+    assert run_entry(run) == 0
@@ -0,0 +1,39 @@
+from os import environ
+from subprocess import Popen, run
+import sys
+from time import sleep, time
+
+from gsmo import zygote
+
+
+def test_serve(tmp_path):
+    path = str(tmp_path / 'serve.sock')
+    env = dict(environ, GSMO_SERVE=path, GSMO_QUEUE=str(tmp_path / 'queue.db'))
+    (tmp_path / 'm').mkdir()
+    daemon = Popen([ sys.executable, '-m', 'gsmo.gsmo', 'serve', '-t', '30', ], env=env)
+    try:
+        deadline = time() + 30
+        while not zygote.is_alive(path):
+            assert time() < deadline and daemon.poll() is None
+            sleep(.05)
+
+        def gsmo(*args):
+            return run([ sys.executable, '-m', 'gsmo.gsmo', *args, ], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60)
+
+        # The invocation runs in a child of the daemon (which calls `main` with explicit args), in the client's cwd
+        proc = gsmo('queue', 'add', 'm')
+        assert proc.returncode == 0
+        assert proc.stdout.splitlines() == [ "gsmo.main(('queue', 'add', 'm'))", 'Enqueued run 1', ]
+
+        # A bare `gsmo` runs in the child (rather than being forwarded back to the daemon)
+        proc = gsmo()
+        assert proc.returncode == 1
+        assert 'Unknown cmd' in proc.stderr
+
+        # Exit codes and stderr are relayed
+        proc = gsmo('queue', 'bogus')
+        assert proc.returncode == 2
+        assert 'invalid choice' in proc.stderr
+    finally:
+        daemon.terminate()
+        daemon.wait()
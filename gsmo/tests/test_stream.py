@@ -0,0 +1,27 @@
+import nbformat
+from papermill.iorw import load_notebook_node
+
+from gsmo.stream import StreamingExecutionManager
+
+
+def test_checkpoints(tmp_path):
+    nb = nbformat.v4.new_notebook()
+    nb.cells = [ nbformat.v4.new_code_cell(f'x = {i}') for i in range(5) ]
+    nbformat.write(nb, tmp_path / 'in.ipynb')
+    nb = load_notebook_node(str(tmp_path / 'in.ipynb'))
+
+    path = tmp_path / 'out.ipynb'
+    nb_man = StreamingExecutionManager(nb, str(path), cells=2, secs=None, progress_bar=False)
+    checkpoints = []
+    checkpoint = nb_man.checkpoint
+    nb_man.checkpoint = lambda: (checkpoints.append(nb_man.cells_since_checkpoint), checkpoint())
+
+    nb_man.notebook_start()
+    assert path.exists()
+    for idx, cell in enumerate(nb.cells):
+        nb_man.cell_start(cell, idx)
+        nb_man.cell_complete(cell, idx)
+    nb_man.notebook_complete()
+    # Initial checkpoint, one every 2 cells, and a final one
+    assert checkpoints == [ 0, 2, 2, 1 ]
+    assert not list(tmp_path.glob('*.tmp'))
@@ -0,0 +1,53 @@
+from subprocess import check_call, check_output
+
+import nbformat
+from pytest import raises
+
+from gsmo.sweep import point_name, points, sweep
+
+
+def git(*args):
+    return check_output(['git'] + list(args)).decode().strip().split('\n')
+
+
+def test_points():
+    assert points(dict(n=[1,2], m=['a','b'], k=0)) == [
+        dict(n=1, m='a', k=0),
+        dict(n=1, m='b', k=0),
+        dict(n=2, m='a', k=0),
+        dict(n=2, m='b', k=0),
+    ]
+    assert points([ dict(n=1), dict(n=2, m='a') ]) == [ dict(n=1), dict(n=2, m='a') ]
+    assert point_name(dict(n=1, path='a/b c')) == 'n=1,path=a_b_c'
+    assert len(point_name(dict(x='y' * 200))) == 16
+
+
+def test_sweep(repo):
+    nb = nbformat.v4.new_notebook(cells=[ nbformat.v4.new_code_cell('n = 0'), nbformat.v4.new_code_cell('assert n != 3; n * 2') ])
+    nb.metadata['language_info'] = dict(name='python')
+    nb.cells[0].metadata['tags'] = [ 'parameters' ]
+    nbformat.write(nb, 'run.ipynb')
+    check_call(['git','add','run.ipynb'])
+    check_call(['git','commit','-qm','run.ipynb'])
+
+    outputs = sweep('run.ipynb', spec=dict(n=[1,2]), workers=2)
+    assert outputs == [ 'nbs/run/n=1.ipynb', 'nbs/run/n=2.ipynb', ]
+    assert nbformat.read(outputs[1], as_version=4).cells[-1].outputs[0]['data']['text/plain'] == '4'
+    # All points are committed together
+    assert git('log','--format=%s') == [ 'run: 2 sweep points', 'run.ipynb', 'init', ]
+    assert git('show','--name-only','--format=','HEAD') == outputs
+
+    # Failed points' output notebooks are committed too, and the sweep raises
+    with raises(RuntimeError, match=r'1/2 sweep points failed: nbs/run/n=3.ipynb'):
+        sweep('run.ipynb', spec=[ dict(n=3), dict(n=4), ], workers=2)
+    [ subject, _, failure ] = git('log','-1','--format=%B')[:3]
+    assert subject == 'Failed: 1/2 sweep points of run'
+    assert failure.startswith('nbs/run/n=3.ipynb: AssertionError')
+    assert git('show','--name-only','--format=','HEAD') == [ 'nbs/run/n=3.ipynb', 'nbs/run/n=4.ipynb', ]
+
+    # Externalized outputs (in the default store, next to the output notebooks) are committed with them
+    sweep('run.ipynb', spec=dict(n=[ 50, 60, ]), workers=2, gsmo=dict(externalize=1))
+    committed = git('show','--name-only','--format=','HEAD')
+    assert committed[:2] == [ 'nbs/run/n=50.ipynb', 'nbs/run/n=60.ipynb', ]
+    assert len(committed) == 4 and all(path.startswith('nbs/run/outputs/') for path in committed[2:])
+    assert not git('status','--porcelain')[0]
@@ -0,0 +1,37 @@
+import json
+
+import nbformat
+
+from gsmo import timeline
+
+
+def test_timeline(tmp_path, monkeypatch):
+    monkeypatch.delenv(timeline.PROFILE_ENV, raising=False)
+    with timeline.span('disabled'):
+        pass
+
+    # Events recorded before the events file is known are buffered
+    timeline.enable()
+    with timeline.span('Config'):
+        pass
+    events = str(tmp_path / timeline.EVENTS_FILE)
+    # `start` sets the env var (for child processes); have monkeypatch restore it
+    monkeypatch.setenv(timeline.PROFILE_ENV, '')
+    timeline.start(events)
+    with timeline.span('docker run', container='abc'):
+        pass
+
+    nb = nbformat.v4.new_notebook()
+    nb.cells = [ nbformat.v4.new_code_cell('x = 1'), nbformat.v4.new_code_cell('y = 2'), ]
+    nb.cells[0].metadata.papermill = dict(start_time='2026-01-01T00:00:01+00:00', end_time='2026-01-01T00:00:03.500000+00:00', status='completed')
+    nb.cells[1].metadata.papermill = dict(start_time='2026-01-01T00:00:03.500000', end_time='2026-01-01T00:00:04Z', status='completed')
+    nbformat.write(nb, str(tmp_path / 'out.ipynb'))
+    start = timeline.parse_time('2026-01-01T00:00:00+00:00')
+    timeline.notebook_events(str(tmp_path / 'out.ipynb'), start=start)
+
+    trace = str(tmp_path / timeline.TRACE_FILE)
+    assert timeline.merge(events, trace) == 6
+    evts = json.load(open(trace))['traceEvents']
+    assert [ e['name'] for e in evts ] == [ 'Config', 'process_name', 'docker run', 'kernel start', 'cell 0', 'cell 1', ]
+    assert [ e['dur'] for e in evts[3:] ] == [ 1_000_000, 2_500_000, 500_000, ]
+    assert evts[2]['args'] == dict(container='abc')
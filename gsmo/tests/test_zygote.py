@@ -0,0 +1,33 @@
+from multiprocessing import get_context
+import os
+from os.path import join
+
+from gsmo.zygote import is_alive, request, Server, SOCKET_ENV
+
+
+def handler(req):
+    # Exit code reflects the request args, and whether the forked child received the requester's env/cwd
+    if os.environ.get('ZYGOTE_TEST') != 'yes' or os.getcwd() != req['cwd']:
+        return 100
+    return len(req['argv'])
+
+
+def serve(path):
+    Server(path, handler, idle_timeout=5).serve()
+
+
+def test_server(tmp_path, monkeypatch):
+    path = join(tmp_path, 'zygote.sock')
+    server = get_context('fork').Process(target=serve, args=(path,))
+    server.start()
+    try:
+        while not is_alive(path):
+            assert server.is_alive()
+        monkeypatch.setenv('ZYGOTE_TEST', 'yes')
+        monkeypatch.chdir(tmp_path)
+        assert request(path, ['a','b','c']) == 3
+        assert request(path, []) == 0
+        assert os.environ.get(SOCKET_ENV) is None
+    finally:
+        server.terminate()
+        server.join()
@@ -0,0 +1,124 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import json
+from os import environ, getpid
+from os.path import basename, exists
+import sys
+from threading import get_ident
+from time import time
+
+# Path of a JSON-lines file that host- and container-side gsmo processes append Chrome trace events to
+PROFILE_ENV = 'GSMO_PROFILE'
+EVENTS_FILE = 'profile.jsonl'
+# Merged trace (Chrome trace "JSON object" format; open in chrome://tracing or ui.perfetto.dev), written to the `out` dir
+TRACE_FILE = 'profile.json'
+
+# Events recorded by `--profile` before the events file's location is known (e.g. while loading configs)
+_buffer = None
+_named = False
+
+
+def now(): return int(time() * 1e6)
+
+
+def enable():
+    '''Start buffering events in this process (until `start` is called)'''
+    global _buffer
+    if _buffer is None:
+        _buffer = []
+
+
+def start(path):
+    '''Truncate the events file `path`, and write subsequent events (and any buffered ones) to it (and child processes')'''
+    global _buffer
+    environ[PROFILE_ENV] = path
+    with open(path,'w') as f:
+        for evt in _buffer or []:
+            f.write(json.dumps(evt) + '\n')
+    _buffer = None
+
+
+def enabled():
+    return _buffer is not None or bool(environ.get(PROFILE_ENV))
+
+
+def emit(evt):
+    global _named
+    if _buffer is not None:
+        _buffer.append(evt)
+        return
+    path = environ.get(PROFILE_ENV)
+    if not path:
+        return
+    evts = [ evt ]
+    if not _named:
+        # Label this process' track, e.g. "gsmo-entrypoint (container)"
+        label = basename(sys.argv[0]) or 'python'
+        if exists('/.dockerenv'):
+            label += ' (container)'
+        evts = [ dict(name='process_name', ph='M', pid=getpid(), args=dict(name=label)) ] + evts
+        _named = True
+    with open(path,'a') as f:
+        f.write(''.join(json.dumps(e) + '\n' for e in evts))
+
+
+def event(name, ts, dur, cat='gsmo', **args):
+    '''Record a complete ("X") event; `ts` and `dur` are in µs'''
+    if enabled():
+        emit(dict(name=name, cat=cat, ph='X', ts=ts, dur=dur, pid=getpid(), tid=get_ident() % 2**31, args=args))
+
+
+@contextmanager
+def span(name, cat='gsmo', **args):
+    '''Record the duration of a `with` block (a no-op unless profiling is enabled)'''
+    if not enabled():
+        yield
+        return
+    ts = now()
+    try:
+        yield
+    finally:
+        event(name, ts, now() - ts, cat=cat, **args)
+
+
+def parse_time(s):
+    # `datetime.fromisoformat` only accepts a "Z" suffix as of Python 3.11
+    if s.endswith('Z'):
+        s = s[:-1] + '+00:00'
+    t = datetime.fromisoformat(s)
+    if not t.tzinfo:
+        t = t.replace(tzinfo=timezone.utc)
+    return int(t.timestamp() * 1e6)
+
+
+def notebook_events(nb_path, start=None):
+    '''Record the kernel-start phase (from `start`, in µs, to the first cell's start) and each executed cell, from the
+    timings papermill writes to an output notebook's metadata'''
+    if not enabled():
+        return
+    from .nb import read_nb
+    cells = [
+        (idx, cell, pm)
+        for idx, cell in enumerate(read_nb(nb_path)['cells'])
+        if (pm := cell.get('metadata', {}).get('papermill', {})).get('start_time') and pm.get('end_time')
+    ]
+    if cells and start:
+        first = parse_time(cells[0][2]['start_time'])
+        event('kernel start', start, first - start, cat='notebook')
+    for idx, cell, pm in cells:
+        ts = parse_time(pm['start_time'])
+        source = cell['source'] if isinstance(cell['source'], str) else ''.join(cell['source'])
+        event(f'cell {idx}', ts, parse_time(pm['end_time']) - ts, cat='notebook', source=source[:200], status=pm.get('status'))
+
+
+def merge(events_path, trace_path):
+    '''Convert an events file into a Chrome trace file'''
+    evts = []
+    with open(events_path,'r') as f:
+        for ln in f:
+            ln = ln.strip().rstrip(',')
+            if ln:
+                evts.append(json.loads(ln))
+    with open(trace_path,'w') as f:
+        json.dump(dict(traceEvents=evts, displayTimeUnit='ms'), f)
+    return len(evts)
@@ -0,0 +1,25 @@
+from subprocess import CalledProcessError
+from sys import stderr
+
+from utz.process import lines
+
+KEYS = { 'name': '%an', 'email': '%ae', }
+
+
+def get_git_id():
+    '''Git user name/email, from `git config` (falling back to the most recent commit's author)'''
+    try:
+        configs = lines('git','config','--get-regexp',r'^user\.(name|email)$')
+    except CalledProcessError:
+        configs = []
+    git_id = {}
+    for ln in configs:
+        k, _, v = ln.partition(' ')
+        git_id[k[len('user.'):]] = v
+    missing = [ k for k in KEYS if k not in git_id ]
+    if missing:
+        values = lines('git','log','-n','1',f'--format={"%n".join(KEYS[k] for k in missing)}')
+        for k, v in zip(missing, values):
+            stderr.write(f'Falling back to Git user {k} from most recent commit: {v}\n')
+            git_id[k] = v
+    return git_id
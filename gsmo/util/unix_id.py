@@ -1,15 +1,21 @@
 from functools import cached_property
-from utz.process import line
+from os import getgid, getuid
+
 
 class UnixId:
+    '''Current user/group IDs and names (as strings), looked up in-process'''
     @cached_property
-    def uid(self): return line('id','-u')
+    def uid(self): return str(getuid())
 
     @cached_property
-    def gid(self): return line('id','-g')
+    def gid(self): return str(getgid())
 
     @cached_property
-    def user(self): return line('id','-un')
+    def user(self):
+        from pwd import getpwuid
+        return getpwuid(getuid()).pw_name
 
     @cached_property
-    def group(self): return line('id','-gn')
+    def group(self):
+        from grp import getgrgid
+        return getgrgid(getgid()).gr_name
@@ -1,5 +1,4 @@
 
 def get_version():
-    from pkg_resources import get_distribution
-    pkg = get_distribution('gsmo')
-    return pkg.version
+    from importlib.metadata import version
+    return version('gsmo')
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+'''Fork-server ("zygote") for Jupyter kernels
+
+A resident `serve` process imports ipykernel and a configurable list of heavy libraries (pandas, numpy, …) once, then
+`fork()`s a fresh kernel for each request. Requests come from a thin `connect` process, which stands in for the kernel
+process from Jupyter's point of view: it passes its stdio, cwd, and environment to the forked kernel, forwards signals
+(e.g. interrupts) to it, and exits with its exit status. If the `connect` process is killed, the zygote kills the kernel.
+
+This module only uses the standard library, so that `connect` starts quickly; it's run as a script (`python zygote.py
+…`), not via `-m gsmo.zygote`, to avoid importing the rest of the `gsmo` package.
+'''
+
+import sys
+from os.path import dirname, realpath
+
+if __name__ == '__main__':
+    # Running as a script puts gsmo/ at the front of sys.path; drop it, so that gsmo's modules (e.g. gsmo/papermill.py)
+    # don't shadow top-level ones (in this process, and the kernels forked from it)
+    sys.path = [ path for path in sys.path if realpath(path or '.') != realpath(dirname(__file__)) ]
+
+from argparse import ArgumentParser
+import array
+from hashlib import sha256
+from importlib import import_module
+import json
+import os
+from os.path import exists, getmtime, join
+from select import select
+import signal
+import socket
+import struct
+from subprocess import DEVNULL, Popen
+from tempfile import gettempdir
+import time
+
+SOCKET_ENV = 'GSMO_ZYGOTE'
+PRELOAD_ENV = 'GSMO_ZYGOTE_PRELOAD'
+DEFAULT_PRELOAD = [ 'numpy', 'pandas', 'sqlalchemy', ]
+KERNEL_MODULES = [ 'ipykernel.kernelapp', ]
+IDLE_TIMEOUT = 600
+STDIO = [ 0, 1, 2, ]
+FORWARD_SIGNALS = [ signal.SIGINT, signal.SIGTERM, signal.SIGHUP, signal.SIGQUIT, ]
+
+
+def send_msg(sock, obj, fds=None):
+    '''Send a length-prefixed JSON message, optionally passing file descriptors along with it'''
+    data = json.dumps(obj).encode()
+    header = struct.pack('!I', len(data))
+    if fds:
+        sock.sendmsg([header], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))])
+    else:
+        sock.sendall(header)
+    sock.sendall(data)
+
+
+def recv_exactly(sock, n):
+    buf = b''
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise EOFError
+        buf += chunk
+    return buf
+
+
+def recv_msg(sock, max_fds=0):
+    '''Receive a message sent by `send_msg`; returns (obj, fds)'''
+    fds = array.array('i')
+    header, ancdata, _, _ = sock.recvmsg(4, socket.CMSG_SPACE(max_fds * fds.itemsize) if max_fds else 0)
+    if not header:
+        raise EOFError
+    for level, type, data in ancdata:
+        if level == socket.SOL_SOCKET and type == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+    if len(header) < 4:
+        header += recv_exactly(sock, 4 - len(header))
+    [ size ] = struct.unpack('!I', header)
+    return json.loads(recv_exactly(sock, size).decode()), list(fds)
+
+
+def exit_code(status):
+    '''Shell-style exit code for a `waitpid` status (negative signal number if the process was killed)'''
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def socket_path(python, preload):
+    '''Default zygote socket for a given interpreter and preload list (and version of this file)'''
+    key = sha256(json.dumps([ python, sorted(preload), getmtime(__file__) ]).encode()).hexdigest()[:16]
+    return join(gettempdir(), f'gsmo-zygote-{os.getuid()}', f'{key}.sock')
+
+
+def is_alive(path):
+    if not exists(path):
+        return False
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+class Server:
+    '''Accept requests on a unix socket, and fork a child to handle each one
+
+    `handler(request)` runs in the forked child (with the requesting client's stdio, cwd, and environment), and its
+    return value is the child's exit code. The server exits after `idle_timeout` seconds without any live children.
+    '''
+    def __init__(self, path, handler, idle_timeout=IDLE_TIMEOUT):
+        self.path = path
+        self.handler = handler
+        self.idle_timeout = idle_timeout
+        self.children = {}  # pid → client connection
+        self.wakeup = None
+
+    def listen(self):
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        if is_alive(self.path):
+            raise RuntimeError(f'Server already listening at {self.path}')
+        if exists(self.path):
+            os.remove(self.path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen(64)
+        return listener
+
+    def fork(self, listener, conn, request, fds):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                listener.close()
+                for c in self.children.values():
+                    c.close()
+                conn.close()
+                signal.set_wakeup_fd(-1)
+                for fd in self.wakeup:
+                    os.close(fd)
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                for std, fd in zip(STDIO, fds):
+                    os.dup2(fd, std)
+                for fd in fds:
+                    if fd not in STDIO:
+                        os.close(fd)
+                os.chdir(request['cwd'])
+                os.environ.clear()
+                os.environ.update(request['env'])
+                code = self.handler(request) or 0
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        for fd in fds:
+            os.close(fd)
+        return pid
+
+    def reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                break
+            conn = self.children.pop(pid, None)
+            if conn:
+                try:
+                    send_msg(conn, dict(status=exit_code(status)))
+                except OSError:
+                    pass
+                conn.close()
+
+    def serve(self):
+        listener = self.listen()
+        # Wake the select() loop when a child exits
+        rfd, wfd = self.wakeup = os.pipe()
+        os.set_blocking(wfd, False)
+        signal.set_wakeup_fd(wfd)
+        signal.signal(signal.SIGCHLD, lambda *_: None)
+        last_active = time.time()
+        try:
+            while True:
+                conns = { conn.fileno(): pid for pid, conn in self.children.items() }
+                readable, _, _ = select([ listener, rfd, *conns ], [], [], 1)
+                for r in readable:
+                    if r is listener:
+                        conn, _ = listener.accept()
+                        try:
+                            request, fds = recv_msg(conn, max_fds=len(STDIO))
+                        except (EOFError, OSError, ValueError):
+                            conn.close()
+                            continue
+                        pid = self.fork(listener, conn, request, fds)
+                        send_msg(conn, dict(pid=pid))
+                        self.children[pid] = conn
+                    elif r == rfd:
+                        os.read(rfd, 1024)
+                    else:
+                        # A client disconnected before its child exited; kill the child
+                        pid = conns[r]
+                        try:
+                            os.kill(pid, signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+                self.reap()
+                if self.children:
+                    last_active = time.time()
+                elif time.time() - last_active > self.idle_timeout:
+                    break
+        finally:
+            listener.close()
+            if exists(self.path):
+                os.remove(self.path)
+
+
+def request(path, argv, env=None):
+    '''Ask the server at `path` to fork a child that handles `argv`; relay signals to it, and return its exit code'''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    if env is None:
+        # Kernels launched from the forked kernel (papermill-in-papermill) can reuse this zygote
+        env = dict(os.environ, **{ SOCKET_ENV: path })
+    send_msg(sock, dict(argv=argv, cwd=os.getcwd(), env=env), fds=STDIO)
+    [ msg, _ ] = recv_msg(sock)
+    pid = msg['pid']
+
+    def forward(signum, frame):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    handlers = { signum: signal.signal(signum, forward) for signum in FORWARD_SIGNALS }
+    try:
+        [ msg, _ ] = recv_msg(sock)
+        return msg['status']
+    except EOFError:
+        return 1
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+        sock.close()
+
+
+def run_kernel(request):
+    from ipykernel.kernelapp import IPKernelApp
+    sys.argv = [ sys.executable, '-m', 'ipykernel_launcher', *request['argv'] ]
+    app = IPKernelApp.instance()
+    # These traits' defaults were read from the zygote's environment (when ipykernel was preloaded), not the requester's
+    app.parent_handle = int(os.environ.get('JPY_PARENT_PID') or 0)
+    app.initialize(request['argv'])
+    app.start()
+
+
+def preload_modules(modules):
+    for module in KERNEL_MODULES + modules:
+        try:
+            import_module(module)
+        except ImportError as e:
+            sys.stderr.write(f'Skipping preload of {module}: {e}\n')
+
+
+def start(path, python=sys.executable, preload=None, log=None, timeout=30):
+    '''Spawn a (detached) zygote server listening at `path`, and wait for it to accept connections'''
+    if is_alive(path):
+        return
+    cmd = [ python, __file__, 'serve', path, ]
+    if preload is not None:
+        cmd += [ '--preload', ','.join(preload), ]
+    if log:
+        os.makedirs(os.path.dirname(log), exist_ok=True)
+    out = open(log, 'a') if log else DEVNULL
+    Popen(cmd, stdin=DEVNULL, stdout=out, stderr=out, start_new_session=True, close_fds=True)
+    deadline = time.time() + timeout
+    while not is_alive(path):
+        if time.time() > deadline:
+            raise TimeoutError(f"Zygote didn't start listening at {path} within {timeout}s")
+        time.sleep(.05)
+
+
+def main():
+    parser = ArgumentParser()
+    subparsers = parser.add_subparsers(dest='cmd', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Preload modules, then fork kernels on request')
+    serve_parser.add_argument('path', help='Unix socket to listen on')
+    serve_parser.add_argument('-p','--preload',help=f'Comma-separated modules to import before forking kernels (default: ${PRELOAD_ENV}, or {",".join(DEFAULT_PRELOAD)})')
+    serve_parser.add_argument('-t','--idle-timeout',type=float,default=IDLE_TIMEOUT,help='Exit after this many seconds with no running kernels')
+
+    connect_parser = subparsers.add_parser('connect', help='Request a kernel from a zygote, and proxy its lifetime')
+    connect_parser.add_argument('path', help='Unix socket the zygote is listening on')
+    connect_parser.add_argument('argv', nargs='*', help='Kernel arguments (e.g. `-f <connection file>`)')
+
+    args = parser.parse_args()
+    if args.cmd == 'serve':
+        preload = args.preload
+        if preload is None:
+            preload = os.environ.get(PRELOAD_ENV)
+        preload = DEFAULT_PRELOAD if preload is None else [ m for m in preload.split(',') if m ]
+        preload_modules(preload)
+        try:
+            Server(args.path, run_kernel, idle_timeout=args.idle_timeout).serve()
+        except RuntimeError as e:
+            sys.stderr.write(f'{e}\n')
+    else:
+        sys.exit(request(args.path, args.argv))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,117 @@
 #!/usr/bin/env bash
 # Docker entrypoint that pip-installs a (presumably mounted) directory before calling an existing entrypoint script
+#
+# If $GSMO_PIP_CACHE is set (to a persistent volume), installs are cached there, keyed on each package's path and
+# packaging files (setup.py, setup.cfg, pyproject.toml, requirements*.txt), the Python version, and the image's content
+# hash: unchanged packages are just linked into site-packages (via a .pth file), and the rest are installed with one
+# `pip install --prefix` invocation (while holding a lock on the cache, which other containers may share).
 
 set -ex
 
+# Microseconds since the epoch (for $GSMO_PROFILE trace events; see gsmo/timeline.py)
+now_us() { echo $(($(date +%s%N) / 1000)); }
+
+# Record a trace event named $1, that started at $2
+trace() {
+  if [ -n "$GSMO_PROFILE" ]; then
+    echo "{\"name\": \"$1\", \"cat\": \"gsmo\", \"ph\": \"X\", \"ts\": $2, \"dur\": $(($(now_us) - $2)), \"pid\": $$, \"tid\": $$}" >> "$GSMO_PROFILE"
+  fi
+}
+
 n="$1"; shift
+deps=()
 while [ $n -gt 0 ]; do
-  dep="$1"; shift
-  sudo pip install -e "$dep"
+  deps+=("$1"); shift
   n=$(($n-1))
 done
 
+if [ -z "$GSMO_PIP_CACHE" ]; then
+  for dep in "${deps[@]}"; do
+    start="$(now_us)"
+    sudo pip install -e "$dep"
+    trace "pip install -e $dep" "$start"
+  done
+  "$@"
+  exit $?
+fi
+
+# site-packages dir under an install prefix
+purelib() { python -c "import sys, sysconfig; print(sysconfig.get_path('purelib', 'posix_prefix', vars=dict(base=sys.argv[1], platbase=sys.argv[1])))" "$1"; }
+
+# Point site-packages (and $PATH) at the given install prefixes
+link() {
+  for prefix in "$@"; do
+    echo "import site; site.addsitedir('$(purelib "$prefix")')"
+  done | sudo tee "$site/gsmo-pip-cache.pth" > /dev/null
+  for prefix in "$@"; do
+    export PATH="$prefix/bin:$PATH"
+  done
+}
+
+start="$(now_us)"
+site="$(python -c 'import site; print(site.getsitepackages()[0])')"
+py="$(python -VV)"
+# "pkgs/<key>" files hold the install prefix of each cached package (written once that prefix is complete)
+pkgs="$GSMO_PIP_CACHE/pkgs"
+lock="$GSMO_PIP_CACHE/lock"
+sudo mkdir -p "$pkgs" "$GSMO_PIP_CACHE/prefixes"
+sudo touch "$lock"
+prefixes=()
+misses=()
+keys=()
+
+# Look up package $1 (with cache key $2): add its prefix to `prefixes` if it's cached, otherwise to `misses`/`keys`
+lookup() {
+  if [ -f "$pkgs/$2" ]; then
+    prefix="$(cat "$pkgs/$2")"
+    if [[ ! " ${prefixes[*]} " =~ " $prefix " ]]; then
+      prefixes+=("$prefix")
+    fi
+  else
+    misses+=("$1")
+    keys+=("$2")
+  fi
+}
+
+for dep in "${deps[@]}"; do
+  lookup "$dep" "$( { echo "$dep $py $GSMO_IMAGE_HASH"; cd "$dep" && cat setup.py setup.cfg pyproject.toml requirements*.txt 2>/dev/null || true; } | sha256sum | cut -c1-16)"
+done
+# Cached packages are linked first, so that `pip` sees them as installed
+link "${prefixes[@]}"
+trace "pip cache: ${#prefixes[@]} linked, ${#misses[@]} to install" "$start"
+
+if [ ${#misses[@]} -gt 0 ]; then
+  start="$(now_us)"
+  # Containers sharing the cache (e.g. a module's pooled containers) install one at a time
+  exec 9< "$lock"
+  flock 9
+  # Another container may have installed some of them while we waited for the lock
+  waited=("${misses[@]}")
+  waited_keys=("${keys[@]}")
+  misses=()
+  keys=()
+  for i in "${!waited[@]}"; do
+    lookup "${waited[$i]}" "${waited_keys[$i]}"
+  done
+  if [ ${#misses[@]} -gt 0 ]; then
+    # All missing packages are installed with one `pip` invocation, into a prefix keyed on all of them
+    prefix="$GSMO_PIP_CACHE/prefixes/$(echo "${keys[*]}" | sha256sum | cut -c1-16)"
+    sudo rm -rf "$prefix"
+    args=()
+    for dep in "${misses[@]}"; do
+      args+=(-e "$dep")
+    done
+    # Legacy (`setup.py develop`) editable installs require their install dir to be on the $PYTHONPATH
+    sudo env PYTHONPATH="$(purelib "$prefix")" pip install --prefix "$prefix" "${args[@]}"
+    for key in "${keys[@]}"; do
+      echo "$prefix" | sudo tee "$pkgs/$key" > /dev/null
+    done
+    # Newly-installed packages come first, ahead of any stale installs of them in older prefixes
+    prefixes=("$prefix" "${prefixes[@]}")
+  fi
+  link "${prefixes[@]}"
+  flock -u 9
+  trace "pip install ${waited[*]}" "$start"
+fi
+
 "$@"
@@ -18,6 +18,9 @@ setup(
             'gsmo = gsmo.gsmo:main',
             'gsmo-entrypoint = gsmo.entrypoint:main',
         ],
+        'papermill.engine': [
+            'gsmo = gsmo.engine:Engine',
+        ],
     },
     python_requires='>3.8',  # uses the walrus operator
 )